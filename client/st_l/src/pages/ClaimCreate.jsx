@@ -14,7 +14,7 @@ const ClaimCreate = () => {
 
   useEffect(() => {
     // Fetch user's incidents to link to the claim
-    api.get('/api/incidents/').then(res => setIncidents(res.data));
+    api.get('/api/incidents/').then(res => setIncidents(res.data.results || res.data));
   }, []);
 
   const handleSubmit = async (e) => {
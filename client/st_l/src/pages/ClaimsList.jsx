@@ -47,7 +47,7 @@ const ClaimsList = () => {
         }
 
         // const response = await api.get('/api/claims/');
-        // setClaims(response.data);
+        // setClaims(response.data.results || response.data);
       } catch (error) {
         console.error("Error fetching claims:", error);
       } finally {
@@ -20,7 +20,7 @@ const IncidentCreate = () => {
 
   useEffect(() => {
     // Fetch real shipments from the API
-    api.get('/api/shipments/').then(res => {
+    api.get('/api/shipments/?fields=id,client.username').then(res => {
       console.log('Shipments API response:', res.data);
       // Handle both paginated and non-paginated responses
       const shipmentData = res.data.results || res.data;
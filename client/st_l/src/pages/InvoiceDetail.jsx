@@ -12,7 +12,7 @@ const InvoiceDetail = () => {
 
   const fetchInvoice = async () => {
     try {
-      const response = await api.get(`/api/invoices/${id}/`);
+      const response = await api.get(`/api/invoices/${id}/?expand=client,shipments.origin_detail,shipments.destination_detail`);
       setInvoice(response.data);
     } catch (error) {
       console.error("Error:", error);
@@ -34,6 +34,19 @@ const InvoiceDetail = () => {
     }
   };
 
+  const openPdf = async () => {
+    try {
+      const response = await api.get(`/api/invoices/${id}/document/pdf/`, { responseType: 'blob' });
+      if (response.status === 202) {
+        alert("The PDF is being prepared, try again in a moment.");
+        return;
+      }
+      window.open(URL.createObjectURL(response.data), '_blank');
+    } catch (error) {
+      alert("Error loading the PDF.");
+    }
+  };
+
   if (loading) return <div className="p-8 text-[#004d40]">Loading Invoice...</div>;
 
   return (
@@ -47,7 +60,10 @@ const InvoiceDetail = () => {
           <p className="text-sm text-slate-500 font-medium">Issued to: {invoice.client?.username}</p>
         </div>
         <div className="flex gap-3">
-          <button className="flex items-center gap-2 px-4 py-2 border border-slate-200 rounded-lg text-slate-600 hover:bg-slate-50">
+          <button
+            onClick={openPdf}
+            className="flex items-center gap-2 px-4 py-2 border border-slate-200 rounded-lg text-slate-600 hover:bg-slate-50"
+          >
             <Download size={18} /> Print PDF
           </button>
           {invoice.status !== 'PAID' && (
@@ -79,7 +95,7 @@ const InvoiceDetail = () => {
                   <tr key={s.id}>
                     <td className="px-6 py-4 font-bold text-[#004d40]">#{s.id}</td>
                     <td className="px-6 py-4 text-slate-600">
-                      {s.origin?.city} → {s.destination?.city}
+                      {s.origin_detail?.city} → {s.destination_detail?.city}
                     </td>
                     <td className="px-6 py-4 text-right font-medium">{s.total_cost} DZD</td>
                   </tr>
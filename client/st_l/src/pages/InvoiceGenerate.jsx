@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import { Save, ArrowLeft, CheckSquare, Square } from 'lucide-react';
 
 const InvoiceGenerate = () => {
@@ -15,9 +15,9 @@ const InvoiceGenerate = () => {
   useEffect(() => {
     const fetchClients = async () => {
       try {
-        const res = await api.get('/api/users/?role=CLIENT');
+        const users = await fetchAllPages('/api/users/?role=CLIENT&page_size=500');
         // Ensure we filter or backend filters
-        setClients(res.data.filter(u => u.role === 'CLIENT'));
+        setClients(users.filter(u => u.role === 'CLIENT'));
       } catch (err) {
         console.error("Failed to fetch clients", err);
       }
@@ -33,13 +33,9 @@ const InvoiceGenerate = () => {
     }
     const fetchShipments = async () => {
       try {
-        // In a real app, you'd filter via query param, e.g. ?client_id=X&invoiced=false
-        // Here we fetch all and filter in frontend for simplicity matching current backend
-        const res = await api.get('/api/shipments/');
-        const unInvoiced = res.data.filter(s =>
-          s.client.id === parseInt(selectedClient) &&
-          s.invoice === null &&
-          s.status === 'DELIVERED' // Only invoice delivered items
+        // Only delivered, uninvoiced shipments of the client, every page of them
+        const unInvoiced = await fetchAllPages(
+          `/api/shipments/?client=${selectedClient}&status=DELIVERED&uninvoiced=true&page_size=500`
         );
         setShipments(unInvoiced);
       } catch (err) {
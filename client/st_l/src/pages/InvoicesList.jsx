@@ -31,7 +31,7 @@ const InvoicesList = () => {
 
         // Keep this for when Django is ready:
         // const response = await api.get('/api/invoices/');
-        // setInvoices(response.data);
+        // setInvoices(response.data.results || response.data);
       } catch (error) {
         console.error("Error fetching invoices:", error);
       } finally {
@@ -9,7 +9,7 @@ const Payments = () => {
     const fetchPayments = async () => {
       try {
         const response = await api.get('/api/payments/');
-        setPayments(response.data);
+        setPayments(response.data.results || response.data);
       } catch (error) {
         console.error("Error fetching payments:", error);
       } finally {
@@ -20,7 +20,7 @@ const ShipmentCreate = () => {
     // Fetch clients for the dropdown (only needed for Admin/Agent)
     const fetchData = async () => {
       const clientRes = await api.get('/api/users/');
-      setClients(clientRes.data.filter(u => u.role === 'CLIENT'));
+      setClients((clientRes.data.results || clientRes.data).filter(u => u.role === 'CLIENT'));
     };
     fetchData();
   }, []);
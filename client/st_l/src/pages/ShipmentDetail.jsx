@@ -14,7 +14,7 @@ const ShipmentDetail = () => {
   useEffect(() => {
     const fetchDetail = async () => {
       try {
-        const response = await api.get(`/api/shipments/${id}/`);
+        const response = await api.get(`/api/shipments/${id}/?expand=client,origin_detail,destination_detail,parcels`);
         setShipment(response.data);
       } catch (error) {
         console.error(`Error fetching shipment detail for ID: ${id}`, error.response?.data || error);
@@ -6,6 +6,7 @@ import { useAuth } from '../context/AuthContext';
 
 const ShipmentsList = () => {
   const [shipments, setShipments] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const { user } = useAuth();
@@ -13,8 +14,9 @@ const ShipmentsList = () => {
   useEffect(() => {
     const fetchShipments = async () => {
       try {
-        const response = await api.get('/api/shipments/');
-        setShipments(response.data);
+        const response = await api.get('/api/shipments/?expand=client');
+        setShipments(response.data.results || response.data);
+        setNextPage(response.data.next || null);
       } catch (error) {
         console.error("Error fetching shipments:", error);
       } finally {
@@ -27,6 +29,19 @@ const ShipmentsList = () => {
     }
   }, [user]);
 
+  const loadMore = async () => {
+    setLoading(true);
+    try {
+      const response = await api.get(nextPage);
+      setShipments([...shipments, ...response.data.results]);
+      setNextPage(response.data.next || null);
+    } catch (error) {
+      console.error("Error fetching shipments:", error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const getStatusStyle = (status) => {
     switch (status) {
       case 'DELIVERED': return 'bg-emerald-100 text-emerald-700 border-emerald-200';
@@ -136,6 +151,17 @@ const ShipmentsList = () => {
         {filteredShipments.length === 0 && !loading && (
           <div className="p-10 text-center text-slate-400">No shipments found for your profile.</div>
         )}
+        {nextPage && (
+          <div className="p-4 text-center border-t border-slate-100">
+            <button
+              onClick={loadMore}
+              disabled={loading}
+              className="px-4 py-2 border border-slate-200 rounded-lg text-slate-600 hover:bg-slate-50 transition disabled:opacity-50"
+            >
+              {loading ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -13,4 +13,17 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Follows the `next` links of a paginated list and returns every row
+export const fetchAllPages = async (url) => {
+  let rows = [];
+  let next = url;
+  while (next) {
+    const response = await api.get(next);
+    if (Array.isArray(response.data)) return response.data;
+    rows = rows.concat(response.data.results);
+    next = response.data.next;
+  }
+  return rows;
+};
+
 export default api;
\ No newline at end of file
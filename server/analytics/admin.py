@@ -1,3 +1,6 @@
 from django.contrib import admin
-
-# Register your models here.
+from .models import DailyIncidentRollup, DailyRevenueRollup, DailyShipmentRollup, KPISnapshot
+admin.site.register(KPISnapshot)
+admin.site.register(DailyShipmentRollup)
+admin.site.register(DailyRevenueRollup)
+admin.site.register(DailyIncidentRollup)
@@ -0,0 +1,200 @@
+import datetime
+
+import numpy as np
+from django.db import connections
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from logistics.models import Driver, Vehicle
+from shipping.models import Parcel, Tour
+from shipping.planning import SHIFT_HOURS
+
+# Tours whose robust z-score (median / MAD based) of consumption ratio or
+# average speed is above this are reported as outliers.
+OUTLIER_THRESHOLD = 3.5
+# scales the MAD to a standard deviation for normally distributed values
+MAD_SCALE = 1.4826
+
+COLUMNS = ('id', 'driver_id', 'vehicle_id', 'km', 'hours', 'fuel', 'rated', 'capacity', 'load')
+
+
+def _fetch(queryset, columns):
+    # every column is a number already, so the rows are fetched straight
+    # from the cursor, skipping the per-row converters of the ORM
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(*queryset.query.sql_with_params())
+        return np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, columns)
+
+
+def _load(start, end):
+    """
+    Completed tours departing between two dates as a dict of arrays. Tour
+    columns are read in one query, the parcel weight carried by each tour in
+    a second grouped one. Decimals are cast to floats by the database,
+    missing values become NaN.
+    """
+    start = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min))
+    tours = Tour.objects.filter(
+        status=Tour.TourStatus.COMPLETED, departure_time__gte=start, departure_time__lt=end
+    )
+    rows = (
+        tours
+        .annotate(
+            km=Cast('mileage_km', FloatField()),
+            hours=Cast('duration_hours', FloatField()),
+            fuel=Cast('fuel_consumed_liters', FloatField()),
+            rated=Cast(F('vehicle__fuel_consumption'), FloatField()),
+            capacity=Cast(F('vehicle__capacity_kg'), FloatField()),
+        )
+        .order_by('id')
+        .values_list(*COLUMNS[:-1])
+    )
+    table = _fetch(rows, len(COLUMNS) - 1)
+    data = {name: table[:, k] for k, name in enumerate(COLUMNS[:-1])}
+    for name in ('id', 'driver_id', 'vehicle_id'):
+        data[name] = data[name].astype(np.int64)
+
+    loads = _fetch(
+        Parcel.objects
+        .filter(shipment__tour__in=tours)
+        .values('shipment__tour_id')
+        .annotate(load=Cast(Sum('weight_kg'), FloatField()))
+        .order_by()
+        .values_list('shipment__tour_id', 'load'),
+        2,
+    )
+    data['load'] = np.zeros(len(data['id']))
+    # tour ids are sorted, so each load is placed with a binary search
+    data['load'][np.searchsorted(data['id'], loads[:, 0].astype(np.int64))] = loads[:, 1]
+    return data
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numerator / denominator
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+def _tour_metrics(data):
+    km, hours, fuel = data['km'], data['hours'], data['fuel']
+    consumption = _ratio(fuel * 100, km)
+    return {
+        'consumption': consumption,
+        'consumption_ratio': _ratio(consumption, data['rated']),
+        'speed': _ratio(km, hours),
+        'weight_utilization': _ratio(data['load'], data['capacity']),
+        'shift_utilization': hours / SHIFT_HOURS,
+    }
+
+
+def _grouped(keys, data, metrics):
+    """Per-key totals and averages, computed with bincount over the group index."""
+    ids, index = np.unique(keys, return_inverse=True)
+    size = len(ids)
+
+    def total(values, mask=None):
+        mask = ~np.isnan(values) if mask is None else mask
+        return np.bincount(index[mask], weights=values[mask], minlength=size)
+
+    def mean(values):
+        mask = ~np.isnan(values)
+        return _ratio(total(values, mask), np.bincount(index[mask], minlength=size).astype(np.float64))
+
+    # consumption and speed are distance / time weighted, over the tours
+    # recording both values involved
+    fueled = ~np.isnan(data['fuel']) & (data['km'] > 0)
+    timed = ~np.isnan(data['hours']) & (data['km'] > 0)
+    fueled_km = total(data['km'], fueled)
+    consumption = _ratio(total(data['fuel'], fueled) * 100, fueled_km)
+    rated = _ratio(total(data['rated'] * data['km'], fueled), fueled_km)
+    return ids, {
+        'tours': np.bincount(index, minlength=size),
+        'mileage_km': total(data['km']),
+        'fuel_liters': total(data['fuel']),
+        'consumption_l_100km': consumption,
+        'rated_l_100km': rated,
+        'consumption_ratio': _ratio(consumption, rated),
+        'average_speed_kmh': _ratio(total(data['km'], timed), total(data['hours'], timed)),
+        'weight_utilization': mean(metrics['weight_utilization']),
+        'shift_utilization': mean(metrics['shift_utilization']),
+    }
+
+
+def _robust_z(values):
+    valid = values[~np.isnan(values)]
+    if len(valid) < 3:
+        return np.full(len(values), np.nan)
+    median = np.median(valid)
+    mad = np.median(np.abs(valid - median)) * MAD_SCALE
+    if mad == 0:
+        return np.full(len(values), np.nan)
+    return (values - median) / mad
+
+
+def _outliers(data, metrics, threshold, limit):
+    scores = {
+        'consumption_ratio': _robust_z(metrics['consumption_ratio']),
+        'speed': _robust_z(metrics['speed']),
+    }
+    stacked = np.abs(np.vstack(list(scores.values())))
+    worst = np.max(np.where(np.isnan(stacked), -np.inf, stacked), axis=0)
+    flagged = np.flatnonzero(worst > threshold)
+    flagged = flagged[np.argsort(-worst[flagged], kind='stable')][:limit]
+    return [
+        {
+            'tour_id': int(data['id'][k]),
+            'driver_id': int(data['driver_id'][k]),
+            'vehicle_id': int(data['vehicle_id'][k]),
+            'mileage_km': _value(data['km'][k]),
+            'duration_hours': _value(data['hours'][k]),
+            'fuel_liters': _value(data['fuel'][k]),
+            'consumption_l_100km': _value(metrics['consumption'][k]),
+            'consumption_ratio': _value(metrics['consumption_ratio'][k]),
+            'average_speed_kmh': _value(metrics['speed'][k]),
+            'score': _value(worst[k]),
+            'reasons': [name for name, z in scores.items() if abs(z[k]) > threshold],
+        }
+        for k in flagged
+    ]
+
+
+def _value(number, digits=3):
+    return None if np.isnan(number) else round(float(number), digits)
+
+
+def _rows(ids, stats, labels, key):
+    return [
+        {
+            key: int(pk),
+            'label': labels.get(int(pk), ''),
+            **{name: int(values[k]) if name == 'tours' else _value(values[k]) for name, values in stats.items()},
+        }
+        for k, pk in enumerate(ids)
+    ]
+
+
+def fleet_report(start, end, outlier_threshold=OUTLIER_THRESHOLD, max_outliers=50):
+    """Fuel, speed and utilization of completed tours, per vehicle and driver."""
+    data = _load(start, end)
+    metrics = _tour_metrics(data)
+
+    vehicle_ids, vehicle_stats = _grouped(data['vehicle_id'], data, metrics)
+    driver_ids, driver_stats = _grouped(data['driver_id'], data, metrics)
+    fleet_ids, fleet_stats = _grouped(np.zeros(len(data['id']), dtype=np.int64), data, metrics)
+
+    vehicle_labels = dict(Vehicle.objects.filter(id__in=vehicle_ids.tolist()).values_list('id', 'registration_number'))
+    driver_labels = {
+        driver.id: str(driver)
+        for driver in Driver.objects.filter(id__in=driver_ids.tolist()).select_related('user')
+    }
+    fleet = _rows(fleet_ids, fleet_stats, {}, 'id')
+    return {
+        'tours': len(data['id']),
+        'fleet': {name: value for name, value in fleet[0].items() if name not in ('id', 'label')} if fleet else None,
+        'vehicles': _rows(vehicle_ids, vehicle_stats, vehicle_labels, 'vehicle_id'),
+        'drivers': _rows(driver_ids, driver_stats, driver_labels, 'driver_id'),
+        'outliers': _outliers(data, metrics, outlier_threshold, max_outliers),
+    }
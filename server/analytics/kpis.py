@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from finance.models import Invoice, Payment
+from shipping.models import Shipment, Tour
+from support.models import Incident
+from users.models import User
+from .models import KPISnapshot
+
+SNAPSHOT_ID = 1
+
+SHIPMENT_STATUS_FIELDS = {
+    Shipment.ShipmentStatus.PENDING: 'shipments_pending',
+    Shipment.ShipmentStatus.IN_TRANSIT: 'shipments_in_transit',
+    Shipment.ShipmentStatus.DELIVERED: 'shipments_delivered',
+    Shipment.ShipmentStatus.CANCELLED: 'shipments_cancelled',
+}
+OUTSTANDING_STATUSES = (Invoice.InvoiceStatus.UNPAID, Invoice.InvoiceStatus.OVERDUE)
+
+
+def invoice_amount_fields(status):
+    """KPI columns an invoice amount counts towards in the given status."""
+    if status == Invoice.InvoiceStatus.PAID:
+        return ('total_revenue',)
+    if status == Invoice.InvoiceStatus.OVERDUE:
+        return ('outstanding_amount', 'overdue_amount')
+    if status in OUTSTANDING_STATUSES:
+        return ('outstanding_amount',)
+    return ()
+
+
+def add_invoice_amount(deltas, status, amount):
+    """Add an invoice amount in the given status to a {column: amount} delta."""
+    for field in invoice_amount_fields(status):
+        deltas[field] = deltas.get(field, 0) + amount
+    return deltas
+
+
+def rebuild():
+    """Recompute every KPI from the source tables and store the snapshot."""
+    status_counts = dict(Shipment.objects.values_list('status').annotate(count=Count('id')))
+    invoice_totals = Shipment.objects.filter(invoice__isnull=False).aggregate(
+        revenue=Sum('total_cost', filter=Q(invoice__status=Invoice.InvoiceStatus.PAID)),
+        outstanding=Sum('total_cost', filter=Q(invoice__status__in=OUTSTANDING_STATUSES)),
+        overdue=Sum('total_cost', filter=Q(invoice__status=Invoice.InvoiceStatus.OVERDUE)),
+    )
+    now = timezone.now()
+    values = {
+        'total_clients': User.objects.filter(role=User.Role.CLIENT).count(),
+        'tours_in_progress': Tour.objects.filter(status=Tour.TourStatus.IN_PROGRESS).count(),
+        'open_incidents': Incident.objects.filter(status=Incident.IncidentStatus.OPEN).count(),
+        'total_revenue': invoice_totals['revenue'] or Decimal('0.00'),
+        'outstanding_amount': invoice_totals['outstanding'] or Decimal('0.00'),
+        'overdue_amount': invoice_totals['overdue'] or Decimal('0.00'),
+        'total_payments': Payment.objects.aggregate(total=Sum('amount'))['total'] or Decimal('0.00'),
+        'updated_at': now,
+        'rebuilt_at': now,
+    }
+    for status, field in SHIPMENT_STATUS_FIELDS.items():
+        values[field] = status_counts.get(status, 0)
+    snapshot, _ = KPISnapshot.objects.update_or_create(pk=SNAPSHOT_ID, defaults=values)
+    return snapshot
+
+
+def apply_delta(deltas):
+    """
+    Add the amounts of `deltas` ({column: amount}) to the snapshot in one
+    UPDATE. Runs inside the caller's transaction, so a rolled back write
+    rolls back its delta. A None column is ignored.
+    """
+    deltas = {field: value for field, value in deltas.items() if field and value}
+    if not deltas:
+        return
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if not KPISnapshot.objects.filter(pk=SNAPSHOT_ID).update(updated_at=timezone.now(), **updates):
+        # no snapshot yet, the rebuild already sees the change being applied
+        rebuild()
+
+
+def get_snapshot():
+    snapshot = KPISnapshot.objects.filter(pk=SNAPSHOT_ID).first()
+    return snapshot or rebuild()
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.kpis import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard KPI snapshot from the source tables."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        snapshot = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt KPI snapshot in {time.monotonic() - started:.2f}s "
+            f"({snapshot.total_clients} clients, {snapshot.total_revenue} revenue)"
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily analytics rollups from the source tables."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} rollup rows in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KPISnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_clients', models.IntegerField(default=0)),
+                ('shipments_pending', models.IntegerField(default=0)),
+                ('shipments_in_transit', models.IntegerField(default=0)),
+                ('shipments_delivered', models.IntegerField(default=0)),
+                ('shipments_cancelled', models.IntegerField(default=0)),
+                ('tours_in_progress', models.IntegerField(default=0)),
+                ('open_incidents', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_payments', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('logistics', '0003_destination_latitude_destination_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyIncidentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('incident_type', models.CharField(max_length=50)),
+                ('service_type', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='logistics.destination')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'incident_type', 'service_type', 'destination'), name='unique_daily_incident_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('service_type', models.CharField(max_length=20)),
+                ('amount_ht', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='logistics.destination')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'service_type', 'destination'), name='unique_daily_revenue_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyShipmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('service_type', models.CharField(max_length=20)),
+                ('created_count', models.IntegerField(default=0)),
+                ('delivered_count', models.IntegerField(default=0)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='logistics.destination')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'service_type', 'destination'), name='unique_daily_shipment_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 14:01
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_overdue(apps, schema_editor):
+    KPISnapshot = apps.get_model('analytics', 'KPISnapshot')
+    Shipment = apps.get_model('shipping', 'Shipment')
+    overdue = Shipment.objects.filter(invoice__status='OVERDUE').aggregate(total=Sum('total_cost'))['total']
+    KPISnapshot.objects.update(overdue_amount=overdue or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_dailyincidentrollup_dailyrevenuerollup_and_more'),
+        ('finance', '0006_overdue_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kpisnapshot',
+            name='overdue_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_overdue, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,78 @@
 from django.db import models
 
-# Create your models here.
+
+class KPISnapshot(models.Model):
+    # Single row holding the dashboard KPIs. Kept current by delta updates
+    # from signals (analytics.signals), rebuilt from scratch by the
+    # rebuild_kpis management command.
+
+    total_clients = models.IntegerField(default=0)
+
+    shipments_pending = models.IntegerField(default=0)
+    shipments_in_transit = models.IntegerField(default=0)
+    shipments_delivered = models.IntegerField(default=0)
+    shipments_cancelled = models.IntegerField(default=0)
+
+    tours_in_progress = models.IntegerField(default=0)
+    open_incidents = models.IntegerField(default=0)
+
+    # invoice amounts are HT (before VAT)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # part of the outstanding amount past its due date
+    overdue_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_payments = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(null=True, blank=True)
+    rebuilt_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"KPI snapshot (updated {self.updated_at})"
+
+
+# Daily rollups behind the timeseries API, one row per day and breakdown
+# key. Maintained by delta updates from analytics.signals and recomputed by
+# the rebuild_rollups management command. Weeks and months are summed from
+# the days at query time.
+
+class DailyShipmentRollup(models.Model):
+    day = models.DateField()
+    service_type = models.CharField(max_length=20)
+    destination = models.ForeignKey('logistics.Destination', on_delete=models.CASCADE, related_name='+')
+    # by created_at and delivered_at respectively
+    created_count = models.IntegerField(default=0)
+    delivered_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'service_type', 'destination'], name='unique_daily_shipment_rollup'),
+        ]
+
+
+class DailyRevenueRollup(models.Model):
+    # invoiced HT amount by Invoice.issued_date
+    day = models.DateField()
+    service_type = models.CharField(max_length=20)
+    destination = models.ForeignKey('logistics.Destination', on_delete=models.CASCADE, related_name='+')
+    amount_ht = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'service_type', 'destination'], name='unique_daily_revenue_rollup'),
+        ]
+
+
+class DailyIncidentRollup(models.Model):
+    # by Incident.date_occurred
+    day = models.DateField()
+    incident_type = models.CharField(max_length=50)
+    service_type = models.CharField(max_length=20)
+    destination = models.ForeignKey('logistics.Destination', on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'incident_type', 'service_type', 'destination'], name='unique_daily_incident_rollup'
+            ),
+        ]
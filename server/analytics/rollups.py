@@ -0,0 +1,289 @@
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from finance.models import Invoice
+from shipping.models import Shipment
+from support.models import Incident
+from .models import DailyIncidentRollup, DailyRevenueRollup, DailyShipmentRollup
+
+BATCH_SIZE = 1000
+BUCKETS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+GROUP_FIELDS = {
+    'service_type': 'service_type',
+    'destination': 'destination_id',
+}
+
+# A source row contributes to a few rollup rows. On a write the old
+# contribution is subtracted and the new one added; contributions are
+# (model, key, {column: amount}).
+
+
+def _day(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value)
+    return value
+
+
+def _bump(model, key, deltas):
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # created concurrently
+        model.objects.filter(**key).update(**updates)
+
+
+def _apply(removed=(), added=()):
+    totals = {}
+    for sign, contributions in ((-1, removed), (1, added)):
+        for model, key, deltas in contributions:
+            if None in key.values():
+                continue
+            row = totals.setdefault((model, tuple(sorted(key.items()))), {})
+            for field, value in deltas.items():
+                row[field] = row.get(field, 0) + sign * value
+    for (model, key), deltas in totals.items():
+        deltas = {field: value for field, value in deltas.items() if value}
+        if deltas:
+            _bump(model, dict(key), deltas)
+
+
+# shipments and revenue
+
+SHIPMENT_FIELDS = ('service_type', 'destination_id', 'created_at', 'delivered_at', 'invoice_id', 'total_cost')
+
+
+def _issued_dates(invoice_ids):
+    invoice_ids = {pk for pk in invoice_ids if pk is not None}
+    if not invoice_ids:
+        return {}
+    return dict(Invoice.objects.filter(id__in=invoice_ids).values_list('id', 'issued_date'))
+
+
+def _shipment_contributions(state, issued_dates):
+    if state is None:
+        return []
+    dims = {'service_type': state['service_type'], 'destination_id': state['destination_id']}
+    contributions = [(DailyShipmentRollup, {'day': _day(state['created_at']), **dims}, {'created_count': 1})]
+    if state['delivered_at'] is not None:
+        contributions.append((DailyShipmentRollup, {'day': _day(state['delivered_at']), **dims}, {'delivered_count': 1}))
+    if state['invoice_id'] is not None:
+        contributions.append((
+            DailyRevenueRollup,
+            {'day': issued_dates.get(state['invoice_id']), **dims},
+            {'amount_ht': state['total_cost']},
+        ))
+    return contributions
+
+
+def shipment_changed(old, new):
+    """
+    old and new are dicts of the SHIPMENT_FIELDS of a shipment before and
+    after a write, None for a shipment that did not / no longer exists.
+    """
+    issued_dates = _issued_dates(state['invoice_id'] for state in (old, new) if state)
+    _apply(_shipment_contributions(old, issued_dates), _shipment_contributions(new, issued_dates))
+
+
+def shipments_created(shipments):
+    _apply(added=[
+        contribution
+        for shipment in shipments
+        for contribution in _shipment_contributions({f: getattr(shipment, f) for f in SHIPMENT_FIELDS}, {})
+    ])
+
+
+def invoice_shipments_changed(invoice, shipment_ids, sign=1):
+    """Shipments were attached to (sign 1) or detached from (-1) an invoice."""
+    rows = (
+        Shipment.objects
+        .filter(id__in=shipment_ids)
+        .values('service_type', 'destination_id')
+        .annotate(amount=Sum('total_cost'))
+        .order_by()
+    )
+    contributions = [
+        (
+            DailyRevenueRollup,
+            {'day': invoice.issued_date, 'service_type': row['service_type'], 'destination_id': row['destination_id']},
+            {'amount_ht': row['amount'] or Decimal('0.00')},
+        )
+        for row in rows
+    ]
+    if sign > 0:
+        _apply(added=contributions)
+    else:
+        _apply(removed=contributions)
+
+
+def invoices_created(invoice_ids):
+    """Invoices were created with their shipments already attached, e.g. by a billing run."""
+    rows = (
+        Shipment.objects
+        .filter(invoice__in=invoice_ids)
+        .values('invoice__issued_date', 'service_type', 'destination_id')
+        .annotate(amount=Sum('total_cost'))
+        .order_by()
+    )
+    _apply(added=[
+        (
+            DailyRevenueRollup,
+            {'day': row['invoice__issued_date'], 'service_type': row['service_type'], 'destination_id': row['destination_id']},
+            {'amount_ht': row['amount'] or Decimal('0.00')},
+        )
+        for row in rows
+    ])
+
+
+def invoice_deleted(invoice):
+    invoice_shipments_changed(invoice, invoice.shipments.values('id'), sign=-1)
+
+
+# incidents
+
+INCIDENT_FIELDS = ('incident_type', 'date_occurred', 'shipment_id')
+
+
+def _incident_contributions(state, shipment_dims):
+    if state is None:
+        return []
+    service_type, destination_id = shipment_dims.get(state['shipment_id'], (None, None))
+    key = {
+        'day': _day(state['date_occurred']),
+        'incident_type': state['incident_type'],
+        'service_type': service_type,
+        'destination_id': destination_id,
+    }
+    return [(DailyIncidentRollup, key, {'count': 1})]
+
+
+def incident_changed(old, new):
+    shipment_ids = {state['shipment_id'] for state in (old, new) if state}
+    shipment_dims = {
+        pk: (service_type, destination_id)
+        for pk, service_type, destination_id in
+        Shipment.objects.filter(id__in=shipment_ids).values_list('id', 'service_type', 'destination_id')
+    }
+    _apply(_incident_contributions(old, shipment_dims), _incident_contributions(new, shipment_dims))
+
+
+# full rebuild
+
+def rebuild():
+    """Recompute every rollup from the source tables. Returns rows written."""
+    shipment_rows = {}
+    created = (
+        Shipment.objects
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'service_type', 'destination_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    delivered = (
+        Shipment.objects
+        .filter(delivered_at__isnull=False)
+        .annotate(day=TruncDate('delivered_at'))
+        .values('day', 'service_type', 'destination_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for column, rows in (('created_count', created), ('delivered_count', delivered)):
+        for row in rows:
+            key = (row['day'], row['service_type'], row['destination_id'])
+            shipment_rows.setdefault(key, {})[column] = row['count']
+
+    revenue = (
+        Shipment.objects
+        .filter(invoice__isnull=False)
+        .values('invoice__issued_date', 'service_type', 'destination_id')
+        .annotate(amount=Sum('total_cost'))
+        .order_by()
+    )
+    incidents = (
+        Incident.objects
+        .annotate(day=TruncDate('date_occurred'))
+        .values('day', 'incident_type', 'shipment__service_type', 'shipment__destination_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        for model in (DailyShipmentRollup, DailyRevenueRollup, DailyIncidentRollup):
+            model.objects.all().delete()
+        written = DailyShipmentRollup.objects.bulk_create(
+            [
+                DailyShipmentRollup(day=day, service_type=service_type, destination_id=destination_id, **counts)
+                for (day, service_type, destination_id), counts in shipment_rows.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        written += DailyRevenueRollup.objects.bulk_create(
+            [
+                DailyRevenueRollup(
+                    day=row['invoice__issued_date'], service_type=row['service_type'],
+                    destination_id=row['destination_id'], amount_ht=row['amount'],
+                )
+                for row in revenue
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        written += DailyIncidentRollup.objects.bulk_create(
+            [
+                DailyIncidentRollup(
+                    day=row['day'], incident_type=row['incident_type'], service_type=row['shipment__service_type'],
+                    destination_id=row['shipment__destination_id'], count=row['count'],
+                )
+                for row in incidents
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return len(written)
+
+
+# reading
+
+def _series(queryset, start, end, bucket, group_by, keys, values):
+    queryset = queryset.filter(day__gte=start, day__lte=end)
+    trunc = BUCKETS[bucket]
+    period = trunc('day') if trunc else F('day')
+    keys = list(keys) + ([GROUP_FIELDS[group_by]] if group_by else [])
+    rows = (
+        queryset
+        .annotate(period=period)
+        .values('period', *keys)
+        .annotate(**{name: Sum(column) for name, column in values.items()})
+        .order_by('period', *keys)
+    )
+    return list(rows)
+
+
+def timeseries(start, end, bucket='day', group_by=None):
+    """Shipment, revenue and incident series between two dates, inclusive."""
+    return {
+        'shipments': _series(
+            DailyShipmentRollup.objects, start, end, bucket, group_by, [],
+            {'created': 'created_count', 'delivered': 'delivered_count'},
+        ),
+        'revenue': _series(
+            DailyRevenueRollup.objects, start, end, bucket, group_by, [],
+            {'amount_ht': 'amount_ht'},
+        ),
+        'incidents': _series(
+            DailyIncidentRollup.objects, start, end, bucket, group_by, ['incident_type'],
+            {'count': 'count'},
+        ),
+    }
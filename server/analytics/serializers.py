@@ -0,0 +1,46 @@
+import datetime
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from .fleet import OUTLIER_THRESHOLD
+from .rollups import BUCKETS, GROUP_FIELDS
+
+# longest range one request may cover
+MAX_RANGE_DAYS = 5 * 366
+
+
+class DateRangeQuerySerializer(serializers.Serializer):
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD, both inclusive and optional. 'from' is
+    # a keyword, the fields are renamed in to_internal_value
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    default_range_days = 30
+
+    def to_internal_value(self, data):
+        renamed = {'from': 'start', 'to': 'end'}
+        data = {renamed.get(key, key): value for key, value in data.items() if value != ''}
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - datetime.timedelta(days=self.default_range_days - 1)
+        if start > end:
+            raise serializers.ValidationError({'from': "Must not be after 'to'."})
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise serializers.ValidationError({'from': f"The range is limited to {MAX_RANGE_DAYS} days."})
+        attrs['start'], attrs['end'] = start, end
+        return attrs
+
+
+class TimeseriesQuerySerializer(DateRangeQuerySerializer):
+    bucket = serializers.ChoiceField(choices=list(BUCKETS), default='day')
+    group_by = serializers.ChoiceField(choices=list(GROUP_FIELDS), required=False, allow_null=True, default=None)
+
+
+class FleetQuerySerializer(DateRangeQuerySerializer):
+    default_range_days = 90
+
+    outlier_threshold = serializers.FloatField(min_value=1, default=OUTLIER_THRESHOLD)
+    max_outliers = serializers.IntegerField(min_value=0, max_value=1000, default=50)
@@ -0,0 +1,269 @@
+import logging
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from finance.models import Invoice, Payment
+from finance.signals import (
+    invoice_totals_changed, invoices_bulk_created, invoices_status_changed, payments_bulk_created,
+)
+from shipping.models import Shipment, Tour
+from shipping.signals import shipments_bulk_created
+from support.models import Incident
+from users.models import User
+from . import kpis, rollups
+
+logger = logging.getLogger(__name__)
+
+# Every write that moves a dashboard KPI or a daily rollup applies its delta
+# to them. The values a model was loaded with are remembered on post_init so
+# a save can tell what changed without querying the old row. When a tracked
+# field was deferred the old value is gone by post_save; the save is logged
+# and left to the rebuild_kpis / rebuild_rollups commands rather than
+# recomputing everything inside the request.
+
+TRACKED_FIELDS = {
+    User: ('role',),
+    Shipment: ('status',) + rollups.SHIPMENT_FIELDS,
+    Tour: ('status',),
+    Incident: ('status',) + rollups.INCIDENT_FIELDS,
+    Invoice: ('status',),
+    Payment: ('amount',),
+}
+
+
+def _changes(instance, created, update_fields=None):
+    """(old, new) per tracked field, None when the old values are unknown."""
+    old = {} if created else getattr(instance, '_kpi_original', None)
+    if old is None:
+        return None
+    changes = {}
+    original = {}
+    for field in TRACKED_FIELDS[type(instance)]:
+        if created or field in old:
+            changes[field] = (old.get(field), getattr(instance, field))
+            original[field] = changes[field][1]
+        elif field in instance.__dict__ and (update_fields is None or _column(instance, field) in update_fields):
+            # deferred when loaded and written by this save, the old value
+            # is unknown
+            return None
+        else:
+            # not written by this save
+            value = getattr(instance, field)
+            changes[field] = (value, value)
+            original[field] = value
+    instance._kpi_original = original
+    return changes
+
+
+def _column(instance, field):
+    # update_fields holds field names, tracked fields may be attnames
+    return instance._meta.get_field(field).name
+
+
+@receiver(post_init)
+def remember_original(sender, instance, **kwargs):
+    fields = TRACKED_FIELDS.get(sender)
+    if fields is None:
+        return
+    # read __dict__ so deferred fields are not loaded here
+    instance._kpi_original = {field: instance.__dict__[field] for field in fields if field in instance.__dict__}
+
+
+def _states(changes, fields):
+    """The values of `fields` before and after a save, old is None on create."""
+    old = {field: changes[field][0] for field in fields}
+    new = {field: changes[field][1] for field in fields}
+    return old, new
+
+
+def _kpis_unknown(instance):
+    logger.warning(
+        "Unknown previous state of %r, dashboard KPIs may be off until rebuild_kpis runs", instance
+    )
+
+
+def _rollups_unknown(instance):
+    logger.warning(
+        "Unknown previous state of %r, daily rollups may be off until rebuild_rollups runs", instance
+    )
+
+
+def _count_delta(changes, field, value, column):
+    old, new = changes[field]
+    return {column: (new == value) - (old == value)}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    changes = _changes(instance, created, update_fields)
+    if raw:
+        return
+    if changes is None:
+        _kpis_unknown(instance)
+        return
+    kpis.apply_delta(_count_delta(changes, 'role', User.Role.CLIENT, 'total_clients'))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if instance.role == User.Role.CLIENT:
+        kpis.apply_delta({'total_clients': -1})
+
+
+def _invoice_status(invoice_id):
+    return Invoice.objects.filter(pk=invoice_id).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    changes = _changes(instance, created, update_fields)
+    if raw:
+        return
+    if changes is None:
+        _kpis_unknown(instance)
+        _rollups_unknown(instance)
+        return
+    old, new = _states(changes, rollups.SHIPMENT_FIELDS)
+    if old != new:
+        rollups.shipment_changed(None if created else old, new)
+
+    deltas = {}
+    old_status, new_status = changes['status']
+    if old_status != new_status:
+        deltas[kpis.SHIPMENT_STATUS_FIELDS.get(old_status)] = -1
+        deltas[kpis.SHIPMENT_STATUS_FIELDS.get(new_status)] = 1
+
+    # invoiced costs count towards revenue or outstanding amount
+    old_invoice, new_invoice = changes['invoice_id']
+    old_cost, new_cost = changes['total_cost']
+    if old_invoice != new_invoice or old_cost != new_cost:
+        if old_invoice is not None:
+            kpis.add_invoice_amount(deltas, _invoice_status(old_invoice), -old_cost)
+        if new_invoice is not None:
+            kpis.add_invoice_amount(deltas, _invoice_status(new_invoice), new_cost)
+    kpis.apply_delta(deltas)
+
+
+@receiver(post_delete, sender=Shipment)
+def shipment_deleted(sender, instance, **kwargs):
+    deltas = {kpis.SHIPMENT_STATUS_FIELDS.get(instance.status): -1}
+    if instance.invoice_id is not None:
+        kpis.add_invoice_amount(deltas, _invoice_status(instance.invoice_id), -instance.total_cost)
+    kpis.apply_delta(deltas)
+    rollups.shipment_changed({field: getattr(instance, field) for field in rollups.SHIPMENT_FIELDS}, None)
+
+
+@receiver(shipments_bulk_created)
+def shipments_created(sender, shipments, **kwargs):
+    deltas = {}
+    for shipment in shipments:
+        field = kpis.SHIPMENT_STATUS_FIELDS.get(shipment.status)
+        deltas[field] = deltas.get(field, 0) + 1
+    kpis.apply_delta(deltas)
+    rollups.shipments_created(shipments)
+
+
+@receiver(post_save, sender=Tour)
+def tour_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    changes = _changes(instance, created, update_fields)
+    if raw:
+        return
+    if changes is None:
+        _kpis_unknown(instance)
+        return
+    kpis.apply_delta(_count_delta(changes, 'status', Tour.TourStatus.IN_PROGRESS, 'tours_in_progress'))
+
+
+@receiver(post_delete, sender=Tour)
+def tour_deleted(sender, instance, **kwargs):
+    if instance.status == Tour.TourStatus.IN_PROGRESS:
+        kpis.apply_delta({'tours_in_progress': -1})
+
+
+@receiver(post_save, sender=Incident)
+def incident_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    changes = _changes(instance, created, update_fields)
+    if raw:
+        return
+    if changes is None:
+        _kpis_unknown(instance)
+        _rollups_unknown(instance)
+        return
+    kpis.apply_delta(_count_delta(changes, 'status', Incident.IncidentStatus.OPEN, 'open_incidents'))
+    old, new = _states(changes, rollups.INCIDENT_FIELDS)
+    if old != new:
+        rollups.incident_changed(None if created else old, new)
+
+
+@receiver(post_delete, sender=Incident)
+def incident_deleted(sender, instance, **kwargs):
+    if instance.status == Incident.IncidentStatus.OPEN:
+        kpis.apply_delta({'open_incidents': -1})
+    rollups.incident_changed({field: getattr(instance, field) for field in rollups.INCIDENT_FIELDS}, None)
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    changes = _changes(instance, created, update_fields)
+    if raw or created:
+        # a new invoice has no shipments yet
+        return
+    if changes is None:
+        _kpis_unknown(instance)
+        return
+    old_status, new_status = changes['status']
+    if old_status != new_status:
+        deltas = kpis.add_invoice_amount({}, old_status, -instance.montant_ht)
+        kpis.apply_delta(kpis.add_invoice_amount(deltas, new_status, instance.montant_ht))
+
+
+@receiver(pre_delete, sender=Invoice)
+def invoice_deleted(sender, instance, **kwargs):
+    # the shipments are still attached before the delete
+    kpis.apply_delta(kpis.add_invoice_amount({}, instance.status, -instance.montant_ht))
+    rollups.invoice_deleted(instance)
+
+
+@receiver(invoice_totals_changed)
+def invoice_total_changed(sender, invoice, delta_ht, shipment_ids=(), attached=True, **kwargs):
+    kpis.apply_delta(kpis.add_invoice_amount({}, invoice.status, delta_ht))
+    if shipment_ids:
+        rollups.invoice_shipments_changed(invoice, shipment_ids, 1 if attached else -1)
+
+
+@receiver(invoices_bulk_created)
+def invoices_created(sender, invoices, **kwargs):
+    deltas = {}
+    for invoice in invoices:
+        kpis.add_invoice_amount(deltas, invoice.status, invoice.montant_ht)
+    kpis.apply_delta(deltas)
+    rollups.invoices_created([invoice.pk for invoice in invoices])
+
+
+@receiver(invoices_status_changed)
+def invoices_status_moved(sender, old_status, new_status, amount_ht, **kwargs):
+    deltas = kpis.add_invoice_amount({}, old_status, -amount_ht)
+    kpis.apply_delta(kpis.add_invoice_amount(deltas, new_status, amount_ht))
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    changes = _changes(instance, created, update_fields)
+    if raw:
+        return
+    if changes is None:
+        _kpis_unknown(instance)
+        return
+    old_amount, new_amount = changes['amount']
+    kpis.apply_delta({'total_payments': new_amount - (old_amount or 0)})
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    kpis.apply_delta({'total_payments': -instance.amount})
+
+
+@receiver(payments_bulk_created)
+def payments_created(sender, payments, **kwargs):
+    kpis.apply_delta({'total_payments': sum(payment.amount for payment in payments)})
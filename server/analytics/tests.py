@@ -1,3 +1,202 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from finance.models import Invoice
+from logistics.models import Destination, Driver, Vehicle
+from shipping.models import Shipment, Tour
+from users.models import User
+from . import kpis, rollups
+from .models import DailyRevenueRollup, DailyShipmentRollup, KPISnapshot
+
+KPI_FIELDS = [
+    field.name for field in KPISnapshot._meta.concrete_fields
+    if field.name not in ('id', 'updated_at', 'rebuilt_at')
+]
+
+
+class FleetAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.drivers = [
+            Driver.objects.create(
+                user=User.objects.create_user(f'driver{k}', password='x', role=User.Role.DRIVER),
+                license_number=f'L{k}',
+            )
+            for k in range(2)
+        ]
+        cls.vehicles = [
+            Vehicle.objects.create(
+                registration_number=f'V{k}', vehicle_type=Vehicle.VehicleType.TRUCK, capacity_kg=1000,
+                fuel_consumption=10,
+            )
+            for k in range(2)
+        ]
+        departure = datetime.datetime(2026, 3, 2, 8, tzinfo=datetime.timezone.utc)
+        # 100 km in 2 hours each, the last tour burns four times its rating
+        for k, fuel in enumerate(('10', '11', '9', '10.5', '40')):
+            Tour.objects.create(
+                driver=cls.drivers[k % 2], vehicle=cls.vehicles[k % 2], status=Tour.TourStatus.COMPLETED,
+                departure_time=departure, estimated_completion_time=departure,
+                mileage_km=100, duration_hours=2, fuel_consumed_liters=Decimal(fuel),
+            )
+        cls.outlier = Tour.objects.latest('id')
+        Tour.objects.create(
+            driver=cls.drivers[0], vehicle=cls.vehicles[0], status=Tour.TourStatus.PLANNED,
+            departure_time=departure, estimated_completion_time=departure, mileage_km=100,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_report(self):
+        response = self.client.get('/api/analytics/fleet/?from=2026-03-01&to=2026-03-31')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['tours'], 5)
+        fleet = response.data['fleet']
+        self.assertEqual((fleet['mileage_km'], fleet['fuel_liters']), (500.0, 80.5))
+        self.assertEqual(fleet['consumption_l_100km'], 16.1)
+        self.assertEqual(fleet['average_speed_kmh'], 50.0)
+        vehicles = {row['vehicle_id']: row for row in response.data['vehicles']}
+        # tours 0, 2 and 4 against 1 and 3
+        self.assertEqual(vehicles[self.vehicles[0].id]['tours'], 3)
+        self.assertEqual(vehicles[self.vehicles[0].id]['consumption_l_100km'], 19.667)
+        self.assertEqual(vehicles[self.vehicles[1].id]['consumption_ratio'], 1.075)
+        self.assertEqual(vehicles[self.vehicles[1].id]['label'], 'V1')
+        self.assertEqual(
+            [(row['tour_id'], row['reasons']) for row in response.data['outliers']],
+            [(self.outlier.id, ['consumption_ratio'])],
+        )
+
+    def test_empty_range(self):
+        response = self.client.get('/api/analytics/fleet/?from=2026-04-01&to=2026-04-30')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['tours'], response.data['fleet'], response.data['outliers']), (0, None, []))
+
+
+class KPISnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.oran = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=2, volume_rate_per_m3=50,
+        )
+        cls.invoice = Invoice.objects.create(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+
+    def setUp(self):
+        kpis.rebuild()
+
+    def create_shipment(self, **values):
+        return Shipment.objects.create(
+            client=self.client_user, origin=self.oran, destination=self.oran, total_cost=Decimal('15.30'), **values,
+        )
+
+    def assertSnapshotFresh(self):
+        snapshot = KPISnapshot.objects.get(pk=kpis.SNAPSHOT_ID)
+        applied = {field: getattr(snapshot, field) for field in KPI_FIELDS}
+        fresh = kpis.rebuild()
+        self.assertEqual(applied, {field: getattr(fresh, field) for field in KPI_FIELDS})
+
+    def test_create(self):
+        self.create_shipment()
+        self.create_shipment(invoice=self.invoice)
+        self.assertSnapshotFresh()
+        self.assertEqual(kpis.get_snapshot().outstanding_amount, Decimal('15.30'))
+
+    def test_status_change(self):
+        shipment = self.create_shipment(invoice=self.invoice)
+        for status in (Shipment.ShipmentStatus.DELIVERED, Shipment.ShipmentStatus.CANCELLED):
+            shipment.status = status
+            shipment.save()
+            self.assertSnapshotFresh()
+        self.assertEqual(kpis.get_snapshot().shipments_cancelled, 1)
+
+    def test_delete(self):
+        shipment = self.create_shipment(invoice=self.invoice)
+        self.create_shipment()
+        shipment.delete()
+        self.assertSnapshotFresh()
+        self.assertEqual(kpis.get_snapshot().shipments_pending, 1)
+
+    def test_deferred_save_is_left_to_the_rebuild(self):
+        shipment = Shipment.objects.only('id').get(pk=self.create_shipment().pk)
+        shipment.status = Shipment.ShipmentStatus.IN_TRANSIT
+
+        with self.assertLogs('analytics.signals', 'WARNING'), mock.patch.object(kpis, 'rebuild') as rebuild:
+            shipment.save(update_fields=['status'])
+        rebuild.assert_not_called()
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.oran = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=2, volume_rate_per_m3=50,
+        )
+        cls.invoice = Invoice.objects.create(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+
+    def setUp(self):
+        rollups.rebuild()
+        self.shipment = Shipment.objects.create(
+            client=self.client_user, origin=self.oran, destination=self.oran, total_cost=Decimal('15.30'),
+            invoice=self.invoice,
+        )
+
+    def rollup_rows(self):
+        # rows brought back to zero by a delta are kept, a rebuild drops them
+        shipments = {
+            (row.day, row.service_type, row.destination_id): (row.created_count, row.delivered_count)
+            for row in DailyShipmentRollup.objects.all() if row.created_count or row.delivered_count
+        }
+        revenue = {
+            (row.day, row.service_type, row.destination_id): row.amount_ht
+            for row in DailyRevenueRollup.objects.all() if row.amount_ht
+        }
+        return shipments, revenue
+
+    def assertRollupsFresh(self):
+        applied = self.rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(applied, self.rollup_rows())
+
+    def test_create(self):
+        self.assertRollupsFresh()
+        self.assertEqual(
+            self.rollup_rows()[1], {(self.invoice.issued_date, 'STANDARD', self.oran.id): Decimal('15.30')},
+        )
+
+    def test_move_between_days(self):
+        self.shipment.created_at = datetime.datetime(2026, 3, 1, 12, tzinfo=datetime.timezone.utc)
+        self.shipment.save()
+        self.assertRollupsFresh()
+        self.assertEqual(list(self.rollup_rows()[0]), [(datetime.date(2026, 3, 1), 'STANDARD', self.oran.id)])
+
+    def test_status_changes(self):
+        self.shipment.status = Shipment.ShipmentStatus.DELIVERED
+        self.shipment.save()
+        self.assertRollupsFresh()
+        self.assertEqual(sum(delivered for _, delivered in self.rollup_rows()[0].values()), 1)
+
+        self.shipment.status = Shipment.ShipmentStatus.IN_TRANSIT
+        self.shipment.save()
+        self.assertRollupsFresh()
+        self.assertEqual(sum(delivered for _, delivered in self.rollup_rows()[0].values()), 0)
+
+    def test_service_and_cost_change(self):
+        self.shipment.service_type = Shipment.ServiceType.EXPRESS
+        self.shipment.total_cost = Decimal('20.00')
+        self.shipment.save()
+        self.assertRollupsFresh()
 
-# Create your tests here.
+    def test_delete(self):
+        self.shipment.delete()
+        self.assertRollupsFresh()
+        self.assertEqual(self.rollup_rows(), ({}, {}))
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import DashboardAnalyticsView
+from .views import DashboardAnalyticsView, FleetAnalyticsView, TimeseriesAnalyticsView
 
 urlpatterns = [
     #
     path('analytics/dashboard/', DashboardAnalyticsView.as_view(), name='dashboard-analytics'),
+    path('analytics/timeseries/', TimeseriesAnalyticsView.as_view(), name='timeseries-analytics'),
+    path('analytics/fleet/', FleetAnalyticsView.as_view(), name='fleet-analytics'),
 ]
@@ -1,11 +1,12 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Q
-from decimal import Decimal
 from users.models import User
-from shipping.models import Shipment, Tour
-from support.models import Claim, Incident
-from finance.models import Invoice
+from shipping.models import Shipment
+from support.models import Claim
+from .fleet import fleet_report
+from .kpis import SHIPMENT_STATUS_FIELDS, get_snapshot
+from .rollups import timeseries
+from .serializers import FleetQuerySerializer, TimeseriesQuerySerializer
 from rest_framework.permissions import BasePermission
 
 
@@ -23,29 +24,12 @@ class DashboardAnalyticsView(APIView):
     permission_classes = [IsAdminOrAgent]
 
     def get(self, request, format=None):
-        
-        total_clients = User.objects.filter(role=User.Role.CLIENT).count()
-
-        shipment_counts_by_status = Shipment.objects.values('status').annotate(count=Count('id'))
-        
-        tours_in_progress = Tour.objects.filter(status=Tour.TourStatus.IN_PROGRESS).count()
-
-        open_incidents = Incident.objects.filter(status=Incident.IncidentStatus.OPEN).count()
 
-        
-        total_revenue = Invoice.objects.filter(status=Invoice.InvoiceStatus.PAID).aggregate(
-            total_ht=Sum('amount')
-        )['total_ht'] or Decimal('0.00')
-
-        
-        outstanding_amount = Invoice.objects.filter(
-            Q(status=Invoice.InvoiceStatus.UNPAID) | Q(status=Invoice.InvoiceStatus.OVERDUE)
-        ).aggregate(
-            total_ht=Sum('amount')
-        )['total_ht'] or Decimal('0.00')
+        # counters and amounts come precomputed from the snapshot row
+        snapshot = get_snapshot()
 
-        
-        latest_shipments = Shipment.objects.order_by('-created_at')[:5]
+        # relations are rendered as ids, only the parcel ids need a prefetch
+        latest_shipments = Shipment.objects.prefetch_related('parcels').order_by('-created_at')[:5]
         latest_claims = Claim.objects.order_by('-created_at')[:5]
 
         
@@ -55,14 +39,17 @@ class DashboardAnalyticsView(APIView):
         # final data object
         data = {
             'kpis': {
-                'total_clients': total_clients,
-                'total_revenue': total_revenue,
-                'outstanding_amount': outstanding_amount,
-                'tours_in_progress': tours_in_progress,
-                'open_incidents': open_incidents,
+                'total_clients': snapshot.total_clients,
+                'total_revenue': snapshot.total_revenue,
+                'outstanding_amount': snapshot.outstanding_amount,
+                'overdue_amount': snapshot.overdue_amount,
+                'tours_in_progress': snapshot.tours_in_progress,
+                'open_incidents': snapshot.open_incidents,
+                'total_payments': snapshot.total_payments,
+                'updated_at': snapshot.updated_at,
             },
             'shipment_summary': {
-                status_item['status']: status_item['count'] for status_item in shipment_counts_by_status
+                status: getattr(snapshot, field) for status, field in SHIPMENT_STATUS_FIELDS.items()
             },
             'recent_activity': {
                 'latest_shipments': ShipmentSerializer(latest_shipments, many=True).data,
@@ -72,3 +59,45 @@ class DashboardAnalyticsView(APIView):
         
         return Response(data)
 
+
+class TimeseriesAnalyticsView(APIView):
+
+    # shipments created/delivered, revenue and incidents per day, week or
+    # month, read from the daily rollup tables
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=day|week|month&group_by=service_type|destination
+
+    permission_classes = [IsAdminOrAgent]
+
+    def get(self, request, format=None):
+        serializer = TimeseriesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        data = {
+            'from': params['start'],
+            'to': params['end'],
+            'bucket': params['bucket'],
+            'group_by': params['group_by'],
+        }
+        data.update(timeseries(params['start'], params['end'], params['bucket'], params['group_by']))
+        return Response(data)
+
+
+class FleetAnalyticsView(APIView):
+
+    # actual vs rated fuel consumption, average speed and utilization of
+    # completed tours per vehicle and driver, plus outlier tours
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD&outlier_threshold=3.5&max_outliers=50
+
+    permission_classes = [IsAdminOrAgent]
+
+    def get(self, request, format=None):
+        serializer = FleetQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        data = {'from': params['start'], 'to': params['end']}
+        data.update(fleet_report(
+            params['start'], params['end'],
+            outlier_threshold=params['outlier_threshold'],
+            max_outliers=params['max_outliers'],
+        ))
+        return Response(data)
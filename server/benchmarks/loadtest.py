@@ -0,0 +1,303 @@
+import asyncio
+import datetime
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from urllib.parse import urlsplit
+
+from finance.models import Invoice
+from logistics.models import Destination
+from shipping.models import Parcel, Shipment
+from support.models import Incident
+from users.models import User
+
+from .runner import summarize
+
+# Concurrent load against a running server. Seeded users of each role log in
+# through /api/token/ and loop over a weighted mix of scenarios until the
+# stage ends:
+#
+#   clients  create shipments, poll their tracking, list their shipments
+#   drivers  list shipments, move pending ones in transit, file incidents
+#   agents   load the dashboard, list invoices, invoice delivered shipments
+#
+# Every request is recorded under its method and route so the report gives
+# throughput, latency percentiles and error rates per endpoint.
+
+MIX = {
+    User.Role.CLIENT: {'create_shipment': 1, 'track': 4, 'list_shipments': 2},
+    User.Role.DRIVER: {'list_shipments': 2, 'start_delivery': 2, 'report_incident': 1},
+    User.Role.AGENT: {'dashboard': 3, 'list_invoices': 2, 'create_invoice': 1},
+}
+# pending shipments and uninvoiced deliveries handed out to drivers and agents
+POOL_SIZE = 5000
+
+
+class HTTPClient:
+    """Minimal HTTP/1.1 JSON client keeping its connection alive between requests."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, token=None):
+        payload = b'' if body is None else json.dumps(body).encode()
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Accept: application/json']
+        if token:
+            head.append(f'Authorization: Bearer {token}')
+        if body is not None:
+            head += ['Content-Type: application/json', f'Content-Length: {len(payload)}']
+        message = ('\r\n'.join(head) + '\r\n\r\n').encode() + payload
+        # a kept alive connection may have been closed by the server, the
+        # request is sent again once on a new one
+        for attempt in range(2):
+            fresh = self.writer is None
+            if fresh:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(message)
+                await self.writer.drain()
+                return await self._response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if fresh or attempt:
+                    raise
+
+    async def _response(self):
+        status = int((await self.reader.readuntil(b'\r\n')).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while size := int((await self.reader.readuntil(b'\r\n')).strip(), 16):
+                body += (await self.reader.readexactly(size + 2))[:-2]
+            await self.reader.readuntil(b'\r\n')
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        return status, data
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, name, elapsed, status):
+        self.latencies[name].append(elapsed * 1000)
+        self.statuses[name][status] += 1
+
+    def report(self, duration):
+        endpoints = []
+        for name in sorted(self.statuses):
+            statuses = self.statuses[name]
+            requests = sum(statuses.values())
+            errors = sum(count for status, count in statuses.items() if status == 'error' or status >= 400)
+            endpoints.append({
+                'name': name,
+                'requests': requests,
+                'throughput_rps': round(requests / duration, 2),
+                'latency_ms': summarize(self.latencies[name]),
+                'errors': errors,
+                'error_rate': round(errors / requests, 4),
+                'statuses': {str(status): count for status, count in statuses.items()},
+            })
+        requests = sum(endpoint['requests'] for endpoint in endpoints)
+        errors = sum(endpoint['errors'] for endpoint in endpoints)
+        return {
+            'duration_s': round(duration, 2),
+            'requests': requests,
+            'throughput_rps': round(requests / duration, 2) if duration else 0,
+            'error_rate': round(errors / requests, 4) if requests else 0,
+            'latency_ms': summarize([ms for values in self.latencies.values() for ms in values]) if requests else None,
+            'endpoints': endpoints,
+        }
+
+
+def prepare(prefix, counts, password):
+    """
+    Accounts and work for the virtual users, read from the database before
+    the load starts: seeded users of each role, the known places, pending
+    shipments outside tours and delivered shipments not invoiced yet.
+    """
+    accounts = {}
+    for role, count in counts.items():
+        users = User.objects.filter(role=role, username__startswith=f'{prefix}_').order_by('id')[:count]
+        accounts[role] = [(user.id, user.username, password) for user in users]
+
+    places = list(Destination.objects.values_list('city', 'country')[:200])
+    pending = list(
+        Shipment.objects
+        .filter(status=Shipment.ShipmentStatus.PENDING, tour__isnull=True)
+        .order_by('-id').values_list('id', flat=True)[:POOL_SIZE]
+    )
+    uninvoiced = defaultdict(list)
+    for shipment_id, client_id in (
+        Shipment.objects
+        .filter(status=Shipment.ShipmentStatus.DELIVERED, invoice__isnull=True)
+        .order_by('-id').values_list('id', 'client_id')[:POOL_SIZE]
+    ):
+        uninvoiced[client_id].append(shipment_id)
+    tracking = list(Parcel.objects.order_by('-id').values_list('tracking_number', flat=True)[:1000])
+    return {
+        'accounts': accounts,
+        'places': places,
+        'pending': deque(pending),
+        'uninvoiced': deque(uninvoiced.items()),
+        'tracking': tracking,
+    }
+
+
+class VirtualUser:
+    def __init__(self, role, account, base, work, stats, login_stats, rng):
+        self.role = role
+        self.user_id, self.username, self.password = account
+        self.http = HTTPClient(*base)
+        self.work, self.stats, self.login_stats, self.random = work, stats, login_stats, rng
+        self.token = None
+        self.tracking = deque(self.random.sample(work['tracking'], min(5, len(work['tracking']))), maxlen=20)
+
+    async def call(self, name, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            status, data = await self.http.request(method, path, body, self.token)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            self.stats.record(name, time.perf_counter() - start, 'error')
+            await self.http.close()
+            return None, None
+        self.stats.record(name, time.perf_counter() - start, status)
+        return status, data
+
+    async def login(self):
+        # logins are recorded on their own, hashing passwords is slow by
+        # design and would drown the mix
+        stats, self.stats = self.stats, self.login_stats
+        status, data = await self.call(
+            'POST /api/token/', 'POST', '/api/token/', {'username': self.username, 'password': self.password}
+        )
+        self.stats = stats
+        self.token = data.get('access') if status == 200 and data else None
+
+    async def run(self, deadline, think):
+        if self.token is None:
+            return
+        scenarios = MIX[self.role]
+        names, weights = list(scenarios), list(scenarios.values())
+        while time.monotonic() < deadline:
+            await getattr(self, self.random.choices(names, weights)[0])()
+            if think:
+                await asyncio.sleep(self.random.uniform(0, 2 * think))
+        await self.http.close()
+
+    # clients
+
+    async def create_shipment(self):
+        origin, destination = self.random.sample(self.work['places'], 2)
+        status, data = await self.call('POST /api/shipments/', 'POST', '/api/shipments/?expand=parcels', {
+            'client_id': self.user_id,
+            'origin': {'city': origin[0], 'country': origin[1]},
+            'destination': {'city': destination[0], 'country': destination[1]},
+            'service_type': self.random.choice(Shipment.ServiceType.values),
+            'parcels': [
+                {'weight_kg': f'{self.random.uniform(0.5, 20):.2f}', 'length_cm': 30, 'width_cm': 20, 'height_cm': 15}
+                for _ in range(self.random.randint(1, 3))
+            ],
+        })
+        if status == 201:
+            self.tracking.extend(parcel['tracking_number'] for parcel in data['parcels'])
+
+    async def track(self):
+        if self.tracking:
+            number = self.random.choice(self.tracking)
+            await self.call('GET /api/track/{tracking}/', 'GET', f'/api/track/{number}/')
+
+    async def list_shipments(self):
+        await self.call('GET /api/shipments/', 'GET', '/api/shipments/')
+
+    # drivers
+
+    async def start_delivery(self):
+        if self.work['pending']:
+            shipment_id = self.work['pending'].popleft()
+            await self.call('PATCH /api/shipments/{id}/', 'PATCH', f'/api/shipments/{shipment_id}/', {
+                'status': Shipment.ShipmentStatus.IN_TRANSIT,
+            })
+
+    async def report_incident(self):
+        status, data = await self.call(
+            'GET /api/shipments/?fields=id', 'GET', '/api/shipments/?fields=id&page_size=20'
+        )
+        if status == 200 and data['results']:
+            await self.call('POST /api/incidents/', 'POST', '/api/incidents/', {
+                'shipment_id': self.random.choice(data['results'])['id'],
+                'incident_type': self.random.choice(Incident.IncidentType.values),
+                'description': 'Reported by the load test.',
+            })
+
+    # agents
+
+    async def dashboard(self):
+        await self.call('GET /api/analytics/dashboard/', 'GET', '/api/analytics/dashboard/')
+
+    async def list_invoices(self):
+        await self.call('GET /api/invoices/', 'GET', '/api/invoices/')
+
+    async def create_invoice(self):
+        if self.work['uninvoiced']:
+            client_id, shipment_ids = self.work['uninvoiced'].popleft()
+            await self.call('POST /api/invoices/', 'POST', '/api/invoices/', {
+                'client_id': client_id,
+                'shipment_ids': shipment_ids,
+                'due_date': (datetime.date.today() + datetime.timedelta(days=30)).isoformat(),
+                'status': Invoice.InvoiceStatus.UNPAID,
+            })
+
+
+async def run_stage(url, work, counts, duration, think, seed=0):
+    """
+    Log `counts` virtual users per role in, then run them for `duration`
+    seconds and report the requests they made.
+    """
+    parts = urlsplit(url)
+    base = (parts.hostname, parts.port or 80)
+    stats, login_stats = Stats(), Stats()
+    rng = random.Random(seed)
+    users = [
+        VirtualUser(role, work['accounts'][role][k % len(work['accounts'][role])], base, work, stats, login_stats,
+                    random.Random(rng.random()))
+        for role, count in counts.items() if work['accounts'].get(role)
+        for k in range(count)
+    ]
+    started = time.monotonic()
+    await asyncio.gather(*(user.login() for user in users))
+    logins = login_stats.report(time.monotonic() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*(user.run(started + duration, think) for user in users))
+    report = stats.report(time.monotonic() - started)
+    report['users'] = {role: count for role, count in counts.items()}
+    report['login'] = {name: logins[name] for name in ('requests', 'error_rate', 'latency_ms')}
+    return report
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from benchmarks.loadtest import prepare, run_stage
+from benchmarks.seed import DEFAULT_PASSWORD
+from users.models import User
+
+
+def _wait_for(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = "Replay a concurrent mix of client, driver and agent requests against a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=None,
+                            help="Server to load, e.g. http://127.0.0.1:8000 (default: start runserver on --port).")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--drivers', type=int, default=5)
+        parser.add_argument('--agents', type=int, default=3)
+        parser.add_argument('--duration', type=float, default=30, help="Seconds per stage.")
+        parser.add_argument('--think', type=float, default=0.5, help="Mean pause between scenarios, in seconds.")
+        parser.add_argument('--scale', default='1',
+                            help="Comma separated user multipliers, one stage each, e.g. 1,2,4,8.")
+        parser.add_argument('--prefix', default='seed', help="Prefix of the seeded users to log in as.")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None,
+                            help="Results file (default: var/loadtests/<timestamp>.json).")
+
+    def handle(self, *args, **options):
+        try:
+            scales = [float(scale) for scale in options['scale'].split(',')]
+        except ValueError:
+            raise CommandError("--scale takes comma separated numbers.")
+        base = {
+            User.Role.CLIENT: options['clients'],
+            User.Role.DRIVER: options['drivers'],
+            User.Role.AGENT: options['agents'],
+        }
+        stages = [{role: max(1, round(count * scale)) if count else 0 for role, count in base.items()} for scale in scales]
+        work = prepare(options['prefix'], {role: max(stage[role] for stage in stages) for role in base},
+                       options['password'])
+        missing = [role for role, count in base.items() if count and not work['accounts'][role]]
+        if missing:
+            raise CommandError(
+                f"No {', '.join(missing)} users prefixed '{options['prefix']}_', run seed_data first."
+            )
+
+        server = None
+        url = options['url']
+        if url is None:
+            url = f"http://127.0.0.1:{options['port']}"
+            server = subprocess.Popen(
+                [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'runserver',
+                 f"127.0.0.1:{options['port']}", '--noreload'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            if not _wait_for('127.0.0.1', options['port'], 30):
+                server.terminate()
+                raise CommandError("The development server did not start.")
+
+        reports = []
+        try:
+            for stage in stages:
+                report = asyncio.run(run_stage(url, work, stage, options['duration'], options['think'], options['seed']))
+                reports.append(report)
+                self._print(report)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'var' / 'loadtests' / (
+            timezone.now().strftime('%Y%m%d-%H%M%S') + '.json'
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps({
+            'started_at': timezone.now().isoformat(),
+            'url': url,
+            'think_s': options['think'],
+            'stages': reports,
+        }, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+    def _print(self, report):
+        users = ', '.join(f"{count} {role.lower()}s" for role, count in report['users'].items())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{users}: {report['requests']} requests, {report['throughput_rps']} req/s, "
+            f"{report['error_rate'] * 100:.1f}% errors"
+        ))
+        login = report['login']
+        if login['requests']:
+            self.stdout.write(
+                f"  logged in {login['requests']} users, p50 {login['latency_ms']['p50']:.1f}ms, "
+                f"{login['error_rate'] * 100:.1f}% errors"
+            )
+        for endpoint in report['endpoints']:
+            latency = endpoint['latency_ms']
+            line = (
+                f"  {endpoint['name']:<36} {endpoint['throughput_rps']:>7.1f} req/s  p50 {latency['p50']:>8.1f}ms  "
+                f"p95 {latency['p95']:>8.1f}ms  p99 {latency['p99']:>8.1f}ms  errors {endpoint['error_rate'] * 100:5.1f}%"
+            )
+            self.stdout.write(self.style.ERROR(line) if endpoint['errors'] else line)
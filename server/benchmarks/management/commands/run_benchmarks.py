@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from benchmarks.runner import ENDPOINTS, compare, load, run
+
+
+class Command(BaseCommand):
+    help = "Measure p50/p95/p99 latency and query counts of the API endpoints and write them as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoints', nargs='*', help="Endpoints to run by name (default: all).")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', default=None,
+                            help="Results file (default: var/benchmarks/<timestamp>.json).")
+        parser.add_argument('--compare', default=None, help="Earlier results file to compare with.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['endpoints']) - {name for name, _, _ in ENDPOINTS}
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        def progress(result):
+            if 'skipped' in result:
+                self.stdout.write(self.style.WARNING(f"{result['name']:<20} skipped, {result['skipped']}"))
+                return
+            latency = result['latency_ms']
+            line = (
+                f"{result['name']:<20} p50 {latency['p50']:>8.1f}ms  p95 {latency['p95']:>8.1f}ms  "
+                f"p99 {latency['p99']:>8.1f}ms  queries {result['queries']['max']:>3}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+        setup_test_environment()
+        try:
+            results = run(options['endpoints'] or None, options['iterations'], options['warmup'], progress)
+        finally:
+            teardown_test_environment()
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'var' / 'benchmarks' / (
+            timezone.now().strftime('%Y%m%d-%H%M%S') + '.json'
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+
+        if options['compare']:
+            for row in compare(load(options['compare']), results):
+                change = '' if row['p95_change'] is None else f"{row['p95_change']:+.1f}%"
+                self.stdout.write(
+                    f"{row['name']:<20} p95 {row['p95_ms'][0]:>8.1f} -> {row['p95_ms'][1]:>8.1f}ms {change:>8}  "
+                    f"queries {row['queries'][0]} -> {row['queries'][1]}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.seed import BATCH_SIZE, DEFAULT_PASSWORD, seed
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic dataset (users, fleet, shipments, invoices, incidents...) with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shipments', type=int, default=10000, help="Shipments to create (default: 10000).")
+        parser.add_argument('--clients', type=int, default=None, help="Clients (default: one per 200 shipments, at least 10).")
+        parser.add_argument('--drivers', type=int, default=None, help="Drivers (default: one per 1000 shipments, at least 5).")
+        parser.add_argument('--vehicles', type=int, default=None, help="Vehicles (default: as many as drivers).")
+        parser.add_argument('--destinations', type=int, default=50)
+        parser.add_argument('--agents', type=int, default=5)
+        parser.add_argument('--days', type=int, default=365, help="Shipments are spread over this many past days.")
+        parser.add_argument('--prefix', default='seed', help="Prefix of the usernames and references created.")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help="Password of every seeded user.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, the same seed gives the same data.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users prefixed '{prefix}_' exist already, pick another --prefix.")
+        if options['destinations'] < 2:
+            raise CommandError("At least two destinations are needed.")
+
+        shipments = options['shipments']
+        drivers = options['drivers'] or max(5, shipments // 1000)
+        started = time.monotonic()
+
+        def progress(done, total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{done}/{total} shipments ({done / elapsed:.0f}/s)")
+
+        counts = seed(
+            shipments=shipments,
+            clients=options['clients'] or max(10, shipments // 200),
+            drivers=drivers,
+            vehicles=options['vehicles'] or drivers,
+            destinations=options['destinations'],
+            agents=options['agents'],
+            progress=progress,
+            prefix=prefix,
+            password=options['password'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f"  {label}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {sum(counts.values())} rows in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,167 @@
+import json
+import time
+
+import numpy as np
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from finance.models import Invoice, Payment
+from server.instrumentation import QueryRecorder
+from shipping.models import Parcel, Shipment, Tour
+from support.models import Claim, Incident
+from users.models import User
+
+# Latency and query counts of the read endpoints, measured in process through
+# the Django test client (so setup_test_environment must have run) against
+# whatever data the database holds, see the seed_data command. Paths may
+# reference {shipment}, {invoice} and {tracking}, filled in from the newest
+# rows.
+
+ENDPOINTS = [
+    # name, role making the request (None for anonymous), path
+    ('me', User.Role.ADMIN, '/api/users/me/'),
+    ('shipments', User.Role.ADMIN, '/api/shipments/'),
+    ('shipments-expanded', User.Role.ADMIN, '/api/shipments/?expand=client,origin_detail,destination_detail,parcels'),
+    ('shipments-sparse', User.Role.ADMIN, '/api/shipments/?fields=id,status,total_cost'),
+    ('shipments-client', User.Role.CLIENT, '/api/shipments/'),
+    ('shipment', User.Role.ADMIN, '/api/shipments/{shipment}/?expand=parcels'),
+    ('parcels', User.Role.ADMIN, '/api/parcels/'),
+    ('tours', User.Role.ADMIN, '/api/tours/'),
+    ('track', None, '/api/track/{tracking}/'),
+    ('invoices', User.Role.ADMIN, '/api/invoices/'),
+    ('invoices-client', User.Role.CLIENT, '/api/invoices/'),
+    ('invoice', User.Role.ADMIN, '/api/invoices/{invoice}/?expand=client,shipments'),
+    ('payments', User.Role.ADMIN, '/api/payments/'),
+    ('incidents', User.Role.ADMIN, '/api/incidents/'),
+    ('claims', User.Role.ADMIN, '/api/claims/'),
+    ('claims-expanded', User.Role.ADMIN, '/api/claims/?expand=client,incident.shipment'),
+    ('drivers', User.Role.ADMIN, '/api/drivers/'),
+    ('vehicles', User.Role.ADMIN, '/api/vehicles/'),
+    ('destinations', User.Role.ADMIN, '/api/destinations/'),
+    ('dashboard', User.Role.ADMIN, '/api/analytics/dashboard/'),
+    ('timeseries', User.Role.ADMIN, '/api/analytics/timeseries/?bucket=week&group_by=service_type'),
+    ('fleet', User.Role.ADMIN, '/api/analytics/fleet/'),
+]
+
+PERCENTILES = (50, 95, 99)
+COUNTED_MODELS = (User, Shipment, Parcel, Tour, Invoice, Payment, Incident, Claim)
+
+
+def _references():
+    shipment = Shipment.objects.order_by('-id').first()
+    parcel = Parcel.objects.order_by('-id').first()
+    invoice = Invoice.objects.order_by('-id').first()
+    return {
+        'shipment': shipment.id if shipment else 0,
+        'tracking': parcel.tracking_number if parcel else '-',
+        'invoice': invoice.id if invoice else 0,
+    }
+
+
+def _clients(roles):
+    # one client per role, authenticated with an access token of the first
+    # user having it. Clients act for the owner of the newest shipment so
+    # their lists are not empty
+    clients = {None: Client()}
+    for role in roles - {None}:
+        users = User.objects.filter(role=role).order_by('id')
+        if role == User.Role.CLIENT:
+            newest = Shipment.objects.order_by('-id').values_list('client_id', flat=True).first()
+            users = users.filter(id=newest) if newest else users
+        user = users.first()
+        if user is not None:
+            token = RefreshToken.for_user(user).access_token
+            clients[role] = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return clients
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        **{f'p{p}': round(float(np.percentile(values, p)), 3) for p in PERCENTILES},
+        'mean': round(float(values.mean()), 3),
+        'min': round(float(values.min()), 3),
+        'max': round(float(values.max()), 3),
+    }
+
+
+def measure(client, path, iterations, warmup):
+    """Latencies (ms), query counts and status codes of `iterations` GETs of one path."""
+    for _ in range(warmup):
+        client.get(path)
+    latencies, queries, statuses = [], [], {}
+    for _ in range(iterations):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - start
+        latencies.append(elapsed * 1000)
+        queries.append(recorder.count)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return latencies, queries, statuses
+
+
+def run(names=None, iterations=50, warmup=3, progress=None):
+    """
+    Benchmark the endpoints (all of them, or those named) and return the
+    results as a JSON serializable dict. progress(result) is called after
+    each endpoint.
+    """
+    endpoints = [endpoint for endpoint in ENDPOINTS if names is None or endpoint[0] in names]
+    references = _references()
+    clients = _clients({role for _, role, _ in endpoints})
+    results = []
+    for name, role, path in endpoints:
+        path = path.format(**references)
+        client = clients.get(role)
+        if client is None:
+            result = {'name': name, 'path': path, 'role': role, 'skipped': f'no {role} user'}
+        else:
+            latencies, queries, statuses = measure(client, path, iterations, warmup)
+            result = {
+                'name': name,
+                'path': path,
+                'role': role,
+                'iterations': iterations,
+                'latency_ms': summarize(latencies),
+                'queries': {'min': min(queries), 'max': max(queries)},
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'errors': sum(count for status, count in statuses.items() if status >= 400),
+            }
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    return {
+        'started_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'rows': {model._meta.label: model.objects.count() for model in COUNTED_MODELS},
+        'iterations': iterations,
+        'warmup': warmup,
+        'endpoints': results,
+    }
+
+
+def compare(baseline, current):
+    """Per endpoint p95 latency and max query count, before and after."""
+    before = {result['name']: result for result in baseline['endpoints'] if 'latency_ms' in result}
+    rows = []
+    for result in current['endpoints']:
+        old = before.get(result['name'])
+        if old is None or 'latency_ms' not in result:
+            continue
+        old_p95, new_p95 = old['latency_ms']['p95'], result['latency_ms']['p95']
+        rows.append({
+            'name': result['name'],
+            'p95_ms': (old_p95, new_p95),
+            'p95_change': round((new_p95 - old_p95) / old_p95 * 100, 1) if old_p95 else None,
+            'queries': (old['queries']['max'], result['queries']['max']),
+        })
+    return rows
+
+
+def load(path):
+    with open(path) as stream:
+        return json.load(stream)
@@ -0,0 +1,314 @@
+import datetime
+import random
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from analytics import kpis, rollups
+from finance.models import Invoice, LedgerEntry, Payment
+from logistics.models import Destination, Driver, Vehicle
+from shipping.models import Parcel, Shipment, Tour
+from shipping.pricing import CENT, shipment_cost
+from support.models import Claim, Incident
+from users.models import ClientProfile, User
+
+# Synthetic dataset for benchmarks and load tests. Everything is written with
+# bulk_create, shipments and the rows hanging off them chunk by chunk so the
+# memory used does not grow with the scale. Signals are not sent, the
+# analytics snapshot and rollups are rebuilt at the end.
+
+DEFAULT_PASSWORD = 'seed-pass'
+CHUNK_SIZE = 5000
+BATCH_SIZE = 1000
+
+CITIES = [
+    ('Alger', 36.75, 3.06), ('Oran', 35.70, -0.63), ('Constantine', 36.37, 6.61),
+    ('Annaba', 36.90, 7.77), ('Blida', 36.47, 2.83), ('Batna', 35.56, 6.17),
+    ('Setif', 36.19, 5.41), ('Djelfa', 34.67, 3.26), ('Biskra', 34.85, 5.73),
+    ('Tlemcen', 34.88, -1.32), ('Bejaia', 36.75, 5.08), ('Tiaret', 35.37, 1.32),
+    ('Tizi Ouzou', 36.71, 4.05), ('Ouargla', 31.95, 5.33), ('Ghardaia', 32.49, 3.67),
+    ('Bechar', 31.62, -2.22), ('Skikda', 36.88, 6.91), ('Mostaganem', 35.93, 0.09),
+]
+
+STATUS_WEIGHTS = {
+    Shipment.ShipmentStatus.DELIVERED: 70,
+    Shipment.ShipmentStatus.PENDING: 15,
+    Shipment.ShipmentStatus.IN_TRANSIT: 10,
+    Shipment.ShipmentStatus.CANCELLED: 5,
+}
+EXPRESS_SHARE = 0.2
+TOUR_SIZE = 20
+INCIDENT_RATE = 0.02
+CLAIM_RATE = 0.3
+# invoices past their due date are mostly paid, the rest overdue
+PAID_RATE = 0.7
+
+
+@contextmanager
+def given_timestamps(*fields):
+    # bulk_create fills auto_now_add fields with the current time, seeded
+    # rows carry dates spread over the past instead
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Seeder:
+    def __init__(self, prefix='seed', password=DEFAULT_PASSWORD, days=365, seed=0, batch_size=BATCH_SIZE):
+        self.prefix = prefix
+        self.password = make_password(password)
+        self.days = days
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.counts = defaultdict(int)
+        self.balances = defaultdict(Decimal)
+
+    def _create(self, model, objects):
+        objects = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model._meta.label] += len(objects)
+        return objects
+
+    def _users(self, role, names):
+        return self._create(User, [
+            User(username=f'{self.prefix}_{name}', password=self.password, role=role) for name in names
+        ])
+
+    def people(self, clients, drivers, agents):
+        self._users(User.Role.ADMIN, ['admin'])
+        self.agents = self._users(User.Role.AGENT, [f'agent{k}' for k in range(agents)])
+        self.clients = self._users(User.Role.CLIENT, [f'client{k}' for k in range(clients)])
+        self._create(ClientProfile, [
+            ClientProfile(
+                user=client, company_name=f'Company {k}', address=f'{k} rue du Port',
+                phone_number=f'0550{k:06d}',
+            )
+            for k, client in enumerate(self.clients)
+        ])
+        driver_users = self._users(User.Role.DRIVER, [f'driver{k}' for k in range(drivers)])
+        self.drivers = self._create(Driver, [
+            Driver(user=user, license_number=f'{self.prefix.upper()}-{k:06d}')
+            for k, user in enumerate(driver_users)
+        ])
+
+    def fleet(self, vehicles):
+        kinds = [
+            (Vehicle.VehicleType.TRUCK, 12000, 28), (Vehicle.VehicleType.VAN, 1500, 11),
+            (Vehicle.VehicleType.CAR, 400, 7),
+        ]
+        rows = []
+        for k in range(vehicles):
+            kind, capacity, consumption = self.random.choice(kinds)
+            rows.append(Vehicle(
+                registration_number=f'{self.prefix.upper()}-{k:06d}', vehicle_type=kind, capacity_kg=capacity,
+                fuel_consumption=Decimal(consumption + self.random.uniform(-2, 2)).quantize(CENT),
+            ))
+        self.vehicles = self._create(Vehicle, rows)
+
+    def places(self, destinations):
+        places = []
+        for k in range(destinations):
+            city, latitude, longitude = CITIES[k % len(CITIES)]
+            if k >= len(CITIES):
+                city = f'{city} {k // len(CITIES) + 1}'
+            places.append(Destination(
+                city=city, country='DZ', geographic_zone=f'Zone {k % 5 + 1}',
+                latitude=Decimal(latitude + self.random.uniform(-0.3, 0.3)).quantize(Decimal('0.000001')),
+                longitude=Decimal(longitude + self.random.uniform(-0.3, 0.3)).quantize(Decimal('0.000001')),
+                base_rate=Decimal(self.random.randint(5, 30)),
+                weight_rate_per_kg=Decimal(self.random.randint(1, 5)),
+                volume_rate_per_m3=Decimal(self.random.randint(20, 80)),
+            ))
+        self.destinations = self._create(Destination, places)
+
+    def _moment(self, start, hours):
+        return start + datetime.timedelta(hours=self.random.uniform(0, hours))
+
+    def _parcels(self):
+        return [
+            Parcel(
+                weight_kg=Decimal(self.random.uniform(0.2, 30)).quantize(CENT),
+                length_cm=self.random.randint(10, 120), width_cm=self.random.randint(10, 80),
+                height_cm=self.random.randint(5, 80),
+            )
+            for _ in range(self.random.choice((1, 1, 1, 2, 2, 3)))
+        ]
+
+    def _tours(self, shipments, status):
+        # consecutive shipments share a tour, departing after the last of
+        # them was created
+        tours = []
+        for start in range(0, len(shipments), TOUR_SIZE):
+            group = shipments[start:start + TOUR_SIZE]
+            departure = max(shipment.created_at for shipment in group) + datetime.timedelta(hours=2)
+            vehicle = self.random.choice(self.vehicles)
+            hours = self.random.uniform(3, 10)
+            km = hours * self.random.uniform(30, 70)
+            tour = Tour(
+                driver=self.random.choice(self.drivers), vehicle=vehicle, status=status,
+                departure_time=departure, estimated_completion_time=departure + datetime.timedelta(hours=hours),
+            )
+            if status == Tour.TourStatus.COMPLETED:
+                tour.mileage_km = Decimal(km).quantize(CENT)
+                tour.duration_hours = Decimal(hours).quantize(CENT)
+                tour.fuel_consumed_liters = Decimal(
+                    km * float(vehicle.fuel_consumption) / 100 * self.random.uniform(0.8, 1.25)
+                ).quantize(CENT)
+            tours.append((tour, group))
+        self._create(Tour, [tour for tour, _ in tours])
+        for tour, group in tours:
+            for sequence, shipment in enumerate(group, start=1):
+                shipment.tour, shipment.stop_sequence = tour, sequence
+                if status == Tour.TourStatus.COMPLETED:
+                    shipment.delivered_at = self._moment(tour.departure_time, float(tour.duration_hours))
+
+    def _invoices(self, delivered):
+        # one invoice per client and month of delivery for the delivered
+        # shipments of the chunk
+        by_month = defaultdict(list)
+        for shipment in delivered:
+            by_month[shipment.client_id, shipment.delivered_at.year, shipment.delivered_at.month].append(shipment)
+        invoices = []
+        for (client_id, _, _), shipments in by_month.items():
+            issued = max(shipment.delivered_at for shipment in shipments).date() + datetime.timedelta(days=1)
+            due = issued + datetime.timedelta(days=30)
+            if due < self.now.date():
+                paid = self.random.random() < PAID_RATE
+                status = Invoice.InvoiceStatus.PAID if paid else Invoice.InvoiceStatus.OVERDUE
+            else:
+                paid = self.random.random() < PAID_RATE / 2
+                status = Invoice.InvoiceStatus.PAID if paid else Invoice.InvoiceStatus.UNPAID
+            invoice = Invoice(client_id=client_id, status=status, issued_date=issued, due_date=due)
+            invoice.set_totals(sum((shipment.total_cost for shipment in shipments), Decimal('0.00')))
+            invoices.append((invoice, shipments))
+        self._create(Invoice, [invoice for invoice, _ in invoices])
+
+        payments, entries = [], []
+        for invoice, shipments in invoices:
+            ttc = invoice.montant_ttc
+            self.balances[invoice.client_id] += ttc
+            entries.append(LedgerEntry(
+                client_id=invoice.client_id, kind=LedgerEntry.Kind.INVOICE, amount=ttc, invoice=invoice,
+                created_at=timezone.make_aware(datetime.datetime.combine(invoice.issued_date, datetime.time(8))),
+            ))
+            for shipment in shipments:
+                shipment.invoice = invoice
+            if invoice.status == Invoice.InvoiceStatus.PAID:
+                paid_at = timezone.make_aware(datetime.datetime.combine(invoice.issued_date, datetime.time(9)))
+                payments.append(Payment(
+                    invoice=invoice, amount=ttc,
+                    payment_date=self._moment(paid_at, 24 * 25),
+                    payment_method=self.random.choice(Payment.PaymentMethod.values),
+                ))
+                self.balances[invoice.client_id] -= ttc
+        self._create(Payment, payments)
+        entries += [
+            LedgerEntry(
+                client_id=payment.invoice.client_id, kind=LedgerEntry.Kind.PAYMENT, amount=-payment.amount,
+                invoice=payment.invoice, payment=payment, created_at=payment.payment_date,
+            )
+            for payment in payments
+        ]
+        self._create(LedgerEntry, entries)
+
+    def _support(self, shipments):
+        candidates = [shipment for shipment in shipments if shipment.status != Shipment.ShipmentStatus.PENDING]
+        incidents = []
+        for shipment in candidates:
+            if self.random.random() >= INCIDENT_RATE:
+                continue
+            reporter = shipment.tour.driver.user if shipment.tour else self.random.choice(self.agents)
+            incidents.append(Incident(
+                shipment=shipment, reported_by=reporter,
+                incident_type=self.random.choice(Incident.IncidentType.values),
+                status=self.random.choice(Incident.IncidentStatus.values),
+                description='Reported during delivery.', location=shipment.destination.city,
+                date_occurred=self._moment(shipment.created_at, 72),
+            ))
+        self._create(Incident, incidents)
+        self._create(Claim, [
+            Claim(
+                client_id=incident.shipment.client_id, incident=incident, reason='Damaged goods',
+                description='The client asks for a refund.',
+                status=self.random.choice(Claim.ClaimStatus.values),
+                created_at=incident.date_occurred + datetime.timedelta(days=1),
+            )
+            for incident in incidents if self.random.random() < CLAIM_RATE
+        ])
+
+    def shipments(self, count):
+        shipments, parcels = [], []
+        for _ in range(count):
+            origin, destination = self.random.sample(self.destinations, 2)
+            shipment_parcels = self._parcels()
+            shipment = Shipment(
+                client=self.random.choice(self.clients), origin=origin, destination=destination,
+                service_type=(
+                    Shipment.ServiceType.EXPRESS if self.random.random() < EXPRESS_SHARE
+                    else Shipment.ServiceType.STANDARD
+                ),
+                status=self.random.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()))[0],
+                total_cost=shipment_cost(destination, shipment_parcels),
+                created_at=self.now - datetime.timedelta(days=self.random.uniform(0, self.days)),
+            )
+            shipments.append(shipment)
+            parcels.append(shipment_parcels)
+
+        by_status = defaultdict(list)
+        for shipment in sorted(shipments, key=lambda shipment: shipment.created_at):
+            by_status[shipment.status].append(shipment)
+        self._tours(by_status[Shipment.ShipmentStatus.DELIVERED], Tour.TourStatus.COMPLETED)
+        self._tours(by_status[Shipment.ShipmentStatus.IN_TRANSIT], Tour.TourStatus.IN_PROGRESS)
+        self._invoices(by_status[Shipment.ShipmentStatus.DELIVERED])
+        self._create(Shipment, shipments)
+
+        tag = self.prefix.upper()
+        for shipment, shipment_parcels in zip(shipments, parcels):
+            for k, parcel in enumerate(shipment_parcels):
+                parcel.shipment = shipment
+                parcel.tracking_number = f'{tag}-{shipment.id}-{k + 1}'
+        self._create(Parcel, [parcel for shipment_parcels in parcels for parcel in shipment_parcels])
+        self._support(shipments)
+
+    def save_balances(self):
+        profiles = [ClientProfile(user_id=client_id, balance=balance) for client_id, balance in self.balances.items()]
+        ClientProfile.objects.bulk_update(profiles, ['balance'], batch_size=self.batch_size)
+
+
+def seed(shipments, clients, drivers, vehicles, destinations, agents=5, chunk_size=CHUNK_SIZE, progress=None, **options):
+    """
+    Write a dataset of the given size and return the number of rows created
+    per model. progress(done, total) is called after each chunk.
+    """
+    seeder = Seeder(**options)
+    with transaction.atomic():
+        seeder.people(clients, drivers, agents)
+        seeder.fleet(vehicles)
+        seeder.places(destinations)
+
+    timestamps = [
+        Shipment._meta.get_field('created_at'), Invoice._meta.get_field('issued_date'),
+        Payment._meta.get_field('payment_date'), Claim._meta.get_field('created_at'),
+    ]
+    done = 0
+    with given_timestamps(*timestamps):
+        while done < shipments:
+            count = min(chunk_size, shipments - done)
+            with transaction.atomic():
+                seeder.shipments(count)
+            done += count
+            if progress is not None:
+                progress(done, shipments)
+
+    seeder.save_balances()
+    kpis.rebuild()
+    rollups.rebuild()
+    return dict(seeder.counts)
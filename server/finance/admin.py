@@ -1,4 +1,8 @@
 from django.contrib import admin
-from .models import Invoice, Payment
+from .models import BalanceSnapshot, BillingRun, Invoice, LedgerEntry, OverdueSweep, Payment
 admin.site.register(Invoice)
 admin.site.register(Payment)
+admin.site.register(BillingRun)
+admin.site.register(LedgerEntry)
+admin.site.register(BalanceSnapshot)
+admin.site.register(OverdueSweep)
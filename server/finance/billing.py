@@ -0,0 +1,138 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from shipping.models import Shipment
+
+from . import ledger, signals
+from .models import BillingRun, Invoice, LedgerEntry
+
+# Month-end billing. Every client with delivered shipments not invoiced yet
+# gets one invoice for all of them, set-based: the clients come from one
+# grouped query and are billed CHUNK_SIZE at a time, each chunk in its own
+# transaction which
+#
+#   bulk creates the invoices of its clients,
+#   links their shipments with a single UPDATE,
+#   sets the invoice totals from one grouped SUM,
+#   posts the invoices to the ledger, moving the client balances with a
+#   single UPDATE.
+#
+# The run records the last client committed, running it again resumes after
+# it. A chunk only links shipments still without an invoice, so a client
+# billed meanwhile (or by a concurrent run) gets no second invoice: invoices
+# left without shipments are dropped before the chunk commits.
+
+CHUNK_SIZE = 500
+DUE_DAYS = 30
+ZERO = Decimal('0.00')
+TOTAL_FIELDS = ['montant_ht', 'montant_tva', 'montant_ttc']
+
+
+def previous_period_end(today=None):
+    """Last day of the month before today."""
+    today = today or timezone.localdate()
+    return today.replace(day=1) - datetime.timedelta(days=1)
+
+
+def _cutoff(period_end):
+    return timezone.make_aware(datetime.datetime.combine(period_end + datetime.timedelta(days=1), datetime.time.min))
+
+
+def pending_shipments(period_end):
+    """Delivered shipments without an invoice, up to the end of period_end."""
+    return Shipment.objects.filter(
+        status=Shipment.ShipmentStatus.DELIVERED,
+        invoice__isnull=True,
+        delivered_at__lt=_cutoff(period_end),
+    )
+
+
+def start(period_end, due_days=DUE_DAYS):
+    """The unfinished run of the period if there is one, a new run otherwise."""
+    run = (
+        BillingRun.objects
+        .filter(period_end=period_end, status=BillingRun.RunStatus.RUNNING)
+        .order_by('-id').first()
+    )
+    if run is None:
+        run = BillingRun.objects.create(period_end=period_end, due_days=due_days)
+    return run
+
+
+def _bill_chunk(run, client_ids):
+    issued = timezone.localdate()
+    due_date = issued + datetime.timedelta(days=run.due_days)
+    with transaction.atomic():
+        invoices = Invoice.objects.bulk_create([
+            Invoice(client_id=client_id, due_date=due_date, billing_run=run) for client_id in client_ids
+        ])
+        invoice_ids = [invoice.pk for invoice in invoices]
+        linked = pending_shipments(run.period_end).filter(client_id__in=client_ids).update(
+            invoice=Subquery(Invoice.objects.filter(pk__in=invoice_ids, client=OuterRef('client')).values('pk')[:1]),
+            updated_at=timezone.now(),
+        )
+        sums = dict(
+            Shipment.objects
+            .filter(invoice__in=invoice_ids)
+            .values('invoice').annotate(total=Sum('total_cost')).order_by()
+            .values_list('invoice', 'total')
+        )
+        empty = [pk for pk in invoice_ids if pk not in sums]
+        if empty:
+            Invoice.objects.filter(pk__in=empty).delete()
+        invoices = [invoice for invoice in invoices if invoice.pk in sums]
+        for invoice in invoices:
+            invoice.set_totals(sums[invoice.pk])
+        Invoice.objects.bulk_update(invoices, TOTAL_FIELDS)
+
+        if invoices:
+            LedgerEntry.objects.post([ledger.issued(invoice) for invoice in invoices])
+            signals.invoices_bulk_created.send(sender=Invoice, invoices=invoices)
+
+        amount = sum((invoice.montant_ht for invoice in invoices), ZERO)
+        run.last_client_id = client_ids[-1]
+        run.invoices_created += len(invoices)
+        run.shipments_invoiced += linked
+        run.amount_ht += amount
+        run.save(update_fields=['last_client_id', 'invoices_created', 'shipments_invoiced', 'amount_ht'])
+    return len(invoices), linked
+
+
+def run_billing(run, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Bill the clients of the run not billed yet and mark it completed.
+    progress(run, planned_clients) is called after each chunk.
+    """
+    started = time.monotonic()
+    client_ids = list(
+        pending_shipments(run.period_end)
+        .filter(client_id__gt=run.last_client_id)
+        .order_by('client_id').values_list('client_id', flat=True).distinct()
+    )
+    try:
+        for offset in range(0, len(client_ids), chunk_size):
+            _bill_chunk(run, client_ids[offset:offset + chunk_size])
+            if progress is not None:
+                progress(run, len(client_ids))
+    finally:
+        run.duration_seconds += time.monotonic() - started
+        run.save(update_fields=['duration_seconds'])
+    run.status = BillingRun.RunStatus.COMPLETED
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+    return run
+
+
+def throughput(run):
+    """Invoices and shipments billed per second over the run."""
+    if not run.duration_seconds:
+        return {'invoices_per_s': None, 'shipments_per_s': None}
+    return {
+        'invoices_per_s': round(run.invoices_created / run.duration_seconds, 1),
+        'shipments_per_s': round(run.shipments_invoiced / run.duration_seconds, 1),
+    }
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from shipping.models import Shipment
+from users.models import ClientProfile
+
+from .rendering import RENDERER_VERSION, RENDERERS, render
+
+# Invoice documents (PDF, HTML) are rendered by finance.rendering and cached
+# on disk under the hash of what they show:
+# the invoice, its client, its shipments and the renderer version. Any change
+# to one of them gives a new key, so a cached file is never stale and
+# downloading a document again is a file response, nothing is rendered.
+# Files of older versions are left behind, the cache directory can be
+# cleared at any time.
+#
+# A download renders its document on a few threads of the web worker, so
+# the server runs no processes besides its own workers. prerender() (the
+# render_invoices command) renders the documents of a billing run (or any
+# invoices) in bulk: the data is read in a few queries, only the missing
+# documents go to a process pool, and the parent writes the files.
+
+KINDS = tuple(RENDERERS)
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'html': 'text/html; charset=utf-8',
+}
+CURRENCY = 'DZD'
+BATCH_SIZE = 500
+# below this many documents starting worker processes costs more than it saves
+PARALLEL_MIN_DOCUMENTS = 50
+
+
+def _issuer():
+    return list(getattr(settings, 'INVOICE_ISSUER', ()))
+
+
+def _data(invoice, profile, lines, issuer):
+    client = invoice.client
+    return {
+        'reference': invoice.reference,
+        'issued_date': invoice.issued_date.isoformat(),
+        'due_date': invoice.due_date.isoformat(),
+        'status': invoice.get_status_display(),
+        'client': {
+            'name': client.get_full_name() or client.username,
+            'company': profile.get('company_name') or '',
+            'address': profile.get('address') or '',
+            'phone': profile.get('phone_number') or '',
+        },
+        'issuer': issuer,
+        'lines': lines,
+        'montant_ht': str(invoice.montant_ht),
+        'montant_tva': str(invoice.montant_tva),
+        'montant_ttc': str(invoice.montant_ttc),
+        'tva_percent': f'{invoice.TVA_RATE * 100:g}',
+        'currency': CURRENCY,
+    }
+
+
+def _load(invoices):
+    """Document data of invoices (with their client selected), by invoice id, in two queries."""
+    profiles = {
+        row['user_id']: row for row in ClientProfile.objects.filter(
+            user_id__in={invoice.client_id for invoice in invoices}
+        ).values('user_id', 'company_name', 'address', 'phone_number')
+    }
+    rows = (
+        Shipment.objects
+        .filter(invoice__in=[invoice.pk for invoice in invoices])
+        .order_by('invoice_id', 'delivered_at', 'id')
+        .values_list(
+            'invoice_id', 'id', 'service_type', 'origin__city', 'destination__city', 'delivered_at', 'total_cost'
+        )
+    )
+    lines = {}
+    for invoice_id, shipment_id, service, origin, destination, delivered_at, total_cost in rows:
+        lines.setdefault(invoice_id, []).append([
+            shipment_id, service, origin, destination,
+            delivered_at.date().isoformat() if delivered_at else None, str(total_cost),
+        ])
+    issuer = _issuer()
+    return {
+        invoice.pk: _data(invoice, profiles.get(invoice.client_id, {}), lines.get(invoice.pk, []), issuer)
+        for invoice in invoices
+    }
+
+
+def document_data(invoice):
+    """What the document of an invoice shows, as plain values the workers can be sent."""
+    return _load([invoice])[invoice.pk]
+
+
+def document_key(kind, data):
+    payload = json.dumps({'kind': kind, 'renderer': RENDERER_VERSION, 'data': data}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class DocumentCache:
+    """Rendered documents on disk, one file per content key."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, key, kind):
+        return self.directory / key[:2] / f'{key}.{kind}'
+
+    def get(self, key, kind):
+        path = self.path(key, kind)
+        return path if path.exists() else None
+
+    def open(self, key, kind):
+        """The cached file opened for reading, None when it is missing."""
+        try:
+            return self.path(key, kind).open('rb')
+        except FileNotFoundError:
+            # never rendered, or the cache directory was cleared since
+            return None
+
+    def put(self, key, kind, content):
+        path = self.path(key, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # written aside then renamed, a reader never sees a partial file
+        temporary = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        temporary.write_bytes(content)
+        temporary.replace(path)
+        return path
+
+
+cache = DocumentCache(getattr(settings, 'INVOICE_DOCUMENT_DIR', Path(settings.BASE_DIR) / 'var' / 'invoices'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """The threads documents requested through the API are rendered on, started on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'INVOICE_RENDER_THREADS', 2), thread_name_prefix='invoice-render',
+            )
+        return _executor
+
+
+def submit(kind, data):
+    """
+    Render a document in the background and return the future of its bytes.
+    The file is cached when rendering completes, whether the caller still
+    waits for it or not.
+    """
+    key = document_key(kind, data)
+    future = executor().submit(render, kind, data)
+
+    def store(done):
+        if done.exception() is None:
+            cache.put(key, kind, done.result())
+
+    future.add_done_callback(store)
+    return future
+
+
+def _render_all(jobs, workers, executor):
+    # jobs: list of (kind, data)
+    kinds = [kind for kind, _ in jobs]
+    data = [data for _, data in jobs]
+    if executor is None or len(jobs) < PARALLEL_MIN_DOCUMENTS:
+        return map(render, kinds, data)
+    return executor.map(render, kinds, data, chunksize=max(1, len(jobs) // (workers * 4)))
+
+
+def prerender(invoices, kinds=KINDS, workers=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Render and cache the documents of the invoices of a queryset that are
+    not cached yet, spread over a process pool. Returns a report of the
+    documents rendered and already cached. progress(report) is called after
+    each batch.
+    """
+    started = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    report = {'invoices': 0, 'rendered': 0, 'cached': 0, 'bytes': 0}
+    invoices = invoices.select_related('client').order_by('pk')
+    executor = None
+    if workers > 1:
+        # one pool for the whole run, its workers are only started when a
+        # batch is large enough to use them
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    last_id = 0
+    try:
+        while True:
+            batch = list(invoices.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            jobs, keys = [], []
+            for data in _load(batch).values():
+                for kind in kinds:
+                    key = document_key(kind, data)
+                    if cache.get(key, kind) is None:
+                        jobs.append((kind, data))
+                        keys.append(key)
+                    else:
+                        report['cached'] += 1
+            for (kind, _), key, content in zip(jobs, keys, _render_all(jobs, workers, executor)):
+                cache.put(key, kind, content)
+                report['bytes'] += len(content)
+            report['invoices'] += len(batch)
+            report['rendered'] += len(jobs)
+            if progress is not None:
+                progress(report)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    duration = time.monotonic() - started
+    report['duration_s'] = round(duration, 3)
+    report['documents_per_s'] = round(report['rendered'] / duration) if duration else None
+    return report
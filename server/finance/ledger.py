@@ -0,0 +1,144 @@
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from users.models import ClientProfile
+
+from .models import CENT, BalanceSnapshot, LedgerEntry
+
+# Client balances are the sum of their ledger entries. Entries are appended
+# with LedgerEntry.objects.post, which moves ClientProfile.balance in the
+# same transaction; reconcile() checks the two still agree.
+#
+# Snapshots store the balance made of the entries before a moment, taken
+# periodically by the snapshot_balances command, so the balance as of any
+# date is its latest snapshot (an index lookup) plus the entries since.
+
+ZERO = Decimal('0.00')
+BATCH_SIZE = 1000
+
+
+def issued(invoice):
+    """The entry recording an invoice issued to its client, for its TTC amount."""
+    return LedgerEntry(
+        client_id=invoice.client_id, kind=LedgerEntry.Kind.INVOICE,
+        amount=invoice.montant_ttc, invoice_id=invoice.pk,
+    )
+
+
+def adjusted(invoice, delta_ttc):
+    """The entry recording a change of the TTC amount of an issued invoice."""
+    return LedgerEntry(
+        client_id=invoice.client_id, kind=LedgerEntry.Kind.ADJUSTMENT,
+        amount=delta_ttc, invoice_id=invoice.pk,
+    )
+
+
+def balance_as_of(client_id, moment):
+    """Balance of a client made of the entries created before moment."""
+    snapshot = (
+        BalanceSnapshot.objects
+        .filter(client_id=client_id, as_of__lte=moment)
+        .order_by('-as_of').first()
+    )
+    entries = LedgerEntry.objects.filter(client_id=client_id, created_at__lt=moment)
+    balance = ZERO
+    if snapshot is not None:
+        balance = snapshot.balance
+        entries = entries.filter(created_at__gte=snapshot.as_of)
+    return (balance + (entries.aggregate(total=Sum('amount'))['total'] or ZERO)).quantize(CENT)
+
+
+def start_of_day(day=None):
+    day = day or timezone.localdate()
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _client_batches(batch_size):
+    last_id = 0
+    while True:
+        client_ids = list(
+            ClientProfile.objects.filter(user_id__gt=last_id)
+            .order_by('user_id').values_list('user_id', flat=True)[:batch_size]
+        )
+        if not client_ids:
+            return
+        last_id = client_ids[-1]
+        yield client_ids
+
+
+def _sums(entries, client_ids):
+    rows = (
+        entries.filter(client_id__in=client_ids)
+        .values('client').annotate(total=Sum('amount')).order_by()
+        .values_list('client', 'total')
+    )
+    return {client_id: total.quantize(CENT) for client_id, total in rows}
+
+
+def take_snapshots(as_of, batch_size=BATCH_SIZE):
+    """
+    Snapshot the balance of every client as of a moment, from its previous
+    snapshot and the entries since. Returns the number of snapshots written,
+    clients already snapshotted at that moment are skipped.
+    """
+    written = 0
+    for client_ids in _client_batches(batch_size):
+        taken = set(
+            BalanceSnapshot.objects.filter(client_id__in=client_ids, as_of=as_of).values_list('client_id', flat=True)
+        )
+        client_ids = [client_id for client_id in client_ids if client_id not in taken]
+        if not client_ids:
+            continue
+        # snapshots are periodic, the clients of the batch have their last
+        # one at the same moment; those without start from their first entry
+        snapshots = BalanceSnapshot.objects.filter(client_id__in=client_ids, as_of__lt=as_of)
+        previous_as_of = snapshots.aggregate(latest=Max('as_of'))['latest']
+        previous = dict(snapshots.filter(as_of=previous_as_of).values_list('client_id', 'balance'))
+        balances = {client_id: previous.get(client_id, ZERO) for client_id in client_ids}
+
+        entries = LedgerEntry.objects.filter(created_at__lt=as_of)
+        fresh = [client_id for client_id in client_ids if client_id not in previous]
+        sums = _sums(entries, fresh) if fresh else {}
+        if previous:
+            sums.update(_sums(entries.filter(created_at__gte=previous_as_of), list(previous)))
+        for client_id, total in sums.items():
+            balances[client_id] += total
+        written += len(BalanceSnapshot.objects.bulk_create(
+            [BalanceSnapshot(client_id=client_id, as_of=as_of, balance=balance) for client_id, balance in balances.items()],
+            ignore_conflicts=True,
+        ))
+    return written
+
+
+def reconcile(fix=False, batch_size=BATCH_SIZE):
+    """
+    Compare the stored balances with the sums of the ledger, client by client
+    in batches. Returns (checked, mismatches) where mismatches are (client id,
+    stored balance, ledger balance), the stored balances are set to the
+    ledger when fix is set.
+    """
+    checked = 0
+    mismatches = []
+    for client_ids in _client_batches(batch_size):
+        sums = _sums(LedgerEntry.objects.all(), client_ids)
+        profiles = ClientProfile.objects.filter(user_id__in=client_ids).values_list('user_id', 'balance')
+        stale = []
+        for client_id, balance in profiles:
+            expected = sums.get(client_id) or ZERO
+            if balance != expected:
+                mismatches.append((client_id, balance, expected))
+                stale.append(client_id)
+        if fix and stale:
+            with transaction.atomic():
+                # read again under lock, entries posted meanwhile moved both
+                locked = list(ClientProfile.objects.select_for_update().filter(user_id__in=stale))
+                sums = _sums(LedgerEntry.objects.all(), stale)
+                for profile in locked:
+                    profile.balance = sums.get(profile.user_id) or ZERO
+                ClientProfile.objects.bulk_update(locked, ['balance'])
+        checked += len(client_ids)
+    return checked, mismatches
@@ -0,0 +1,49 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.statements import BATCH_SIZE, import_statement
+
+
+class Command(BaseCommand):
+    help = "Import a bank statement (CSV or CAMT.053 XML), recording the payments of the invoices it matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Statement file.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Lines handled per transaction.")
+        parser.add_argument('--unmatched', default=None, help="Write the unmatched lines to this CSV file.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        started = time.monotonic()
+        unmatched_file = open(options['unmatched'], 'w', newline='') if options['unmatched'] else None
+        try:
+            on_unmatched = None
+            if unmatched_file is not None:
+                writer = csv.writer(unmatched_file)
+                writer.writerow(['line', 'booking_date', 'amount', 'reference', 'bank_reference', 'reason'])
+
+                def on_unmatched(line, reason):
+                    writer.writerow([*line, reason])
+
+            try:
+                with open(options['path'], 'rb') as stream:
+                    report = import_statement(
+                        stream, options['path'], batch_size=options['batch_size'], on_unmatched=on_unmatched,
+                    )
+            except OSError as error:
+                raise CommandError(f"Cannot read {options['path']}: {error}")
+        finally:
+            if unmatched_file is not None:
+                unmatched_file.close()
+
+        if unmatched_file is None:
+            for line in report['unmatched_lines'][:20]:
+                self.stdout.write(f"Line {line['line']}: {line['reason']} ({line['reference']!r}, {line['amount']})")
+        for label in ('lines', 'matched', 'amount', 'invoices_paid', 'duplicates', 'debits', 'unmatched'):
+            self.stdout.write(f"  {label}: {report[label]}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['lines']} lines in {time.monotonic() - started:.2f}s ({report['lines_per_s']}/s)"
+        ))
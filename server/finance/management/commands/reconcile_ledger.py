@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.ledger import BATCH_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = "Check the client balances against the ledger, --fix sets the wrong ones to the ledger balance."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the balances that do not match the ledger.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checked, mismatches = reconcile(fix=options['fix'], batch_size=options['batch_size'])
+        for client_id, stored, expected in mismatches[:50]:
+            self.stdout.write(f"Client #{client_id}: balance {stored}, ledger {expected} ({stored - expected:+})")
+        if len(mismatches) > 50:
+            self.stdout.write(f"... and {len(mismatches) - 50} more")
+        summary = f"Checked {checked} clients in {time.monotonic() - started:.2f}s, {len(mismatches)} mismatched"
+        if mismatches and not options['fix']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary + (", fixed" if mismatches else "")))
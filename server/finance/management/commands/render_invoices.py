@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.documents import BATCH_SIZE, KINDS, prerender
+from finance.models import BillingRun, Invoice
+
+
+class Command(BaseCommand):
+    help = "Render the documents of invoices not cached yet, those of a billing run or all of them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--billing-run', type=int, default=None, help="Only the invoices of this billing run.")
+        parser.add_argument(
+            '--format', default=','.join(KINDS), help=f"Documents rendered, among {', '.join(KINDS)} (default: all).",
+        )
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU).")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Invoices read per batch.")
+
+    def handle(self, *args, **options):
+        kinds = [kind.strip() for kind in options['format'].split(',') if kind.strip()]
+        unknown = sorted(set(kinds) - set(KINDS))
+        if unknown or not kinds:
+            raise CommandError(f"--format takes {', '.join(KINDS)}, not {', '.join(unknown) or 'nothing'}.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+        started = time.monotonic()
+        invoices = Invoice.objects.all()
+        if options['billing_run'] is not None:
+            if not BillingRun.objects.filter(pk=options['billing_run']).exists():
+                raise CommandError(f"No billing run #{options['billing_run']}.")
+            invoices = invoices.filter(billing_run=options['billing_run'])
+
+        def progress(report):
+            self.stdout.write(f"{report['invoices']} invoices, {report['rendered']} documents rendered")
+
+        report = prerender(
+            invoices, kinds, workers=options['workers'], batch_size=options['batch_size'], progress=progress,
+        )
+        self.stdout.write(f"  {report['cached']} documents already cached, {report['bytes']} bytes written")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {report['rendered']} documents in {time.monotonic() - started:.2f}s"
+            f" ({report['documents_per_s']}/s)"
+        ))
@@ -0,0 +1,42 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.billing import CHUNK_SIZE, DUE_DAYS, previous_period_end, run_billing, start, throughput
+
+
+class Command(BaseCommand):
+    help = "Invoice every client's delivered shipments not invoiced yet, resuming an interrupted run of the period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period-end', type=datetime.date.fromisoformat, default=None,
+            help="Bill shipments delivered up to this day, YYYY-MM-DD (default: end of last month).",
+        )
+        parser.add_argument('--due-days', type=int, default=DUE_DAYS, help="Days the invoices are due after issue.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Clients billed per transaction.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        started = time.monotonic()
+        run = start(options['period_end'] or previous_period_end(), options['due_days'])
+        if run.last_client_id:
+            self.stdout.write(f"Resuming billing run #{run.id} after client #{run.last_client_id}")
+        else:
+            self.stdout.write(f"Billing run #{run.id} up to {run.period_end}")
+        base = run.invoices_created
+
+        def progress(run, planned):
+            elapsed = time.monotonic() - started
+            done = run.invoices_created - base
+            self.stdout.write(f"{done}/{planned} clients billed ({done / elapsed:.0f}/s)")
+
+        run_billing(run, chunk_size=options['chunk_size'], progress=progress)
+        rates = throughput(run)
+        self.stdout.write(
+            f"  {run.invoices_created} invoices, {run.shipments_invoiced} shipments, {run.amount_ht} HT"
+            f" ({rates['invoices_per_s']} invoices/s, {rates['shipments_per_s']} shipments/s)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Billing run #{run.id} completed in {time.monotonic() - started:.2f}s"))
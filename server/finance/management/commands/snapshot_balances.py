@@ -0,0 +1,25 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from finance.ledger import BATCH_SIZE, start_of_day, take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot every client balance as of the start of a day, meant to run daily (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--day', type=datetime.date.fromisoformat, default=None,
+            help="Snapshot the balances at the start of this day, YYYY-MM-DD (default: today).",
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        as_of = start_of_day(options['day'])
+        written = take_snapshots(as_of, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshotted {written} balances as of {as_of:%Y-%m-%d %H:%M} in {time.monotonic() - started:.2f}s"
+        ))
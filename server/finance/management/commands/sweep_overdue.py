@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from finance.overdue import CHUNK_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = "Mark the unpaid invoices past their due date overdue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Invoices updated per transaction.")
+        parser.add_argument('--every', type=int, default=0, help="Keep running, sweeping every this many seconds.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        if options['every'] < 0:
+            raise CommandError("--every must be positive.")
+        while True:
+            try:
+                record = sweep(chunk_size=options['chunk_size'])
+            except DatabaseError as exc:
+                if not options['every']:
+                    raise
+                # a looping sweeper outlives a failed sweep
+                self.stderr.write(f"Overdue sweep failed: {exc}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Marked {record.invoices_marked} invoices overdue ({record.amount_ht} HT)"
+                    f" in {record.duration_seconds:.2f}s"
+                ))
+            if not options['every']:
+                break
+            # the connection would stay open between sweeps
+            connection.close()
+            time.sleep(options['every'])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.totals import BATCH_SIZE, verify
+
+
+class Command(BaseCommand):
+    help = "Check the stored invoice totals against their shipments, --fix rewrites the wrong ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the totals that do not match (backfill).")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checked, mismatches = verify(fix=options['fix'], batch_size=options['batch_size'])
+        for invoice_id, stored, actual in mismatches[:50]:
+            self.stdout.write(f"Invoice #{invoice_id}: stored HT {stored}, shipments sum to {actual}")
+        if len(mismatches) > 50:
+            self.stdout.write(f"... and {len(mismatches) - 50} more")
+        summary = f"Checked {checked} invoices in {time.monotonic() - started:.2f}s, {len(mismatches)} mismatched"
+        if mismatches and not options['fix']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary + (", fixed" if mismatches else "")))
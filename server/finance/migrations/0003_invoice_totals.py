@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 13:52
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+TVA_RATE = Decimal('0.19')
+CENT = Decimal('0.01')
+
+
+def backfill_totals(apps, schema_editor):
+    # one grouped query, then the invoices having shipments are rewritten
+    Invoice = apps.get_model('finance', 'Invoice')
+    Shipment = apps.get_model('shipping', 'Shipment')
+    sums = (
+        Shipment.objects.filter(invoice__isnull=False)
+        .values('invoice').annotate(total=Sum('total_cost')).order_by()
+        .values_list('invoice', 'total')
+    )
+    invoices = []
+    for invoice_id, total in sums:
+        tva = (total * TVA_RATE).quantize(CENT)
+        invoices.append(Invoice(id=invoice_id, montant_ht=total, montant_tva=tva, montant_ttc=total + tva))
+    Invoice.objects.bulk_update(invoices, ['montant_ht', 'montant_tva', 'montant_ttc'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_initial'),
+        ('shipping', '0005_shipment_delivered_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='montant_ht',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='montant_ttc',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='montant_tva',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 13:54
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_invoice_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_end', models.DateField()),
+                ('due_days', models.PositiveIntegerField(default=30)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed')], default='RUNNING', max_length=20)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_client_id', models.BigIntegerField(default=0)),
+                ('invoices_created', models.PositiveIntegerField(default=0)),
+                ('shipments_invoiced', models.PositiveIntegerField(default=0)),
+                ('amount_ht', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('duration_seconds', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='billing_run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='finance.billingrun'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 14:01
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('invoices_marked', models.PositiveIntegerField(default=0)),
+                ('amount_ht', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('duration_seconds', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'due_date'], name='finance_inv_status_0e2dc8_idx'),
+        ),
+    ]
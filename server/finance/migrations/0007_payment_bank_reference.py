@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_overdue_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='bank_reference',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
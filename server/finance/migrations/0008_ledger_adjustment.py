@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_payment_bank_reference'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='kind',
+            field=models.CharField(choices=[('OPENING', 'Opening balance'), ('INVOICE', 'Invoice issued'), ('ADJUSTMENT', 'Invoice adjusted'), ('PAYMENT', 'Payment'), ('REVERSAL', 'Reversal')], max_length=20),
+        ),
+    ]
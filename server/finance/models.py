@@ -1,9 +1,52 @@
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.utils import timezone
 from users.models import User
 from decimal import Decimal
 from users.models import ClientProfile
 
+CENT = Decimal('0.01')
+
+
+class BillingRun(models.Model):
+    """A month-end invoicing of the delivered shipments, see finance.billing."""
+
+    class RunStatus(models.TextChoices):
+        RUNNING = 'RUNNING', 'Running'
+        COMPLETED = 'COMPLETED', 'Completed'
+
+    # shipments delivered up to the end of this day are invoiced
+    period_end = models.DateField()
+    due_days = models.PositiveIntegerField(default=30)
+    status = models.CharField(max_length=20, choices=RunStatus.choices, default=RunStatus.RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # clients are billed in id order, a run picks up after the last one
+    # committed when resumed
+    last_client_id = models.BigIntegerField(default=0)
+    invoices_created = models.PositiveIntegerField(default=0)
+    shipments_invoiced = models.PositiveIntegerField(default=0)
+    amount_ht = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    # time spent billing, over all the attempts of the run
+    duration_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Billing run #{self.id} to {self.period_end} ({self.status})"
+
+
+class OverdueSweep(models.Model):
+    """A pass marking the unpaid invoices past their due date overdue, see finance.overdue."""
+    # invoices due before this day were swept
+    as_of = models.DateField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    invoices_marked = models.PositiveIntegerField(default=0)
+    amount_ht = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    duration_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Overdue sweep of {self.as_of}: {self.invoices_marked} invoices"
+
+
 class Invoice(models.Model):
    
     class InvoiceStatus(models.TextChoices):
@@ -17,9 +60,21 @@ class Invoice(models.Model):
     status = models.CharField(max_length=20, choices=InvoiceStatus.choices, default=InvoiceStatus.UNPAID)
     issued_date = models.DateField(auto_now_add=True)
     due_date = models.DateField()
+    billing_run = models.ForeignKey(
+        BillingRun, on_delete=models.SET_NULL, null=True, blank=True, related_name='invoices'
+    )
+    # totals are stored, kept in step by finance.totals when shipments are
+    # attached, detached or repriced
+    montant_ht = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    montant_tva = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    montant_ttc = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     
     TVA_RATE = Decimal('0.19') #19% vat
 
+    class Meta:
+        # unpaid invoices by due date, scanned by the overdue sweep
+        indexes = [models.Index(fields=['status', 'due_date'])]
+
 
     def save(self, *args, **kwargs):
        
@@ -30,26 +85,26 @@ class Invoice(models.Model):
             pass
 
     def delete(self, *args, **kwargs):
-       
-        client_profile = ClientProfile.objects.get(user=self.client)
-        
-        client_profile.balance -= self.montant_ttc
-        client_profile.save()
-        super().delete(*args, **kwargs)
-
-    @property
-    def montant_ht(self):
-        aggregation = self.shipments.aggregate(total=Sum('total_cost'))
-        return aggregation['total'] or Decimal('0.00')
+        with transaction.atomic():
+            # what the ledger holds for the invoice, its totals may have
+            # moved since it was issued
+            posted = LedgerEntry.objects.filter(invoice_id=self.pk).aggregate(total=Sum('amount'))['total']
+            LedgerEntry.objects.post([LedgerEntry(
+                client_id=self.client_id, kind=LedgerEntry.Kind.REVERSAL,
+                amount=-(posted or 0), invoice_id=self.pk,
+            )])
+            return super().delete(*args, **kwargs)
 
-    @property
-    def montant_tva(self):
-       #vat amount
-        return self.montant_ht * self.TVA_RATE
+    def set_totals(self, montant_ht):
+        # vat is rounded to the cent, ttc is the sum of the stored amounts
+        self.montant_ht = Decimal(montant_ht).quantize(CENT)
+        self.montant_tva = (self.montant_ht * self.TVA_RATE).quantize(CENT)
+        self.montant_ttc = self.montant_ht + self.montant_tva
 
     @property
-    def montant_ttc(self):
-        return self.montant_ht + self.montant_tva
+    def reference(self):
+        # quoted by clients on their transfers, see finance.statements
+        return f"INV-{self.pk:06d}"
 
     def __str__(self):
         return f"Invoice #{self.id} for {self.client.username} - {self.montant_ttc:.2f} TTC"
@@ -64,12 +119,123 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
     payment_method = models.CharField(max_length=50, choices=PaymentMethod.choices)
+    # id of the bank statement line the payment was imported from
+    bank_reference = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        client_profile = ClientProfile.objects.get(user=self.invoice.client)
-        client_profile.balance -= self.amount
-        client_profile.save()
+        with transaction.atomic():
+            old_amount = None
+            if not self._state.adding:
+                old_amount = Payment.objects.filter(pk=self.pk).values_list('amount', flat=True).first()
+            super().save(*args, **kwargs)
+            client_id = self.invoice.client_id
+            entries = []
+            if old_amount is not None and old_amount != self.amount:
+                # a corrected amount reverses the one recorded
+                entries.append(LedgerEntry(
+                    client_id=client_id, kind=LedgerEntry.Kind.REVERSAL,
+                    amount=old_amount, invoice_id=self.invoice_id, payment_id=self.pk,
+                ))
+            if old_amount is None or old_amount != self.amount:
+                entries.append(LedgerEntry(
+                    client_id=client_id, kind=LedgerEntry.Kind.PAYMENT,
+                    amount=-Decimal(self.amount), invoice_id=self.invoice_id, payment_id=self.pk,
+                ))
+            LedgerEntry.objects.post(entries)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            LedgerEntry.objects.post([LedgerEntry(
+                client_id=self.invoice.client_id, kind=LedgerEntry.Kind.REVERSAL,
+                amount=self.amount, invoice_id=self.invoice_id, payment_id=self.pk,
+            )])
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"Payment of {self.amount} for Invoice #{self.invoice.id}"
+
+
+class LedgerManager(models.Manager):
+    def post(self, entries):
+        """
+        Append entries and move the balances of their clients by the amounts,
+        with one UPDATE adding to the stored values (never a read-modify-write).
+        """
+        entries = [entry for entry in entries if entry.amount]
+        if not entries:
+            return []
+        client_ids = {entry.client_id for entry in entries}
+        # no savepoint inside a caller's transaction, nothing recovers from a failure here
+        with transaction.atomic(savepoint=False):
+            entries = self.bulk_create(entries)
+            if len(client_ids) == 1:
+                change = Value(sum((Decimal(entry.amount) for entry in entries), Decimal('0.00')))
+            else:
+                # each balance moves by the sum of its client's new entries
+                change = Subquery(
+                    self.filter(
+                        client=OuterRef('user'),
+                        # lets the (client, created_at) index narrow the lookup
+                        created_at__gte=min(entry.created_at for entry in entries),
+                        pk__in=[entry.pk for entry in entries],
+                    )
+                    .values('client').annotate(total=Sum('amount')).values('total')
+                )
+            ClientProfile.objects.filter(user_id__in=client_ids).update(balance=F('balance') + change)
+        return entries
+
+
+class LedgerEntry(models.Model):
+    """
+    A movement of a client balance, positive when the client owes more.
+    Entries are only ever appended: a mistake is undone by a reversal.
+    """
+
+    class Kind(models.TextChoices):
+        OPENING = 'OPENING', 'Opening balance'
+        INVOICE = 'INVOICE', 'Invoice issued'
+        ADJUSTMENT = 'ADJUSTMENT', 'Invoice adjusted'
+        PAYMENT = 'PAYMENT', 'Payment'
+        REVERSAL = 'REVERSAL', 'Reversal'
+
+    client = models.ForeignKey(User, on_delete=models.PROTECT, related_name='ledger_entries')
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # references only, the entry outlives the invoice or payment it records
+    invoice = models.ForeignKey(
+        Invoice, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    payment = models.ForeignKey(
+        Payment, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = LedgerManager()
+
+    class Meta:
+        # balance of a client as of a date: entries after its last snapshot
+        indexes = [models.Index(fields=['client', 'created_at'])]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only, post a reversal instead.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only, post a reversal instead.")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.amount} for client #{self.client_id}"
+
+
+class BalanceSnapshot(models.Model):
+    """Balance of a client made of its ledger entries created before as_of."""
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_snapshots')
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['client', 'as_of'], name='balance_snapshot_unique')]
+
+    def __str__(self):
+        return f"Balance of client #{self.client_id} as of {self.as_of}: {self.balance}"
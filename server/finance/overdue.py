@@ -0,0 +1,61 @@
+import logging
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import signals
+from .models import Invoice, OverdueSweep
+
+logger = logging.getLogger(__name__)
+
+# Unpaid invoices whose due date has passed are marked overdue in chunks, each
+# a set-based UPDATE of CHUNK_SIZE invoices read off the (status, due_date)
+# index, so a sweep only touches the invoices it changes. The dashboard KPIs
+# are moved by the HT total of each chunk through invoices_status_changed.
+#
+# Sweeps run from the sweep_overdue command, from cron or as one process
+# looping with --every. Nothing sweeps from the web or other processes.
+
+CHUNK_SIZE = 1000
+ZERO = Decimal('0.00')
+
+
+def _sweep_chunk(today, chunk_size):
+    with transaction.atomic():
+        # locked so a payment landing meanwhile is not marked overdue
+        rows = list(
+            Invoice.objects.select_for_update()
+            .filter(status=Invoice.InvoiceStatus.UNPAID, due_date__lt=today)
+            .order_by('due_date', 'id')
+            .values_list('id', 'montant_ht')[:chunk_size]
+        )
+        if not rows:
+            return 0, ZERO
+        Invoice.objects.filter(pk__in=[pk for pk, _ in rows]).update(status=Invoice.InvoiceStatus.OVERDUE)
+        amount = sum((montant_ht for _, montant_ht in rows), ZERO)
+        signals.invoices_status_changed.send(
+            sender=Invoice, old_status=Invoice.InvoiceStatus.UNPAID,
+            new_status=Invoice.InvoiceStatus.OVERDUE, amount_ht=amount,
+        )
+    return len(rows), amount
+
+
+def sweep(today=None, chunk_size=CHUNK_SIZE):
+    """Mark the unpaid invoices due before today overdue, returns the recorded OverdueSweep."""
+    today = today or timezone.localdate()
+    started = time.monotonic()
+    record = OverdueSweep(as_of=today)
+    while True:
+        marked, amount = _sweep_chunk(today, chunk_size)
+        if not marked:
+            break
+        record.invoices_marked += marked
+        record.amount_ht += amount
+    record.duration_seconds = time.monotonic() - started
+    record.save()
+    if record.invoices_marked:
+        logger.info("Marked %d invoices overdue (%s HT)", record.invoices_marked, record.amount_ht)
+    return record
+
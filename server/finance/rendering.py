@@ -0,0 +1,222 @@
+import html
+
+# Invoice documents built from the plain dict of finance.documents.document_data,
+# kept free of Django imports so they can render in worker processes started
+# with the spawn method. PDFs are written directly (PDF 1.4, the standard
+# Helvetica fonts), no PDF library is needed.
+
+# part of the cache key, bump it when the output of a renderer changes
+RENDERER_VERSION = 2
+
+COLUMNS = ('Shipment', 'Service', 'From', 'To', 'Delivered', 'Amount HT')
+
+
+def _rows(data):
+    return [
+        (f"#{shipment_id}", service, origin, destination, delivered or '-', amount)
+        for shipment_id, service, origin, destination, delivered, amount in data['lines']
+    ]
+
+
+def _totals(data):
+    return [
+        ('Total HT', data['montant_ht']),
+        (f"TVA {data['tva_percent']}%", data['montant_tva']),
+        ('Total TTC', data['montant_ttc']),
+    ]
+
+
+def _client_lines(data):
+    # addresses are free text, one entry per line
+    client = data['client']
+    fields = (client['name'], client['company'], client['address'], client['phone'])
+    return [line.strip() for field in fields for line in field.splitlines() if line.strip()]
+
+
+# HTML
+
+STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; font-size: 13px; color: #222; margin: 40px; }
+h1 { font-size: 22px; margin: 0 0 4px; }
+.parties { display: flex; justify-content: space-between; margin: 24px 0; }
+table { width: 100%; border-collapse: collapse; }
+th, td { padding: 6px 8px; border-bottom: 1px solid #ddd; text-align: left; }
+td.amount, th.amount { text-align: right; }
+.totals { width: 40%; margin-left: auto; margin-top: 16px; }
+.totals tr:last-child td { font-weight: bold; border-top: 2px solid #222; }
+.status { text-transform: uppercase; font-weight: bold; }
+"""
+
+
+def render_html(data):
+    """The invoice as a standalone HTML page, UTF-8 encoded."""
+    e = html.escape
+    issuer = ''.join(f"<div>{e(line)}</div>" for line in data['issuer'])
+    client = ''.join(f"<div>{e(line)}</div>" for line in _client_lines(data))
+    head = ''.join(
+        f'<th class="amount">{e(name)}</th>' if name == COLUMNS[-1] else f"<th>{e(name)}</th>" for name in COLUMNS
+    )
+    rows = ''.join(
+        '<tr>' + ''.join(f"<td>{e(cell)}</td>" for cell in row[:-1]) + f'<td class="amount">{e(row[-1])}</td></tr>'
+        for row in _rows(data)
+    )
+    totals = ''.join(f'<tr><td>{e(label)}</td><td class="amount">{e(value)}</td></tr>' for label, value in _totals(data))
+    return (
+        '<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8">'
+        f"<title>Invoice {e(data['reference'])}</title><style>{STYLE}</style></head><body>"
+        f"<h1>Invoice {e(data['reference'])}</h1>"
+        f"<div>Issued {e(data['issued_date'])}, due {e(data['due_date'])}"
+        f" &middot; <span class=\"status\">{e(data['status'])}</span></div>"
+        f'<div class="parties"><div>{issuer}</div><div>{client}</div></div>'
+        f"<table><thead><tr>{head}</tr></thead><tbody>{rows}</tbody></table>"
+        f'<table class="totals">{totals}</table>'
+        f"<p>Amounts in {e(data['currency'])}.</p>"
+        '</body></html>\n'
+    ).encode()
+
+
+# PDF
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+LINE_HEIGHT = 15
+FIRST_PAGE_ROWS = 34
+PAGE_ROWS = 42
+# x of the column starts, the amount column is right aligned on the margin
+COLUMN_X = (MARGIN, 115, 185, 300, 415)
+# Helvetica advance widths (1/1000 em) of the characters found in amounts
+DIGIT_WIDTHS = {**{digit: 556 for digit in '0123456789'}, '.': 278, ',': 278, ' ': 278, '-': 333, '%': 889}
+
+
+def _pdf_text(text):
+    raw = str(text).encode('cp1252', 'replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _width(text, size):
+    return sum(DIGIT_WIDTHS.get(char, 556) for char in str(text)) * size / 1000
+
+
+class _Page:
+    def __init__(self):
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text(self, x, text, size=10, bold=False, right=False):
+        if right:
+            x -= _width(text, size)
+        font = b'F2' if bold else b'F1'
+        self.ops.append(b'BT /%s %d Tf %.2f %.2f Td (%s) Tj ET' % (font, size, x, self.y, _pdf_text(text)))
+
+    def rule(self, width=0.5):
+        self.ops.append(b'%.2f w %d %.2f m %d %.2f l S' % (width, MARGIN, self.y - 4, PAGE_WIDTH - MARGIN, self.y - 4))
+
+    def down(self, lines=1):
+        self.y -= LINE_HEIGHT * lines
+
+    def lines_left(self):
+        # the line above the bottom margin holds the page number
+        return int((self.y - MARGIN) // LINE_HEIGHT) - 1
+
+    def stream(self):
+        return b'\n'.join(self.ops)
+
+
+def _table_head(page):
+    for x, name in zip(COLUMN_X, COLUMNS):
+        page.text(x, name, bold=True)
+    page.text(PAGE_WIDTH - MARGIN, COLUMNS[-1], bold=True, right=True)
+    page.rule()
+    page.down()
+
+
+def _document(streams):
+    fonts = (
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    )
+    # objects: 1 catalog, 2 page tree, 3-4 fonts, then a page and its content per page
+    page_ids = [5 + 2 * k for k in range(len(streams))]
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % n for n in page_ids), len(streams)),
+        *fonts,
+    ]
+    for page_id, stream in zip(page_ids, streams):
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R'
+            b' /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (PAGE_WIDTH, PAGE_HEIGHT, page_id + 1)
+        )
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_pdf(data):
+    """The invoice as an A4 PDF, the shipment table running over as many pages as needed."""
+    rows = _rows(data)
+    chunks = [rows[:FIRST_PAGE_ROWS]]
+    chunks += [rows[k:k + PAGE_ROWS] for k in range(FIRST_PAGE_ROWS, len(rows), PAGE_ROWS)]
+    pages = []
+    for number, chunk in enumerate(chunks, start=1):
+        page = _Page()
+        if number == 1:
+            page.text(MARGIN, f"Invoice {data['reference']}", size=18, bold=True)
+            page.text(PAGE_WIDTH - MARGIN, data['status'], size=12, bold=True, right=True)
+            page.down(1.5)
+            page.text(MARGIN, f"Issued {data['issued_date']}, due {data['due_date']}")
+            page.down(2)
+            top = page.y
+            for line in data['issuer']:
+                page.text(MARGIN, line)
+                page.down()
+            left_bottom, page.y = page.y, top
+            for line in _client_lines(data):
+                page.text(PAGE_WIDTH / 2, line)
+                page.down()
+            page.y = min(page.y, left_bottom)
+            page.down()
+        _table_head(page)
+        for row in chunk:
+            for x, cell in zip(COLUMN_X, row[:-1]):
+                page.text(x, str(cell)[:22])
+            page.text(PAGE_WIDTH - MARGIN, row[-1], right=True)
+            page.down()
+        pages.append(page)
+
+    totals = _totals(data)
+    # the totals and the blank line above them move to a page of their own
+    # when the table left no room for them
+    if page.lines_left() < len(totals) + 1:
+        page = _Page()
+        pages.append(page)
+    else:
+        page.down()
+    for label, value in totals:
+        bold = label == 'Total TTC'
+        page.text(COLUMN_X[-1] - 40, label, bold=bold)
+        page.text(PAGE_WIDTH - MARGIN, f"{value} {data['currency']}", bold=bold, right=True)
+        page.down()
+
+    for number, page in enumerate(pages, start=1):
+        page.y = MARGIN
+        page.text(PAGE_WIDTH - MARGIN, f"Page {number} / {len(pages)}", size=8, right=True)
+    return _document([page.stream() for page in pages])
+
+RENDERERS = {
+    'html': render_html,
+    'pdf': render_pdf,
+}
+
+
+def render(kind, data):
+    """Bytes of the document of a kind ('pdf' or 'html') for the data of an invoice."""
+    return RENDERERS[kind](data)
@@ -1,10 +1,17 @@
+from django.db import transaction
 from rest_framework import serializers
 from shipping.models import Shipment
-from users.models import ClientProfile, User
-from .models import Invoice, Payment
+from users.models import User
+from . import ledger
+from .billing import CHUNK_SIZE, DUE_DAYS
+from .models import BillingRun, Invoice, LedgerEntry, Payment
+from .totals import shipments_attached
 from shipping.serializers import ShipmentSerializer 
+from server.fieldsets import SparseFieldsetMixin
+from users.serializers import UserSerializer
+from server.instrumentation import TimedDataMixin
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedDataMixin, serializers.ModelSerializer):
    
     invoice_id = serializers.PrimaryKeyRelatedField(read_only=True, source='invoice')
     client_username = serializers.CharField(source='invoice.client.username', read_only=True)
@@ -13,7 +20,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = ['id', 'amount', 'payment_date', 'payment_method', 'invoice_id', 'client_username']
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(TimedDataMixin, SparseFieldsetMixin, serializers.ModelSerializer):
    
     shipment_ids = serializers.ListField(
         child=serializers.IntegerField(), write_only=True
@@ -22,34 +29,53 @@ class InvoiceSerializer(serializers.ModelSerializer):
         queryset=User.objects.filter(role=User.Role.CLIENT), source='client', write_only=True
     )
    
+    client = UserSerializer(read_only=True)
     shipments = ShipmentSerializer(many=True, read_only=True)
 
-    montant_ht = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    montant_tva = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    montant_ttc = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    montant_ht = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    montant_tva = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    montant_ttc = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = Invoice
         fields = [
-           'id', 'shipments', 'client_id', 'client_id', 'status', 'issued_date', 'due_date',
+           'id', 'shipments', 'client', 'client_id', 'status', 'issued_date', 'due_date',
             'shipment_ids', 'montant_ht', 'montant_tva', 'montant_ttc'
         ]
+        expandable_fields = ['client', 'shipments']
         
 
     def create(self, validated_data):
         shipment_ids = validated_data.pop('shipment_ids')
         client = validated_data.get('client')
 
-        
-        invoice = Invoice.objects.create(**validated_data)
+        with transaction.atomic():
+            invoice = Invoice.objects.create(**validated_data)
 
-        
-        shipments_to_update = Shipment.objects.filter(id__in=shipment_ids, client=client, invoice__isnull=True)
-        shipments_to_update.update(invoice=invoice)
+            # the guards stay on the UPDATE, a shipment a concurrent invoice
+            # took in the meantime is left out, then read back what we got
+            Shipment.objects.filter(id__in=shipment_ids, client=client, invoice__isnull=True).update(invoice=invoice)
+            attached_ids = list(invoice.shipments.values_list('id', flat=True))
+            # issued below with its final totals
+            shipments_attached(invoice, attached_ids, issued=False)
+
+            LedgerEntry.objects.post([ledger.issued(invoice)]) # increase client debt
 
-        
-        client_profile = ClientProfile.objects.get(user=client)
-        client_profile.balance += invoice.montant_ttc # increase client debt
-        client_profile.save()
-        
         return invoice
+
+
+class BillingRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BillingRun
+        fields = [
+            'id', 'period_end', 'due_days', 'status', 'started_at', 'finished_at', 'last_client_id',
+            'invoices_created', 'shipments_invoiced', 'amount_ht', 'duration_seconds',
+        ]
+        read_only_fields = fields
+
+
+class BillingRunRequestSerializer(serializers.Serializer):
+    # period_end defaults to the end of last month
+    period_end = serializers.DateField(required=False)
+    due_days = serializers.IntegerField(min_value=0, default=DUE_DAYS)
+    chunk_size = serializers.IntegerField(min_value=1, max_value=5000, default=CHUNK_SIZE)
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from shipping.models import Shipment
+
+from . import totals
+
+# Sent when the HT total of an invoice changes without the invoice row being
+# saved, e.g. shipments attached to it. Arguments: invoice, delta_ht and
+# optionally shipment_ids, the shipments attached (attached=True) or
+# detached (attached=False).
+invoice_totals_changed = Signal()
+
+# Sent after invoices are inserted with bulk_create and their shipments
+# linked with a queryset update, neither of which sends post_save.
+# Arguments: invoices (the created instances, totals set).
+invoices_bulk_created = Signal()
+
+# Sent after invoices changed status with a queryset update. Arguments:
+# old_status, new_status and amount_ht, the HT total of the invoices moved.
+invoices_status_changed = Signal()
+
+# Sent after payments are inserted with bulk_create. Arguments: payments
+# (the created instances).
+payments_bulk_created = Signal()
+
+# shipment fields the totals of its invoice depend on
+TOTAL_FIELDS = {'invoice', 'invoice_id', 'total_cost'}
+
+
+@receiver(post_init, sender=Shipment)
+def remember_loaded_cost(sender, instance, **kwargs):
+    # read __dict__ so deferred fields are not loaded here, None when one is
+    values = instance.__dict__
+    if 'invoice_id' in values and 'total_cost' in values:
+        instance._invoiced_original = (values['invoice_id'], Decimal(str(values['total_cost'])))
+    else:
+        instance._invoiced_original = None
+
+
+@receiver(pre_save, sender=Shipment)
+def remember_invoiced_cost(sender, instance, raw=False, update_fields=None, **kwargs):
+    # the invoice and cost before the save, None when the save cannot change them
+    if raw or (update_fields is not None and not TOTAL_FIELDS & set(update_fields)):
+        instance._invoiced_cost = None
+    elif instance._state.adding:
+        instance._invoiced_cost = (None, Decimal('0.00'))
+    elif instance._invoiced_original is not None:
+        instance._invoiced_cost = instance._invoiced_original
+    else:
+        # loaded with a deferred field, only then is the row read again
+        instance._invoiced_cost = (
+            Shipment.objects.filter(pk=instance.pk).values_list('invoice_id', 'total_cost').first()
+            or (None, Decimal('0.00'))
+        )
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, **kwargs):
+    old = instance.__dict__.pop('_invoiced_cost', None)
+    if old is None:
+        return
+    old_invoice, old_cost = old
+    new_cost = Decimal(str(instance.total_cost))
+    instance._invoiced_original = (instance.invoice_id, new_cost)
+    if old_invoice == instance.invoice_id:
+        if old_invoice is not None and old_cost != new_cost:
+            totals.change_ht(old_invoice, new_cost - old_cost)
+        return
+    if old_invoice is not None:
+        totals.change_ht(old_invoice, -old_cost)
+    if instance.invoice_id is not None:
+        totals.change_ht(instance.invoice_id, new_cost)
+
+
+@receiver(post_delete, sender=Shipment)
+def shipment_deleted(sender, instance, **kwargs):
+    if instance.invoice_id is not None:
+        totals.change_ht(instance.invoice_id, -Decimal(str(instance.total_cost)))
@@ -0,0 +1,295 @@
+import csv
+import datetime
+import io
+import re
+import time
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from django.db import transaction
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import signals
+from .models import Invoice, LedgerEntry, Payment
+
+# Bank statement import. The statement (CSV, or CAMT.053 XML) is read line by
+# line and the credits are matched to open invoices by the reference the
+# client quoted (INV-000123) and the amount still due, against an index of
+# the open invoices built with one query. Lines are handled BATCH_SIZE at a
+# time, each batch in a transaction which bulk inserts the payments, posts
+# them to the ledger (moving the balances with one UPDATE) and marks the
+# invoices paid off with one UPDATE per previous status. Only a batch of
+# lines is held in memory, whatever the size of the statement.
+#
+# Lines carrying a bank reference already imported are skipped, so a
+# statement can be imported again after a failure.
+
+BATCH_SIZE = 2000
+# unmatched lines kept in the report, all are passed to on_unmatched
+REPORT_UNMATCHED = 100
+ZERO = Decimal('0.00')
+REFERENCE = re.compile(r'\bINV[-\s#]*0*(\d+)\b', re.IGNORECASE)
+OPEN_STATUSES = (Invoice.InvoiceStatus.UNPAID, Invoice.InvoiceStatus.OVERDUE)
+
+StatementLine = namedtuple('StatementLine', 'number booking_date amount reference bank_reference')
+
+CSV_COLUMNS = {
+    'amount': ('amount', 'montant', 'credit'),
+    'reference': ('reference', 'remittance', 'description', 'libelle', 'label'),
+    'bank_reference': ('bank_reference', 'transaction_id', 'id'),
+    'booking_date': ('booking_date', 'date', 'value_date'),
+}
+
+
+def _decimal(value):
+    value = (value or '').strip().replace(' ', '')
+    if ',' in value and '.' not in value:
+        value = value.replace(',', '.')
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        return None
+    # NaN and Infinity parse but break every comparison later on
+    if not amount.is_finite():
+        return None
+    return amount.quantize(Decimal('0.01'))
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat((value or '').strip()[:10])
+    except ValueError:
+        return None
+
+
+def read_csv(stream):
+    """Lines of a CSV statement with a header row, stream is a text file."""
+    reader = csv.DictReader(stream)
+    headers = {(name or '').strip().lower(): name for name in reader.fieldnames or ()}
+    columns = {
+        field: next((headers[alias] for alias in aliases if alias in headers), None)
+        for field, aliases in CSV_COLUMNS.items()
+    }
+    for number, row in enumerate(reader, start=2):
+        value = {field: row.get(column) if column else None for field, column in columns.items()}
+        yield StatementLine(
+            number=number,
+            booking_date=_date(value['booking_date']),
+            amount=_decimal(value['amount']),
+            reference=(value['reference'] or '').strip(),
+            bank_reference=(value['bank_reference'] or '').strip() or None,
+        )
+
+
+def _local(tag):
+    return tag.rpartition('}')[2]
+
+
+def _find(element, path):
+    # first descendant along path, ignoring namespaces
+    for name in path.split('/'):
+        element = next((child for child in element if _local(child.tag) == name), None)
+        if element is None:
+            return None
+    return element
+
+
+def _text(element, path):
+    found = _find(element, path)
+    return found.text.strip() if found is not None and found.text else None
+
+
+def _camt_reference(element):
+    remittance = _find(element, 'RmtInf')
+    if remittance is None:
+        return ''
+    return ' '.join(
+        child.text.strip() for child in remittance.iter()
+        if _local(child.tag) in ('Ustrd', 'Ref') and child.text
+    )
+
+
+def read_camt(stream):
+    """
+    Lines of a CAMT.053 statement, stream is a binary file. Each entry (Ntry)
+    gives a line per transaction (TxDtls), debits get a negative amount.
+    Entries are dropped once read so memory stays flat.
+    """
+    number = 0
+    parents = []
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if _local(element.tag) != 'Ntry':
+            continue
+        number += 1
+        sign = -1 if _text(element, 'CdtDbtInd') == 'DBIT' else 1
+        booking_date = _date(_text(element, 'BookgDt/Dt') or _text(element, 'BookgDt/DtTm'))
+        transactions = [
+            child for details in element if _local(details.tag) == 'NtryDtls'
+            for child in details if _local(child.tag) == 'TxDtls'
+        ]
+        for details in transactions or [element]:
+            amount = _decimal(_text(details, 'AmtDtls/TxAmt/Amt') or _text(details, 'Amt') or _text(element, 'Amt'))
+            yield StatementLine(
+                number=number,
+                booking_date=booking_date,
+                amount=amount * sign if amount is not None else None,
+                reference=_camt_reference(details),
+                bank_reference=(
+                    _text(details, 'Refs/AcctSvcrRef') or _text(details, 'Refs/EndToEndId')
+                    or _text(element, 'AcctSvcrRef')
+                ),
+            )
+        if parents:
+            parents[-1].remove(element)
+
+
+def read_statement(stream, name=''):
+    """Lines of a statement given as a seekable binary file, CAMT when it is XML, CSV otherwise."""
+    head = stream.read(64).lstrip(b'\xef\xbb\xbf \t\r\n')
+    stream.seek(0)
+    if name.lower().endswith('.xml') or head.startswith(b'<'):
+        return read_camt(stream)
+    return read_csv(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+
+def open_invoices():
+    """{invoice id: [client id, status, HT total, amount still due]} for the unpaid and overdue invoices."""
+    rows = (
+        Invoice.objects.filter(status__in=OPEN_STATUSES)
+        .annotate(paid=Coalesce(Sum('payments__amount'), Value(ZERO), output_field=DecimalField()))
+        .values_list('id', 'client_id', 'status', 'montant_ht', 'montant_ttc', 'paid')
+    )
+    return {
+        invoice_id: [client_id, status, montant_ht, montant_ttc - paid]
+        for invoice_id, client_id, status, montant_ht, montant_ttc, paid in rows.iterator(chunk_size=BATCH_SIZE)
+    }
+
+
+class StatementImport:
+    def __init__(self, method=Payment.PaymentMethod.BANK_TRANSFER, on_unmatched=None):
+        self.method = method
+        self.on_unmatched = on_unmatched
+        self.invoices = open_invoices()
+        self.report = {
+            'lines': 0, 'matched': 0, 'amount': ZERO, 'invoices_paid': 0,
+            'duplicates': 0, 'debits': 0, 'unmatched': 0, 'unmatched_lines': [],
+        }
+
+    def _unmatched(self, line, reason):
+        self.report['unmatched'] += 1
+        if len(self.report['unmatched_lines']) < REPORT_UNMATCHED:
+            self.report['unmatched_lines'].append({
+                'line': line.number, 'reference': line.reference, 'amount': line.amount, 'reason': reason,
+            })
+        if self.on_unmatched is not None:
+            self.on_unmatched(line, reason)
+
+    def _match(self, line):
+        """The open invoice a line pays, or None after reporting why there is none."""
+        if line.amount is None:
+            return self._unmatched(line, 'no amount')
+        found = REFERENCE.search(line.reference)
+        if found is None:
+            return self._unmatched(line, 'no invoice reference')
+        invoice_id = int(found.group(1))
+        invoice = self.invoices.get(invoice_id)
+        if invoice is None:
+            return self._unmatched(line, 'invoice not open')
+        if line.amount > invoice[3]:
+            return self._unmatched(line, f'amount over the {invoice[3]} due')
+        return invoice_id
+
+    def _batch(self, lines):
+        self.report['lines'] += len(lines)
+        references = [line.bank_reference for line in lines if line.bank_reference]
+        imported = set(Payment.objects.filter(bank_reference__in=references).values_list('bank_reference', flat=True))
+        payments, paid_off = [], []
+        for line in lines:
+            if line.amount is not None and line.amount <= 0:
+                self.report['debits'] += 1
+                continue
+            if line.bank_reference in imported:
+                self.report['duplicates'] += 1
+                continue
+            invoice_id = self._match(line)
+            if invoice_id is None:
+                continue
+            if line.bank_reference:
+                imported.add(line.bank_reference)
+            invoice = self.invoices[invoice_id]
+            invoice[3] -= line.amount
+            payments.append(Payment(
+                invoice_id=invoice_id, amount=line.amount, payment_method=self.method,
+                bank_reference=line.bank_reference,
+            ))
+            if not invoice[3]:
+                paid_off.append(invoice_id)
+        if not payments:
+            return
+
+        try:
+            with transaction.atomic():
+                payments = Payment.objects.bulk_create(payments)
+                LedgerEntry.objects.post([
+                    LedgerEntry(
+                        client_id=self.invoices[payment.invoice_id][0], kind=LedgerEntry.Kind.PAYMENT,
+                        amount=-payment.amount, invoice_id=payment.invoice_id, payment_id=payment.pk,
+                    )
+                    for payment in payments
+                ])
+                signals.payments_bulk_created.send(sender=Payment, payments=payments)
+                for status in OPEN_STATUSES:
+                    invoice_ids = [pk for pk in paid_off if self.invoices[pk][1] == status]
+                    if not invoice_ids:
+                        continue
+                    # an invoice whose status changed since the index was read is left alone
+                    invoice_ids = list(
+                        Invoice.objects.select_for_update()
+                        .filter(pk__in=invoice_ids, status=status).values_list('id', flat=True)
+                    )
+                    Invoice.objects.filter(pk__in=invoice_ids).update(status=Invoice.InvoiceStatus.PAID)
+                    signals.invoices_status_changed.send(
+                        sender=Invoice, old_status=status, new_status=Invoice.InvoiceStatus.PAID,
+                        amount_ht=sum((self.invoices[pk][2] for pk in invoice_ids), ZERO),
+                    )
+        except BaseException:
+            # nothing was written, the index owes the batch's amounts again
+            for payment in payments:
+                self.invoices[payment.invoice_id][3] += payment.amount
+            raise
+        for invoice_id in paid_off:
+            del self.invoices[invoice_id]
+        self.report['matched'] += len(payments)
+        self.report['amount'] += sum((payment.amount for payment in payments), ZERO)
+        self.report['invoices_paid'] += len(paid_off)
+
+    def run(self, lines, batch_size=BATCH_SIZE):
+        started = time.monotonic()
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                self._batch(batch)
+                batch = []
+        if batch:
+            self._batch(batch)
+        duration = time.monotonic() - started
+        self.report['duration_s'] = round(duration, 3)
+        self.report['lines_per_s'] = round(self.report['lines'] / duration) if duration else None
+        return self.report
+
+
+def import_statement(stream, name='', batch_size=BATCH_SIZE, on_unmatched=None):
+    """
+    Import a statement given as a binary file and return the report: lines
+    read, payments matched and their amount, invoices paid off, lines
+    skipped (duplicates, debits) and the unmatched ones with the reason.
+    on_unmatched(line, reason) is called for every unmatched line.
+    """
+    return StatementImport(on_unmatched=on_unmatched).run(read_statement(stream, name), batch_size)
@@ -1,3 +1,429 @@
+import datetime
+import io
+import re
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from logistics.models import Destination
+from server.testing import QueryBudgetMixin, max_queries
+from shipping.models import Shipment
+from users.models import ClientProfile, User
+
+from . import billing, documents, ledger, overdue, rendering, statements, totals
+from .models import Invoice, LedgerEntry, Payment
+
+
+class InvoiceQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        ClientProfile.objects.create(user=cls.client_user, address='-', phone_number='-')
+        cls.origin, cls.destination = Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1)
+            for city in ('Alger', 'Oran')
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_invoices(self, count):
+        invoices = Invoice.objects.bulk_create([
+            Invoice(client=self.client_user, due_date=datetime.date(2026, 12, 31)) for _ in range(count)
+        ])
+        Shipment.objects.bulk_create([
+            Shipment(
+                client=self.client_user, origin=self.origin, destination=self.destination,
+                invoice=invoice, total_cost=Decimal('10.00'),
+            )
+            for invoice in invoices for _ in range(2)
+        ])
+
+    def test_list(self):
+        self.assertQueryBudget('/api/invoices/', 2, self.make_invoices)
+
+    def test_list_expanded(self):
+        self.assertQueryBudget('/api/invoices/?expand=client,shipments.client', 4, self.make_invoices)
+
+
+class BillingRunTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.clients = User.objects.bulk_create([
+            User(username=f'client{k}', role=User.Role.CLIENT) for k in range(3)
+        ])
+        ClientProfile.objects.bulk_create([
+            ClientProfile(user=user, address='-', phone_number='-', balance=Decimal('5.00')) for user in cls.clients
+        ])
+        origin, destination = Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1)
+            for city in ('Alger', 'Oran')
+        ])
+        delivered_at = datetime.datetime(2026, 9, 15, tzinfo=datetime.timezone.utc)
+        Shipment.objects.bulk_create([
+            Shipment(
+                client=user, origin=origin, destination=destination, total_cost=Decimal('10.00'),
+                status=Shipment.ShipmentStatus.DELIVERED, delivered_at=delivered_at,
+            )
+            for user in cls.clients for _ in range(2)
+        ])
+
+    def test_bills_each_client_once(self):
+        run = billing.start(datetime.date(2026, 9, 30))
+        # an interrupted run billed the first client only
+        billing._bill_chunk(run, [self.clients[0].pk])
+        run = billing.run_billing(billing.start(datetime.date(2026, 9, 30)), chunk_size=1)
+
+        self.assertEqual((run.invoices_created, run.shipments_invoiced), (3, 6))
+        self.assertFalse(billing.pending_shipments(run.period_end).exists())
+        for user in self.clients:
+            invoice = Invoice.objects.get(client=user)
+            self.assertEqual(invoice.montant_ttc, Decimal('23.80'))
+            self.assertEqual(ClientProfile.objects.get(user=user).balance, Decimal('28.80'))
+
+    def test_ignores_later_deliveries(self):
+        run = billing.run_billing(billing.start(datetime.date(2026, 9, 1)))
+        self.assertEqual(run.invoices_created, 0)
+        self.assertFalse(Invoice.objects.exists())
+
+
+class InvoiceCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user, cls.other_client = [
+            User.objects.create_user(name, password='x', role=User.Role.CLIENT) for name in ('client', 'other')
+        ]
+        ClientProfile.objects.create(user=cls.client_user, address='-', phone_number='-')
+        destination = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1,
+        )
+        cls.earlier = Invoice.objects.create(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+        cls.free, cls.invoiced, cls.foreign = Shipment.objects.bulk_create([
+            Shipment(
+                client=client, origin=destination, destination=destination, invoice=invoice,
+                total_cost=Decimal('10.00'),
+            )
+            for client, invoice in (
+                (cls.client_user, None), (cls.client_user, cls.earlier), (cls.other_client, None),
+            )
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self):
+        return self.client.post('/api/invoices/', {
+            'client_id': self.client_user.id, 'due_date': '2026-12-31',
+            'shipment_ids': [self.free.id, self.invoiced.id, self.foreign.id],
+        }, format='json')
+
+    def test_attaches_only_free_shipments_of_the_client(self):
+        with max_queries(settings.QUERY_BUDGET):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 201, response.data)
+        invoice = Invoice.objects.get(pk=response.data['id'])
+        self.assertEqual(list(invoice.shipments.values_list('id', flat=True)), [self.free.id])
+        self.assertEqual(invoice.montant_ht, Decimal('10.00'))
+        self.assertEqual(Shipment.objects.get(pk=self.invoiced.id).invoice_id, self.earlier.id)
+
+    def test_failure_leaves_nothing_behind(self):
+        with mock.patch.object(LedgerEntry.objects, 'post', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.post()
+
+        self.assertEqual(Invoice.objects.count(), 1)
+        self.assertIsNone(Shipment.objects.get(pk=self.free.id).invoice_id)
+
+
+class InvoiceTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        ClientProfile.objects.create(user=cls.client_user, address='-', phone_number='-')
+        destination = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1,
+        )
+        cls.invoice = Invoice.objects.create(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+        cls.shipment = Shipment.objects.create(
+            client=cls.client_user, origin=destination, destination=destination, total_cost=Decimal('100.00'),
+        )
+        Shipment.objects.filter(pk=cls.shipment.pk).update(invoice=cls.invoice)
+        totals.shipments_attached(cls.invoice, [cls.shipment.pk], issued=False)
+        LedgerEntry.objects.post([ledger.issued(cls.invoice)])
+
+    def balance(self):
+        return ClientProfile.objects.get(user=self.client_user).balance
+
+    def test_cost_change_is_posted_to_the_ledger(self):
+        shipment = Shipment.objects.get(pk=self.shipment.pk)
+        shipment.total_cost = Decimal('150.00')
+        with CaptureQueriesContext(connection) as queries:
+            shipment.save()
+
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).montant_ttc, Decimal('178.50'))
+        self.assertEqual(self.balance(), Decimal('178.50'))
+        self.assertEqual(ledger.reconcile(), (1, []))
+        # the previous cost comes from the loaded instance, not from the row
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "shipping_shipment"' in query['sql']
+        ])
+
+    def test_detach_and_delete(self):
+        shipment = Shipment.objects.get(pk=self.shipment.pk)
+        shipment.invoice = None
+        shipment.save()
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+        shipment.invoice = self.invoice
+        shipment.save()
+        shipment.delete()
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.assertEqual(ledger.reconcile(), (1, []))
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        ClientProfile.objects.create(user=cls.client_user, address='-', phone_number='-')
+        cls.invoice = Invoice.objects.create(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+
+    def balance(self):
+        return ClientProfile.objects.get(user=self.client_user).balance
+
+    def test_payments_add_up(self):
+        # the profile loaded by one payment is stale for the other, the
+        # balance is moved in the database instead
+        LedgerEntry.objects.post([LedgerEntry(client=self.client_user, kind=LedgerEntry.Kind.INVOICE, amount=100)])
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('30.00'), payment_method='CASH')
+        payment = Payment.objects.create(invoice=self.invoice, amount=Decimal('20.00'), payment_method='CASH')
+        self.assertEqual(self.balance(), Decimal('50.00'))
+        payment.delete()
+        self.assertEqual(self.balance(), Decimal('70.00'))
+        self.assertEqual(ledger.reconcile(), (1, []))
+
+    def test_balance_as_of(self):
+        day = datetime.datetime(2026, 9, 1, tzinfo=datetime.timezone.utc)
+        LedgerEntry.objects.post([
+            LedgerEntry(client=self.client_user, kind=kind, amount=amount, created_at=day + datetime.timedelta(days=days))
+            for kind, amount, days in ((LedgerEntry.Kind.INVOICE, 100, -3), (LedgerEntry.Kind.PAYMENT, -40, 2))
+        ])
+        ledger.take_snapshots(day)
+        self.assertEqual(ledger.balance_as_of(self.client_user.pk, day), Decimal('100.00'))
+        self.assertEqual(ledger.balance_as_of(self.client_user.pk, day + datetime.timedelta(days=5)), Decimal('60.00'))
+        ledger.take_snapshots(day + datetime.timedelta(days=7))
+        self.assertEqual(ledger.balance_as_of(self.client_user.pk, day + datetime.timedelta(days=8)), Decimal('60.00'))
+
+    def test_invoice_delete_reverses_what_was_posted(self):
+        invoice = Invoice(client=self.client_user, due_date=datetime.date(2026, 12, 31))
+        invoice.set_totals(100)
+        invoice.save()
+        LedgerEntry.objects.post([ledger.issued(invoice)])
+        # totals moved without a ledger entry, the reversal must not follow them
+        invoice.set_totals(150)
+        invoice.save()
+
+        invoice.delete()
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.assertEqual(ledger.reconcile(), (1, []))
+
+
+class OverdueSweepTests(TestCase):
+    def test_marks_unpaid_invoices_past_due(self):
+        client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        today = datetime.date(2026, 10, 1)
+        invoices = Invoice.objects.bulk_create([
+            Invoice(client=client_user, status=status, due_date=due_date, montant_ht=Decimal('10.00'))
+            for status, due_date in (
+                (Invoice.InvoiceStatus.UNPAID, datetime.date(2026, 9, 1)),
+                (Invoice.InvoiceStatus.UNPAID, datetime.date(2026, 9, 30)),
+                (Invoice.InvoiceStatus.UNPAID, today),
+                (Invoice.InvoiceStatus.PAID, datetime.date(2026, 9, 1)),
+            )
+        ])
+        record = overdue.sweep(today, chunk_size=1)
+        self.assertEqual((record.invoices_marked, record.amount_ht), (2, Decimal('20.00')))
+        self.assertEqual(
+            [invoice.status for invoice in Invoice.objects.filter(pk__in=[invoice.pk for invoice in invoices]).order_by('pk')],
+            ['OVERDUE', 'OVERDUE', 'UNPAID', 'PAID'],
+        )
+        self.assertEqual(overdue.sweep(today).invoices_marked, 0)
+
+    def test_command(self):
+        client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        Invoice.objects.create(client=client_user, due_date=datetime.date(2020, 1, 1))
+        out = io.StringIO()
+        call_command('sweep_overdue', stdout=out)
+
+        self.assertIn('Marked 1 invoices overdue', out.getvalue())
+        # sweeps only run from the command, loading the app starts no thread
+        self.assertNotIn('overdue-sweeper', [thread.name for thread in threading.enumerate()])
+
+
+class StatementImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        ClientProfile.objects.create(user=cls.client_user, address='-', phone_number='-')
+        cls.invoices = []
+        for _ in range(2):
+            invoice = Invoice(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+            invoice.set_totals(100)
+            invoice.save()
+            LedgerEntry.objects.post([ledger.issued(invoice)])
+            cls.invoices.append(invoice)
+
+    def test_csv(self):
+        first, second = (invoice.reference for invoice in self.invoices)
+        statement = (
+            'date,transaction_id,amount,reference\n'
+            f'2026-10-01,T1,119.00,{first}\n'
+            f'2026-10-01,T2,"19,00",Virement {second}\n'
+            f'2026-10-01,T3,200.00,{second}\n'
+            '2026-10-01,T4,50.00,no reference\n'
+            '2026-10-01,T5,-10.00,bank fees\n'
+            f'2026-10-01,T1,119.00,{first}\n'
+        ).encode()
+        report = statements.import_statement(io.BytesIO(statement))
+
+        self.assertEqual(
+            {key: report[key] for key in ('lines', 'matched', 'invoices_paid', 'duplicates', 'debits', 'unmatched')},
+            {'lines': 6, 'matched': 2, 'invoices_paid': 1, 'duplicates': 1, 'debits': 1, 'unmatched': 2},
+        )
+        self.assertEqual(report['amount'], Decimal('138.00'))
+        self.assertEqual([line['line'] for line in report['unmatched_lines']], [4, 5])
+        self.assertEqual(
+            list(Invoice.objects.filter(client=self.client_user).order_by('pk').values_list('status', flat=True)),
+            ['PAID', 'UNPAID'],
+        )
+        self.assertEqual(ClientProfile.objects.get(user=self.client_user).balance, Decimal('100.00'))
+        self.assertEqual(statements.import_statement(io.BytesIO(statement))['duplicates'], 3)
+
+    def test_non_finite_amounts(self):
+        reference = self.invoices[0].reference
+        statement = (
+            'date,transaction_id,amount,reference\n'
+            f'2026-10-01,T1,NaN,{reference}\n'
+            f'2026-10-01,T2,-Infinity,{reference}\n'
+            f'2026-10-01,T3,sNaN,{reference}\n'
+        ).encode()
+        report = statements.import_statement(io.BytesIO(statement))
+
+        self.assertEqual((report['matched'], report['unmatched']), (0, 3))
+        self.assertEqual({line['reason'] for line in report['unmatched_lines']}, {'no amount'})
+
+    def test_failed_batch_leaves_the_index_alone(self):
+        invoice = self.invoices[0]
+        lines = [
+            statements.StatementLine(1, None, Decimal('100.00'), invoice.reference, 'T1'),
+            statements.StatementLine(2, None, Decimal('19.00'), invoice.reference, 'T2'),
+        ]
+        importer = statements.StatementImport()
+
+        failing = mock.patch.object(LedgerEntry.objects, 'post', side_effect=DatabaseError)
+        with failing, self.assertRaises(DatabaseError):
+            importer.run(lines)
+        self.assertEqual(importer.invoices[invoice.pk][3], Decimal('119.00'))
+        self.assertFalse(Payment.objects.exists())
+
+        report = importer.run(lines)
+        self.assertEqual((report['matched'], report['invoices_paid']), (2, 1))
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).status, Invoice.InvoiceStatus.PAID)
+
+
+class InvoiceDocumentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        ClientProfile.objects.create(user=cls.client_user, address='1 rue du Port\nAlger', phone_number='-')
+        cls.invoice = Invoice(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+        cls.invoice.set_totals(100)
+        cls.invoice.save()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(setattr, documents.cache, 'directory', documents.cache.directory)
+        documents.cache.directory = Path(directory.name)
+
+    def test_prerendered_document_is_served_from_the_cache(self):
+        report = documents.prerender(Invoice.objects.all(), workers=1)
+        self.assertEqual((report['rendered'], report['cached']), (2, 0))
+        self.assertEqual(documents.prerender(Invoice.objects.all(), workers=1)['cached'], 2)
+
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        url = f'/api/invoices/{self.invoice.pk}/document/pdf/'
+        response = api.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF-1.4'))
+        self.assertEqual(api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        data = documents.document_data(self.invoice)
+        self.invoice.status = Invoice.InvoiceStatus.PAID
+        self.assertNotEqual(
+            documents.document_key('pdf', documents.document_data(self.invoice)), documents.document_key('pdf', data)
+        )
+
+    def test_download_renders_and_caches(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        response = api.get(f'/api/invoices/{self.invoice.pk}/document/html/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'1 rue du Port', b''.join(response.streaming_content))
+        key = documents.document_key('html', documents.document_data(self.invoice))
+        self.assertIsNotNone(documents.cache.get(key, 'html'))
+
+    def test_cleared_cache_is_rendered_again(self):
+        documents.prerender(Invoice.objects.filter(pk=self.invoice.pk), workers=1)
+        shutil.rmtree(documents.cache.directory)
+        documents.cache.directory.mkdir()
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+
+        response = api.get(f'/api/invoices/{self.invoice.pk}/document/pdf/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF-1.4'))
+        key = documents.document_key('pdf', documents.document_data(self.invoice))
+        self.assertIsNotNone(documents.cache.get(key, 'pdf'))
+
+    def test_totals_stay_above_the_footer(self):
+        data = documents.document_data(self.invoice)
+        # a long address leaves a full first page no room under the table
+        data['client']['address'] = '\n'.join(f'Address line {k}' for k in range(6))
+        for rows in (0, 1, 33, 34, 35, 75, 76, 118):
+            with self.subTest(rows=rows):
+                data['lines'] = [(k, 'STANDARD', 'Alger', 'Oran', None, '10.00') for k in range(rows)]
+                pages = re.findall(rb'stream\n(.*?)\nendstream', rendering.render_pdf(data), re.DOTALL)
+                self.assertIn(b'(Total TTC)', pages[-1])
+                for page in pages:
+                    heights = [float(y) for y in re.findall(rb'/F[12] 1[0-8] Tf [\d.]+ ([\d.]+) Td', page)]
+                    self.assertGreaterEqual(min(heights), rendering.MARGIN + rendering.LINE_HEIGHT)
+
+    def test_errors_are_json(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        response = api.get('/api/invoices/0/document/pdf/', HTTP_ACCEPT='application/pdf')
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from shipping.models import Shipment
+
+from . import ledger, signals
+from .models import Invoice, LedgerEntry
+
+# Invoice totals are stored on the invoice and moved by deltas when its
+# shipments change. Changes made through Shipment.save are picked up by the
+# receivers in finance.signals, set-based ones (queryset updates) call
+# shipments_attached / shipments_detached, which also send
+# invoice_totals_changed for the analytics. The TTC change of an issued
+# invoice is posted to the ledger as an adjustment, so client balances
+# follow.
+
+ZERO = Decimal('0.00')
+BATCH_SIZE = 1000
+
+
+def change_ht(invoice_id, delta, issued=True):
+    """
+    Move the stored totals of an invoice by delta_ht, the row is locked
+    meanwhile. The TTC change of an issued invoice is posted to the ledger
+    in the same transaction; issued=False is for an invoice being built,
+    whose issue entry is posted once its totals are final.
+    """
+    # no savepoint inside a caller's transaction, nothing recovers from a failure here
+    with transaction.atomic(savepoint=False):
+        invoice = Invoice.objects.select_for_update().filter(pk=invoice_id).first()
+        if invoice is None:
+            return None
+        old_ttc = invoice.montant_ttc
+        invoice.set_totals(invoice.montant_ht + delta)
+        # an update keeps the post_save receivers out, nothing they track changed
+        Invoice.objects.filter(pk=invoice_id).update(
+            montant_ht=invoice.montant_ht, montant_tva=invoice.montant_tva, montant_ttc=invoice.montant_ttc
+        )
+        if issued:
+            LedgerEntry.objects.post([ledger.adjusted(invoice, invoice.montant_ttc - old_ttc)])
+    return invoice
+
+
+def _shipments_changed(invoice, shipment_ids, attached, issued):
+    shipment_ids = list(shipment_ids)
+    if not shipment_ids:
+        return ZERO
+    delta = Shipment.objects.filter(id__in=shipment_ids).aggregate(total=Sum('total_cost'))['total'] or ZERO
+    if not attached:
+        delta = -delta
+    updated = change_ht(invoice.pk, delta, issued=issued)
+    if updated is not None:
+        invoice.set_totals(updated.montant_ht)
+    signals.invoice_totals_changed.send(
+        sender=Invoice, invoice=invoice, delta_ht=delta, shipment_ids=shipment_ids, attached=attached
+    )
+    return delta
+
+
+def shipments_attached(invoice, shipment_ids, issued=True):
+    """Account for shipments linked to the invoice with a queryset update, returns the HT added."""
+    return _shipments_changed(invoice, shipment_ids, attached=True, issued=issued)
+
+
+def shipments_detached(invoice, shipment_ids, issued=True):
+    """Account for shipments unlinked from the invoice with a queryset update, returns the HT removed."""
+    return -_shipments_changed(invoice, shipment_ids, attached=False, issued=issued)
+
+
+def verify(fix=False, batch_size=BATCH_SIZE):
+    """
+    Compare the stored totals with the sums of the shipments, invoice by
+    invoice in batches. Returns (checked, mismatches) where mismatches are
+    (invoice id, stored HT, actual HT), rewritten when fix is set.
+    """
+    checked = 0
+    mismatches = []
+    last_id = 0
+    while True:
+        invoices = list(Invoice.objects.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+        if not invoices:
+            break
+        last_id = invoices[-1].pk
+        sums = dict(
+            Shipment.objects
+            .filter(invoice__in=[invoice.pk for invoice in invoices])
+            .values('invoice').annotate(total=Sum('total_cost')).order_by()
+            .values_list('invoice', 'total')
+        )
+        stale, adjustments = [], []
+        for invoice in invoices:
+            stored = (invoice.montant_ht, invoice.montant_tva, invoice.montant_ttc)
+            invoice.set_totals(sums.get(invoice.pk) or ZERO)
+            if stored != (invoice.montant_ht, invoice.montant_tva, invoice.montant_ttc):
+                mismatches.append((invoice.pk, stored[0], invoice.montant_ht))
+                stale.append(invoice)
+                adjustments.append(ledger.adjusted(invoice, invoice.montant_ttc - stored[2]))
+        if fix and stale:
+            with transaction.atomic():
+                Invoice.objects.bulk_update(stale, ['montant_ht', 'montant_tva', 'montant_ttc'])
+                LedgerEntry.objects.post(adjustments)
+        checked += len(invoices)
+    return checked, mismatches
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import InvoiceViewSet, PaymentViewSet
+from .views import BillingRunViewSet, InvoiceViewSet, PaymentViewSet
 
 
 router = DefaultRouter()
 router.register(r'invoices', InvoiceViewSet, basename='invoice')
 router.register(r'payments', PaymentViewSet, basename='payment')
+router.register(r'billing-runs', BillingRunViewSet, basename='billing-run')
 
 
 urlpatterns = [
@@ -1,7 +1,23 @@
-from rest_framework import viewsets
+import io
+import json
+
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from concurrent.futures import TimeoutError
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+from django.http import FileResponse, HttpResponseNotModified
+from operator import attrgetter
+from server.exports import ExportMixin
+from server.prefetch import AutoPrefetchMixin
 from users.models import User
-from .models import Invoice, Payment
-from .serializers import InvoiceSerializer, PaymentSerializer
+from . import billing, documents, statements
+from .models import BillingRun, Invoice, Payment
+from .serializers import BillingRunRequestSerializer, BillingRunSerializer, InvoiceSerializer, PaymentSerializer
 from users.permissions import IsAdminUser, IsOwnerOrAdmin
 from rest_framework.permissions import BasePermission
 from rest_framework.permissions import IsAuthenticated
@@ -15,28 +31,123 @@ class IsAdminOrAgent(BasePermission):
             request.user.role in [User.Role.ADMIN, User.Role.AGENT]
         )
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class DocumentRenderer(BaseRenderer):
+    """
+    Lets requests accept a document's content type. Documents are file
+    responses, so this only renders the errors and 202 bodies of the
+    document action, as JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class PDFRenderer(DocumentRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class HTMLDocumentRenderer(DocumentRenderer):
+    media_type = 'text/html'
+    format = 'html'
+
+
+class InvoiceViewSet(AutoPrefetchMixin, ExportMixin, viewsets.ModelViewSet):
      
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin] 
 
+    export_filename = 'invoices'
+    export_columns = [
+        ('id', attrgetter('id')),
+        ('client', attrgetter('client.username')),
+        ('status', attrgetter('status')),
+        ('issued_date', attrgetter('issued_date')),
+        ('due_date', attrgetter('due_date')),
+        ('shipment_count', attrgetter('shipment_count')),
+        ('montant_ht', attrgetter('montant_ht')),
+        ('montant_tva', attrgetter('montant_tva')),
+        ('montant_ttc', attrgetter('montant_ttc')),
+    ]
+
     def get_queryset(self):
         user = self.request.user
         if user.role in [User.Role.ADMIN, User.Role.AGENT]:
-            return Invoice.objects.all()
+            queryset = Invoice.objects.all()
         elif user.role == User.Role.CLIENT:
-            return Invoice.objects.filter(client=user)
-        return Invoice.objects.none()
+            queryset = Invoice.objects.filter(client=user)
+        else:
+            return Invoice.objects.none()
+        return queryset
+
+    def get_export_queryset(self):
+        return super().get_export_queryset().select_related('client').annotate(
+            shipment_count=Count('shipments'),
+        )
+
+    @action(detail=True, methods=['get'], url_path=r'document/(?P<kind>pdf|html)',
+            renderer_classes=[JSONRenderer, PDFRenderer, HTMLDocumentRenderer])
+    def document(self, request, pk=None, kind=None):
+        # cached under the hash of its content, see finance.documents
+        invoice = self.get_object()
+        data = documents.document_data(invoice)
+        key = documents.document_key(kind, data)
+        etag = f'"{key}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified(headers={'ETag': etag})
+        # opened at once, a file cleared from the cache meanwhile is rendered again
+        stream = documents.cache.open(key, kind)
+        if stream is None:
+            future = documents.submit(kind, data)
+            try:
+                content = future.result(timeout=getattr(settings, 'INVOICE_RENDER_TIMEOUT', 10))
+            except TimeoutError:
+                # still rendering, cached once done
+                return Response(
+                    {'detail': 'The document is being rendered, retry shortly.'},
+                    status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '2'},
+                    content_type='application/json',
+                )
+            # the done callback writing the file may not have run yet
+            if documents.cache.get(key, kind) is None:
+                documents.cache.put(key, kind, content)
+            stream = io.BytesIO(content)
+        response = FileResponse(
+            stream, filename=f'{invoice.reference}.{kind}',
+            content_type=documents.CONTENT_TYPES[kind],
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
     
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(AutoPrefetchMixin, ExportMixin, viewsets.ModelViewSet):
     
     
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
 
+    export_filename = 'payments'
+    export_columns = [
+        ('id', attrgetter('id')),
+        ('invoice_id', attrgetter('invoice_id')),
+        ('client', attrgetter('invoice.client.username')),
+        ('amount', attrgetter('amount')),
+        ('payment_method', attrgetter('payment_method')),
+        ('payment_date', attrgetter('payment_date')),
+    ]
+
+    def get_export_queryset(self):
+        return super().get_export_queryset().select_related('invoice__client')
+
     def get_queryset(self):
         
         user = self.request.user
@@ -48,6 +159,16 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         return Payment.objects.none()
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser],
+            permission_classes=[IsAdminOrAgent])
+    def import_statement(self, request):
+        # bank statement (CSV or CAMT.053) uploaded as `file`, see finance.statements
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise serializers.ValidationError({'file': 'A statement file is required.'})
+        report = statements.import_statement(upload.file, upload.name)
+        return Response(report)
+
     def get_permissions(self):
        
         
@@ -58,3 +179,24 @@ class PaymentViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsAdminOrAgent]
         
         return super().get_permissions()
+
+
+class BillingRunViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Month-end billing runs. POST runs one (or resumes the unfinished run of
+    the period) and answers once it completed; the run_billing command does
+    the same outside of a request.
+    """
+    queryset = BillingRun.objects.order_by('-id')
+    serializer_class = BillingRunSerializer
+    permission_classes = [IsAdminUser]
+
+    def create(self, request):
+        params = BillingRunRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        period_end = params.validated_data.get('period_end') or billing.previous_period_end()
+        run = billing.start(period_end, params.validated_data['due_days'])
+        billing.run_billing(run, chunk_size=params.validated_data['chunk_size'])
+        data = self.get_serializer(run).data
+        data.update(billing.throughput(run))
+        return Response(data, status=status.HTTP_201_CREATED)
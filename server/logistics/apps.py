@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class LogisticsConfig(AppConfig):
     name = 'logistics'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,198 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import Destination
+
+try:
+    import fcntl
+except ImportError:  # Windows, writers are only serialized within a process
+    fcntl = None
+
+# Great-circle distances (km) between every pair of geocoded destinations,
+# kept in a square float32 .npy file that workers memory-map, so a lookup is
+# an index into the array instead of a haversine computation.
+#
+# The matrix is allocated with spare capacity. Adding or moving a
+# destination only fills its own row and column (O(n)); when every slot is
+# taken the matrix is rebuilt at twice the size. A small sidecar index holds
+# (destination id, latitude, longitude) per slot, id -1 marking a free slot.
+# Readers reopen both files when the index changes on disk.
+#
+# Writers hold an exclusive lock on a sidecar .lock file (flock), so two
+# workers never claim the same free slot. Destination saves write once their
+# transaction commits, and only when the coordinates changed (see
+# logistics.signals).
+
+EARTH_RADIUS_KM = 6371.0088
+MIN_CAPACITY = 64
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class DistanceMatrix:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.stem + '.index.npy')
+        self.lock_path = self.path.with_name(self.path.stem + '.lock')
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._matrix = None
+        self._slots = {}
+
+    # reading
+
+    def _index_stamp(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        # the index is replaced on every write, so the inode changes too
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        stamp = self._index_stamp()
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            self._matrix, self._slots = None, {}
+        else:
+            index = np.load(self.index_path)
+            self._matrix = np.load(self.path, mmap_mode='r')
+            self._slots = {int(pk): slot for slot, pk in enumerate(index[:, 0]) if pk >= 0}
+        self._stamp = stamp
+
+    def distance(self, origin_id, destination_id):
+        """Distance in km, None when either destination has no coordinates."""
+        self._refresh()
+        a = self._slots.get(origin_id)
+        b = self._slots.get(destination_id)
+        if a is None or b is None:
+            return None
+        return float(self._matrix[a, b])
+
+    def submatrix(self, destination_ids):
+        """
+        Distances between the given destinations as a k x k array, in the
+        given order. Rows of destinations without coordinates are NaN.
+        """
+        self._refresh()
+        slots = np.array([self._slots.get(pk, -1) for pk in destination_ids], dtype=np.int64)
+        result = np.full((len(slots), len(slots)), np.nan, dtype=np.float64)
+        known = np.flatnonzero(slots >= 0)
+        if len(known):
+            result[np.ix_(known, known)] = self._matrix[np.ix_(slots[known], slots[known])]
+        return result
+
+    # writing
+
+    @contextmanager
+    def _writing(self):
+        # the thread lock first, flock does not exclude threads sharing a process
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_index(self, index):
+        # written last and replaced atomically, readers key off this file
+        tmp_path = self.index_path.with_name(self.index_path.stem + '.tmp.npy')
+        np.save(tmp_path, index)
+        os.replace(tmp_path, self.index_path)
+
+    def rebuild(self):
+        """Recompute the whole matrix from the database, returns its size."""
+        rows = list(
+            Destination.objects
+            .filter(latitude__isnull=False, longitude__isnull=False)
+            .order_by('id')
+            .values_list('id', 'latitude', 'longitude')
+        )
+        n = len(rows)
+        capacity = max(MIN_CAPACITY, 1 << (2 * n - 1).bit_length()) if n else MIN_CAPACITY
+        index = np.full((capacity, 3), np.nan, dtype=np.float64)
+        index[:, 0] = -1
+        if n:
+            index[:n] = np.array(rows, dtype=np.float64)
+
+        with self._writing():
+            # drop our own mapping first, an open map blocks the replace on Windows
+            self._matrix, self._stamp = None, None
+            tmp_path = self.path.with_name(self.path.stem + '.tmp.npy')
+            matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(capacity, capacity))
+            matrix[:] = np.nan
+            if n:
+                lats, lons = index[:n, 1], index[:n, 2]
+                matrix[:n, :n] = haversine_km(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+            matrix.flush()
+            del matrix
+            os.replace(tmp_path, self.path)
+            self._write_index(index)
+        return n
+
+    def upsert(self, destination):
+        """Fill the row and column of one destination, O(n)."""
+        if destination.latitude is None or destination.longitude is None:
+            self.remove(destination.pk)
+            return
+        if not self.path.exists() or not self.index_path.exists():
+            self.rebuild()
+            return
+
+        with self._writing():
+            index = np.load(self.index_path)
+            coordinates = (float(destination.latitude), float(destination.longitude))
+            slots = np.flatnonzero(index[:, 0] == destination.pk)
+            if len(slots) and tuple(index[slots[0], 1:]) == coordinates:
+                return
+            if not len(slots):
+                slots = np.flatnonzero(index[:, 0] < 0)
+            if len(slots):
+                slot = int(slots[0])
+                index[slot] = (destination.pk, *coordinates)
+                row = haversine_km(index[slot, 1], index[slot, 2], index[:, 1], index[:, 2]).astype(np.float32)
+                matrix = np.load(self.path, mmap_mode='r+')
+                matrix[slot, :] = row
+                matrix[:, slot] = row
+                matrix.flush()
+                del matrix
+                self._write_index(index)
+                return
+        # every slot is taken
+        self.rebuild()
+
+    def remove(self, destination_id):
+        if not self.index_path.exists():
+            return
+        with self._writing():
+            index = np.load(self.index_path)
+            slots = np.flatnonzero(index[:, 0] == destination_id)
+            if not len(slots):
+                return
+            index[slots] = (-1, np.nan, np.nan)
+            matrix = np.load(self.path, mmap_mode='r+')
+            matrix[slots, :] = np.nan
+            matrix[:, slots] = np.nan
+            matrix.flush()
+            del matrix
+            self._write_index(index)
+
+
+distance_matrix = DistanceMatrix(
+    getattr(settings, 'DISTANCE_MATRIX_PATH', Path(settings.BASE_DIR) / 'var' / 'distance_matrix.npy')
+)
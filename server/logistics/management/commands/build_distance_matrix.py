@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from logistics.distances import distance_matrix
+
+
+class Command(BaseCommand):
+    help = "Recompute the destination distance matrix from the stored coordinates."
+
+    def handle(self, *args, **options):
+        size = distance_matrix.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Distance matrix rebuilt for {size} destinations at {distance_matrix.path}"
+        ))
@@ -31,6 +31,9 @@ class Destination(models.Model):
     city = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
     geographic_zone = models.CharField(max_length=100, blank=True)
+    # WGS84 coordinates, used for the precomputed distance matrix
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     
     base_rate = models.DecimalField(max_digits=10, decimal_places=2) # Tarif de base
     weight_rate_per_kg = models.DecimalField(max_digits=10, decimal_places=2, help_text="Cost per KG")
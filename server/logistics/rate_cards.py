@@ -0,0 +1,109 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Destination
+
+# Process-local copy of the Destination table, which holds the pricing rates.
+# Rates change rarely, so every worker keeps all destinations in memory and
+# looks them up by id or by (city, country) without querying the database.
+#
+# Invalidation is versioned: a counter lives in Django's cache and is bumped
+# once the transaction saving or deleting a Destination commits (see
+# logistics.signals), so a worker reloading meanwhile cannot keep the old
+# rows under the new version. A worker reloads its tables when the counter
+# differs from the one it loaded with. With a shared cache backend this
+# propagates to every worker at once; the default local-memory cache only
+# covers the current process, so tables are also reloaded once they are
+# older than RATE_CARD_TTL seconds, which bounds how long other workers
+# price with old rates.
+# QuerySet.update() and bulk_create() send no signals, callers using them
+# must call invalidate_on_commit() themselves.
+
+VERSION_KEY = 'logistics:rate_cards:version'
+
+
+class RateCardCache:
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = None
+        self._loaded_at = None
+        self._by_id = {}
+        self._by_place = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def _shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 1, timeout=None)
+            version = cache.get(VERSION_KEY, 1)
+        return version
+
+    def _is_fresh(self, version):
+        return version == self._version and time.monotonic() - self._loaded_at < self.ttl
+
+    def _ensure_fresh(self):
+        version = self._shared_version()
+        if self._is_fresh(version):
+            return
+        with self._lock:
+            if self._is_fresh(version):
+                return
+            by_id = {}
+            by_place = {}
+            for destination in Destination.objects.order_by('id'):
+                by_id[destination.id] = destination
+                # duplicates of a city keep the oldest row
+                by_place.setdefault((destination.city, destination.country), destination)
+            self._by_id, self._by_place = by_id, by_place
+            self._version = version
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def _found(self, destination):
+        if destination is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # callers get their own instance, the cached one is shared
+        return copy.copy(destination)
+
+    def get(self, pk):
+        self._ensure_fresh()
+        return self._found(self._by_id.get(pk))
+
+    def get_by_place(self, city, country):
+        self._ensure_fresh()
+        return self._found(self._by_place.get((city, country)))
+
+    def invalidate(self):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, timeout=None)
+        self._version = None
+
+    def invalidate_on_commit(self):
+        """Invalidate once the current transaction commits, at once outside of one."""
+        transaction.on_commit(self.invalidate)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'version': self._version,
+            'age_s': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+            'size': len(self._by_id),
+        }
+
+
+rate_cards = RateCardCache(getattr(settings, 'RATE_CARD_TTL', 60))
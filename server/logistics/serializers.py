@@ -1,20 +1,21 @@
 from rest_framework import serializers
 from .models import Driver, Vehicle, Destination
 from users.serializers import UserSerializer 
+from server.instrumentation import TimedDataMixin
 
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(TimedDataMixin, serializers.ModelSerializer):
     
     class Meta:
         model = Vehicle
         fields = '__all__' 
 
-class DestinationSerializer(serializers.ModelSerializer):
+class DestinationSerializer(TimedDataMixin, serializers.ModelSerializer):
   
     class Meta:
         model = Destination
         fields = '__all__'
 
-class DriverSerializer(serializers.ModelSerializer):
+class DriverSerializer(TimedDataMixin, serializers.ModelSerializer):
     
     
     user = UserSerializer(read_only=True)
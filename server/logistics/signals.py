@@ -0,0 +1,46 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Destination
+from .rate_cards import rate_cards
+from .distances import distance_matrix
+
+# The distance matrix is written once the save commits, a rolled back save
+# leaves it alone. Saves that keep the coordinates (rate changes) skip it.
+
+
+@receiver(post_save, sender=Destination)
+@receiver(post_delete, sender=Destination)
+def invalidate_rate_cards(sender, **kwargs):
+    rate_cards.invalidate_on_commit()
+
+
+def _coordinates(instance):
+    # read __dict__ so deferred fields are not loaded, None when unknown
+    if 'latitude' not in instance.__dict__ or 'longitude' not in instance.__dict__:
+        return None
+    return (instance.__dict__['latitude'], instance.__dict__['longitude'])
+
+
+@receiver(post_init, sender=Destination)
+def remember_coordinates(sender, instance, **kwargs):
+    instance._original_coordinates = _coordinates(instance)
+
+
+@receiver(post_save, sender=Destination)
+def update_distance_matrix(sender, instance, created, **kwargs):
+    coordinates = _coordinates(instance)
+    unchanged = not created and coordinates is not None and coordinates == instance._original_coordinates
+    instance._original_coordinates = coordinates
+    if unchanged:
+        return
+    transaction.on_commit(partial(distance_matrix.upsert, instance))
+
+
+@receiver(post_delete, sender=Destination)
+def remove_from_distance_matrix(sender, instance, **kwargs):
+    # the instance loses its pk once the delete returns
+    transaction.on_commit(partial(distance_matrix.remove, instance.pk))
@@ -1,3 +1,104 @@
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.db import DatabaseError, transaction
 from django.test import TestCase
 
-# Create your tests here.
+from . import signals
+from .distances import DistanceMatrix
+from .models import Destination
+from .rate_cards import rate_cards
+
+
+class RateCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.destination = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=2, volume_rate_per_m3=50,
+        )
+
+    def setUp(self):
+        rate_cards.invalidate()
+        self.addCleanup(setattr, rate_cards, 'ttl', rate_cards.ttl)
+
+    def test_rate_change_is_visible_after_commit(self):
+        self.assertEqual(rate_cards.get(self.destination.pk).base_rate, Decimal('10.00'))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.destination.base_rate = Decimal('12.50')
+            self.destination.save()
+            # other readers keep the committed rates until then
+            self.assertEqual(rate_cards.get(self.destination.pk).base_rate, Decimal('10.00'))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(rate_cards.get(self.destination.pk).base_rate, Decimal('12.50'))
+        self.assertEqual(rate_cards.get_by_place('Oran', 'DZ').base_rate, Decimal('12.50'))
+
+    def test_delete_is_visible_after_commit(self):
+        rate_cards.get(self.destination.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.destination.delete()
+        self.assertIsNone(rate_cards.get(self.destination.pk))
+
+    def test_tables_expire(self):
+        rate_cards.get(self.destination.pk)
+        # an update sends no signal, like a change made by another worker
+        Destination.objects.filter(pk=self.destination.pk).update(base_rate=Decimal('11.00'))
+        self.assertEqual(rate_cards.get(self.destination.pk).base_rate, Decimal('10.00'))
+
+        rate_cards.ttl = 0
+        self.assertEqual(rate_cards.get(self.destination.pk).base_rate, Decimal('11.00'))
+
+
+RATES = {'base_rate': 10, 'weight_rate_per_kg': 2, 'volume_rate_per_m3': 50}
+
+
+class DistanceMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.algiers = Destination.objects.create(city='Alger', country='DZ', latitude=36.7538, longitude=3.0588, **RATES)
+        cls.oran = Destination.objects.create(city='Oran', country='DZ', latitude=35.6971, longitude=-0.6308, **RATES)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.matrix = DistanceMatrix(Path(directory.name) / 'distance_matrix.npy')
+        patcher = mock.patch.object(signals, 'distance_matrix', self.matrix)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.matrix.rebuild()
+
+    def test_move_is_written_after_commit(self):
+        before = self.matrix.distance(self.algiers.pk, self.oran.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.oran.latitude, self.oran.longitude = 36.3650, 6.6147  # Constantine
+            self.oran.save()
+            self.assertEqual(self.matrix.distance(self.algiers.pk, self.oran.pk), before)
+        self.assertAlmostEqual(self.matrix.distance(self.algiers.pk, self.oran.pk), 320, delta=10)
+
+    def test_rollback_leaves_the_matrix(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    blida = Destination.objects.create(
+                        city='Blida', country='DZ', latitude=36.47, longitude=2.83, **RATES,
+                    )
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(self.matrix.distance(self.algiers.pk, blida.pk))
+
+    def test_rate_change_skips_the_write(self):
+        with mock.patch.object(self.matrix, 'upsert') as upsert, self.captureOnCommitCallbacks(execute=True):
+            self.oran.base_rate = Decimal('12.50')
+            self.oran.save()
+            Destination.objects.get(pk=self.algiers.pk).save()
+        upsert.assert_not_called()
+
+    def test_delete_frees_the_slot(self):
+        pk = self.oran.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.oran.delete()
+        self.assertIsNone(self.matrix.distance(self.algiers.pk, pk))
@@ -1,9 +1,15 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from users.models import User
 from .models import Driver, Vehicle, Destination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import BasePermission
 from .serializers import DriverSerializer, VehicleSerializer, DestinationSerializer
+from .rate_cards import rate_cards
+from .distances import distance_matrix
+from rest_framework.exceptions import ValidationError
+from server.prefetch import AutoPrefetchMixin
 
 
 
@@ -15,7 +21,7 @@ class IsAdminOrAgent(BasePermission):
             request.user.role in [User.Role.ADMIN, User.Role.AGENT]
         )
 
-class DriverViewSet(viewsets.ModelViewSet):
+class DriverViewSet(AutoPrefetchMixin, viewsets.ModelViewSet):
     
     queryset = Driver.objects.all()
     serializer_class = DriverSerializer
@@ -34,4 +40,22 @@ class DestinationViewSet(viewsets.ModelViewSet):
     queryset = Destination.objects.all()
     serializer_class = DestinationSerializer
     
-    permission_classes = [IsAuthenticated] 
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'], url_path='rate-cache', permission_classes=[IsAdminOrAgent])
+    def rate_cache(self, request):
+        # hit/miss counters of this worker's rate-card cache
+        return Response(rate_cards.stats())
+
+    @action(detail=True, methods=['get'])
+    def distances(self, request, pk=None):
+        # ?to=1,2,3 -> km from this destination, served from the distance matrix
+        origin = self.get_object()
+        try:
+            targets = [int(value) for value in request.query_params.get('to', '').split(',') if value]
+        except ValueError:
+            raise ValidationError({'to': ["Expected a comma separated list of destination ids."]})
+        return Response({
+            'origin': origin.id,
+            'distances_km': {target: distance_matrix.distance(origin.id, target) for target in targets},
+        })
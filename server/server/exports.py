@@ -0,0 +1,95 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+
+# Rows are read with QuerySet.iterator() so only one chunk is ever held in
+# memory, prefetch_related lookups of the queryset run once per chunk.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class NDJSONRenderer(BaseRenderer):
+    # exports stream their own body, the renderers are only used for content
+    # negotiation (?format=ndjson|csv) and for error responses
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class _Echo:
+    # file-like object for csv.writer, hands each line back instead of
+    # buffering it
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _rows(queryset, columns, chunk_size):
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield [accessor(obj) for _, accessor in columns]
+
+
+def stream_ndjson(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    names = [name for name, _ in columns]
+    encoder = DjangoJSONEncoder()
+    for row in _rows(queryset, columns, chunk_size):
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def stream_csv(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in _rows(queryset, columns, chunk_size):
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def export_response(queryset, columns, fmt, filename):
+    if fmt == 'csv':
+        response = StreamingHttpResponse(stream_csv(queryset, columns), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    else:
+        response = StreamingHttpResponse(stream_ndjson(queryset, columns), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.ndjson"'
+    return response
+
+
+class ExportMixin:
+    """
+    Adds GET <list>/export/?format=ndjson|csv to a ViewSet.
+
+    Views define `export_columns`, a list of (name, accessor) pairs, and may
+    override get_export_queryset() to add the related data the accessors
+    read.
+    """
+
+    export_columns = []
+    export_filename = 'export'
+
+    def get_export_queryset(self):
+        # the export columns decide what is prefetched, not the API shape
+        return self.filter_queryset(self.get_queryset()).prefetch_related(None).order_by('pk')
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        return export_response(
+            self.get_export_queryset(),
+            self.export_columns,
+            request.accepted_renderer.format,
+            self.export_filename,
+        )
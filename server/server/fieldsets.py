@@ -0,0 +1,103 @@
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+# Sparse fieldsets and opt-in expansion of nested relations.
+#
+#   ?fields=id,status,client.username   only these fields are rendered
+#   ?expand=client,incident.shipment    these relations are rendered nested
+#
+# Relations listed in a serializer's Meta.expandable_fields come back as
+# their primary key (a list of keys for to-many relations) unless expanded.
+# Naming a nested field in ?fields= expands its relation too. Only the
+# output is shaped, input fields and validation are left as they are.
+# server.prefetch loads what the shaped output reads.
+
+
+def parse_paths(value):
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}, None stays None."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    tree = {}
+    for path in value:
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _nested(field):
+    # the serializer rendering a nested field, if it is one
+    field = getattr(field, 'child', field)
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin honouring ?fields= and ?expand=. The root serializer of
+    a view reads them from the request, or they are passed as the `fields`
+    and `expand` arguments (comma separated strings or lists of paths).
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested = None
+        if fields is not None or expand is not None:
+            self.set_shape(parse_paths(fields), parse_paths(expand) or {})
+
+    def set_shape(self, fields, expand):
+        # fields is None for all fields
+        expand = dict(expand)
+        for name, subfields in (fields or {}).items():
+            if subfields:
+                expand.setdefault(name, {})
+        self._requested = (fields or None, expand)
+        self._propagated = False
+
+    def _is_root(self):
+        parent = getattr(self, 'parent', None)
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_shape(self):
+        """(requested fields or None for all, expanded relations) as path trees."""
+        if self._requested is None:
+            request = self.context.get('request') if self._is_root() else None
+            if request is not None:
+                self.set_shape(
+                    parse_paths(request.query_params.get('fields')),
+                    parse_paths(request.query_params.get('expand')) or {},
+                )
+            else:
+                self.set_shape(None, {})
+        if not self._propagated:
+            self._propagated = True
+            fields, expand = self._requested
+            for name, field in self.fields.items():
+                nested = _nested(field)
+                if isinstance(nested, SparseFieldsetMixin) and self.is_expanded(name):
+                    nested.set_shape((fields or {}).get(name), expand.get(name, {}))
+        return self._requested
+
+    def is_expanded(self, name):
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        return name not in expandable or name in self.get_shape()[1]
+
+    def _collapsed(self, name, field):
+        cache = self.__dict__.setdefault('_collapsed_fields', {})
+        if name not in cache:
+            kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+            if field.source != name:
+                kwargs['source'] = field.source
+            cache[name] = PrimaryKeyRelatedField(**kwargs)
+            cache[name].bind(name, self)
+        return cache[name]
+
+    @property
+    def _readable_fields(self):
+        fields = self.get_shape()[0]
+        for name, field in self.fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            yield field if self.is_expanded(name) else self._collapsed(name, field)
@@ -0,0 +1,120 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL and timing metrics, sent back as a Server-Timing header:
+#
+#   Server-Timing: db;dur=4.1;desc="3 queries", serialize;dur=2.3, render;dur=0.8, total;dur=9.7
+#
+# `serialize` is the time spent building serializer `.data` (serializers
+# using TimedDataMixin), queries run meanwhile count towards db too.
+# `render` is the time spent rendering the response data to its body (JSON,
+# CSV...).
+# Requests running more queries than their view's budget are logged. A view
+# sets its budget with `query_budget`, QUERY_BUDGETS overrides it by url name
+# and QUERY_BUDGET is the default (None disables the log).
+
+
+def record_serialize(request, seconds):
+    # kept on the Django request, the DRF one wraps it
+    request = getattr(request, '_request', request)
+    request._serialize_duration = getattr(request, '_serialize_duration', 0.0) + seconds
+
+
+class TimedDataMixin:
+    """Serializer mixin adding the time spent building `.data` to the request's serialize metric."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        if type(serializer) is serializers.ListSerializer:
+            # many=True renders through the list serializer's .data
+            serializer.__class__ = TimedListSerializer
+        return serializer
+
+    @property
+    def data(self):
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            request = self.context.get('request')
+            if request is not None:
+                record_serialize(request, time.perf_counter() - start)
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def query_budget(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if match.view_name in budgets:
+        return budgets[match.view_name]
+    # DRF views expose their class as `cls`, Django ones as `view_class`
+    view = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    return getattr(view, 'query_budget', getattr(settings, 'QUERY_BUDGET', None))
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        end = time.perf_counter()
+
+        # template responses (DRF's included) are rendered once the view and
+        # process_template_response have run, see process_template_response
+        render_start = getattr(request, '_render_start', None)
+        render = end - render_start if render_start is not None else 0.0
+        serialize = getattr(request, '_serialize_duration', 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={(end - start) * 1000:.1f}',
+        ])
+
+        budget = query_budget(request)
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                '%s %s ran %d queries, over its budget of %d (db %.1fms, total %.1fms)',
+                request.method, request.path, recorder.count, budget,
+                recorder.duration * 1000, (end - start) * 1000,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        request._render_start = time.perf_counter()
+        return response
@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class DefaultCursorPagination(CursorPagination):
+    """
+    Cursor pagination used by every ViewSet.
+
+    Cursors filter on the ordering columns instead of using OFFSET, so a page
+    costs the same at row 10 and at row 10 million as long as the ordering is
+    backed by an index. Views choose their ordering with `cursor_ordering`,
+    the default is the primary key, newest first.
+    """
+
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,82 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+# Works out the select_related / prefetch_related lookups a serializer needs
+# by walking the fields it renders. To-one relations are joined, to-many
+# relations (and everything below them) are prefetched, so rendering a
+# list costs a fixed number of queries whatever its length. Fields reading
+# properties or methods are not followed.
+
+
+def _nested(field):
+    field = getattr(field, 'child', field)
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def _relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation and field.related_model is not None else None
+
+
+def _loads_target(field):
+    # whether rendering the field reads the related row itself, a primary
+    # key field only needs the foreign key column
+    if _nested(field) is not None or isinstance(field, ManyRelatedField):
+        return True
+    return isinstance(field, RelatedField) and not field.use_pk_only_optimization()
+
+
+def _walk(serializer, model, prefix, prefetching, select, prefetch):
+    for field in serializer._readable_fields:
+        nested = _nested(field)
+        if field.source == '*':
+            if nested is not None:
+                _walk(nested, model, prefix, prefetching, select, prefetch)
+            continue
+
+        attrs = field.source.split('.')
+        current, path, many = model, prefix, prefetching
+        for attr in attrs if _loads_target(field) else attrs[:-1]:
+            relation = _relation(current, attr)
+            if relation is None:
+                current = None
+                break
+            path = f'{path}__{attr}' if path else attr
+            many = many or relation.one_to_many or relation.many_to_many
+            (prefetch if many else select).add(path)
+            current = relation.related_model
+        if nested is not None and current is not None:
+            _walk(nested, current, path, many, select, prefetch)
+
+
+def plan_related(serializer, model):
+    """(select_related lookups, prefetch_related lookups) for rendering `model` rows."""
+    select, prefetch = set(), set()
+    _walk(serializer, model, '', False, select, prefetch)
+    # a lookup is implied by any longer one starting with it
+    select = {path for path in select if not any(other.startswith(path + '__') for other in select)}
+    return sorted(select), sorted(prefetch)
+
+
+class AutoPrefetchMixin:
+    """
+    ViewSet mixin joining and prefetching whatever the serializer renders,
+    including the shape requested with ?fields= / ?expand=.
+    """
+
+    def get_related_plan(self, queryset):
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        return plan_related(serializer, queryset.model)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        select, prefetch = self.get_related_plan(queryset)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -0,0 +1,220 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from users.models import User
+from users.permissions import IsAdminUser
+
+logger = logging.getLogger(__name__)
+
+# On-demand profiling. A request is run under cProfile when an admin sends
+# the PROFILE_HEADER header, or for one request in PROFILE_SAMPLE_RATE
+# (0 disables sampling). The profile, the SQL it ran and a summary of the
+# costliest functions are kept on disk, the PROFILE_MAX_CAPTURES newest
+# only, and listed at /api/profiles/. The response of a profiled request
+# carries the capture id in X-Profile-Id.
+
+# top functions listed in a capture, by cumulative time
+STATS_LINES = 60
+# queries kept per capture
+MAX_QUERIES = 1000
+CAPTURE_ID = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+
+
+class CaptureStore:
+    """Ring buffer of profiles on disk, one .json and one .prof file per capture."""
+
+    def __init__(self, directory, size):
+        if size < 1:
+            # _ids()[:-0] is empty, nothing would ever be rotated out
+            raise ImproperlyConfigured("PROFILE_MAX_CAPTURES must be at least 1.")
+        self.directory = Path(directory)
+        self.size = size
+
+    def _ids(self):
+        if not self.directory.exists():
+            return []
+        # ids start with their UTC timestamp, so they sort oldest first
+        return sorted(path.stem for path in self.directory.glob('*.json'))
+
+    def save(self, capture, profile):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        capture_id = f"{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        capture['id'] = capture_id
+        profile.dump_stats(self.directory / f'{capture_id}.prof')
+        # written last, a capture is listed once complete
+        temporary = self.directory / f'{capture_id}.json.tmp'
+        temporary.write_text(json.dumps(capture, default=str))
+        temporary.rename(self.directory / f'{capture_id}.json')
+        for stale in self._ids()[:-self.size]:
+            for suffix in ('.json', '.prof'):
+                (self.directory / f'{stale}{suffix}').unlink(missing_ok=True)
+        return capture_id
+
+    def _path(self, capture_id, suffix):
+        if not CAPTURE_ID.match(capture_id):
+            return None
+        path = self.directory / f'{capture_id}{suffix}'
+        return path if path.exists() else None
+
+    def get(self, capture_id):
+        path = self._path(capture_id, '.json')
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            # rotated out meanwhile
+            return None
+
+    def profile_path(self, capture_id):
+        return self._path(capture_id, '.prof')
+
+    def list(self):
+        summaries = []
+        for capture_id in reversed(self._ids()):
+            capture = self.get(capture_id)
+            if capture is not None:
+                summaries.append({key: value for key, value in capture.items() if key not in ('queries', 'stats')})
+        return summaries
+
+
+captures = CaptureStore(
+    getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'var' / 'profiles'),
+    getattr(settings, 'PROFILE_MAX_CAPTURES', 50),
+)
+
+
+class QueryLog:
+    """Database execute wrapper keeping the SQL run and how long each query took."""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql,
+                    'params': repr(params)[:500],
+                    'many': many,
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                })
+
+
+def _is_admin(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.role == User.Role.ADMIN
+    # API requests authenticate with a token, which DRF only checks in the view
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].role == User.Role.ADMIN
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'PROFILE_HEADER', 'X-Profile')
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        # one profiler can run at a time per process, requests arriving
+        # meanwhile are not profiled
+        self.lock = threading.Lock()
+
+    def _trigger(self, request):
+        if request.headers.get(self.header) and _is_admin(request):
+            return 'header'
+        if self.sample_rate and random.randrange(self.sample_rate) == 0:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None or not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, trigger)
+        finally:
+            self.lock.release()
+
+    def _profile(self, request, trigger):
+        log = QueryLog()
+        profile = cProfile.Profile()
+        started_at = timezone.now()
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(log):
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        duration = time.perf_counter() - start
+
+        stats = io.StringIO()
+        pstats.Stats(profile, stream=stats).sort_stats('cumulative').print_stats(STATS_LINES)
+        capture = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'trigger': trigger,
+            'started_at': started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'query_count': log.count,
+            'query_ms': round(sum(query['duration_ms'] for query in log.queries), 3),
+            'queries': log.queries,
+            'stats': stats.getvalue(),
+        }
+        try:
+            response['X-Profile-Id'] = captures.save(capture, profile)
+        except OSError:
+            logger.exception("Could not store the profile of %s %s", request.method, request.path)
+        return response
+
+
+class ProfileCaptureListView(APIView):
+    """Stored profiles, newest first."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(captures.list())
+
+
+class ProfileCaptureDetailView(APIView):
+    """A profile with its SQL and top functions, ?download=1 returns the raw cProfile dump."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, capture_id, format=None):
+        if request.query_params.get('download'):
+            path = captures.profile_path(capture_id)
+            if path is None:
+                raise Http404
+            return FileResponse(path.open('rb'), as_attachment=True, filename=f'{capture_id}.prof')
+        capture = captures.get(capture_id)
+        if capture is None:
+            raise Http404
+        return Response(capture)
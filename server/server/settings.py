@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
     'finance',
     'support',
     'analytics',
+    'benchmarks',
 
     'drf_spectacular',
     
@@ -54,6 +57,7 @@ INSTALLED_APPS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MIDDLEWARE = [
+    'server.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -62,6 +66,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'server.profiling.ProfilingMiddleware',
 ]
 
 
@@ -69,6 +74,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173", 
     "http://127.0.0.1:5173",
 ]
+# lets the frontend ask for a profile and read the timing headers
+CORS_ALLOW_HEADERS = (*default_headers, 'x-profile')
+CORS_EXPOSE_HEADERS = ['Server-Timing', 'X-Profile-Id']
 
 ROOT_URLCONF = 'server.urls'
 
@@ -147,13 +155,57 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# bulk imports and batch quotes post thousands of items in one body
+DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024
+
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'server.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
+# SQL queries a request may run before it is logged, views override it with
+# `query_budget`, QUERY_BUDGETS by url name
+QUERY_BUDGET = 20
+QUERY_BUDGETS = {}
+
+# requests run under cProfile: sent with this header by an admin, or one in
+# PROFILE_SAMPLE_RATE (0 disables sampling). The newest PROFILE_MAX_CAPTURES
+# captures (at least 1) are kept in PROFILE_DIR
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SAMPLE_RATE = 0
+PROFILE_MAX_CAPTURES = 50
+PROFILE_DIR = BASE_DIR / 'var' / 'profiles'
+
+# upper bound for ?page_size= on list endpoints
+API_MAX_PAGE_SIZE = 500
+
+# seconds a worker keeps its rate cards before reloading them, the bound on
+# stale rates in other workers when the cache backend is not shared
+RATE_CARD_TTL = 60
+
+# per-worker LRU cache of public tracking lookups (entries, seconds)
+TRACKING_CACHE_SIZE = 10000
+TRACKING_CACHE_TTL = 60
+
+# memory-mapped matrix of distances between geocoded destinations
+DISTANCE_MATRIX_PATH = BASE_DIR / 'var' / 'distance_matrix.npy'
+
+# invoice documents (PDF, HTML): rendered on INVOICE_RENDER_THREADS threads
+# per web worker and cached in INVOICE_DOCUMENT_DIR. A download waits
+# INVOICE_RENDER_TIMEOUT seconds for its document, then answers 202 and lets
+# it finish in the background. render_invoices prerenders in bulk with
+# processes.
+INVOICE_DOCUMENT_DIR = BASE_DIR / 'var' / 'invoices'
+INVOICE_RENDER_THREADS = 2
+INVOICE_RENDER_TIMEOUT = 10
+# lines of the issuer block printed on invoices
+INVOICE_ISSUER = ['DeliveryCOMPANY']
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -0,0 +1,53 @@
+from contextlib import ContextDecorator
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+# default row counts an endpoint is checked at, a budget holding at all of
+# them means the endpoint does not run queries per row
+BUDGET_ROWS = (1, 10, 100)
+
+
+class max_queries(ContextDecorator):
+    """
+    Fails with an AssertionError listing the queries when the block (or the
+    decorated test) runs more than `budget` queries.
+    """
+
+    def __init__(self, budget, using='default'):
+        self.budget = budget
+        self.using = using
+
+    def __enter__(self):
+        self.captured = CaptureQueriesContext(connections[self.using])
+        self.captured.__enter__()
+        return self.captured
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.captured.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.captured) > self.budget:
+            queries = '\n'.join(
+                f'{k}. {query["sql"]}' for k, query in enumerate(self.captured.captured_queries, start=1)
+            )
+            raise AssertionError(f'{len(self.captured)} queries run, the budget is {self.budget}:\n{queries}')
+        return False
+
+
+class QueryBudgetMixin:
+    """TestCase mixin checking list endpoints against a query budget as their rows grow."""
+
+    def assertQueryBudget(self, url, budget, make_rows, rows=BUDGET_ROWS, client=None):
+        """
+        Calls make_rows(n) to add n rows before each check, so the endpoint
+        lists each of `rows` in turn. Pages are sized to hold every row.
+        """
+        client = client or self.client
+        made = 0
+        for count in rows:
+            make_rows(count - made)
+            made = count
+            with self.subTest(rows=count), max_queries(budget):
+                response = client.get(f"{url}{'&' if '?' in url else '?'}page_size={count}")
+                self.assertEqual(response.status_code, 200, response.content[:500])
+                results = response.data.get('results', response.data)
+                self.assertEqual(len(results), count)
@@ -0,0 +1,184 @@
+import cProfile
+import csv
+import datetime
+import io
+import json
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from finance import totals
+from finance.models import Invoice, Payment
+from logistics.models import Destination
+from shipping.models import Parcel, Shipment
+from users.models import ClientProfile, User
+
+from . import profiling
+from .profiling import CaptureStore
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.agent = User.objects.create_user('agent', password='x', role=User.Role.AGENT)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = CaptureStore(directory.name, 3)
+        patcher = mock.patch.object(profiling, 'captures', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def jwt_get(self, user, url='/api/profiles/', **headers):
+        return Client().get(url, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}', **headers)
+
+    def session_get(self, user, url='/api/profiles/', **headers):
+        client = Client()
+        client.force_login(user)
+        return client.get(url, **headers)
+
+    def test_header_is_admin_only(self):
+        for get in (self.jwt_get, self.session_get):
+            with self.subTest(get.__name__):
+                self.assertIn('X-Profile-Id', get(self.admin, HTTP_X_PROFILE='1'))
+                self.assertNotIn('X-Profile-Id', get(self.agent, HTTP_X_PROFILE='1'))
+                self.assertNotIn('X-Profile-Id', get(self.admin))
+        self.assertNotIn('X-Profile-Id', Client().get('/api/profiles/', HTTP_X_PROFILE='1'))
+
+    def test_capture(self):
+        response = self.jwt_get(self.admin, '/api/profiles/?x=1', HTTP_X_PROFILE='1')
+        capture_id = response['X-Profile-Id']
+
+        detail = self.jwt_get(self.admin, f'/api/profiles/{capture_id}/').json()
+        self.assertEqual((detail['path'], detail['trigger'], detail['status']), ('/api/profiles/?x=1', 'header', 200))
+        self.assertEqual(detail['query_count'], len(detail['queries']))
+        download = self.jwt_get(self.admin, f'/api/profiles/{capture_id}/?download=1')
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(self.jwt_get(self.agent, f'/api/profiles/{capture_id}/').status_code, 403)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_sampling(self):
+        response = APIClient().get('/api/profiles/')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.store.get(response['X-Profile-Id'])['trigger'], 'sample')
+
+    def test_ring_buffer(self):
+        ids = [self.store.save({}, cProfile.Profile()) for _ in range(5)]
+
+        self.assertEqual([capture['id'] for capture in self.store.list()], ids[:1:-1])
+        self.assertIsNone(self.store.get(ids[0]))
+        self.assertIsNone(self.store.profile_path(ids[1]))
+        self.assertEqual(len(list(self.store.directory.iterdir())), 6)
+
+    def test_capture_ids_are_validated(self):
+        self.store.save({}, cProfile.Profile())
+        (self.store.directory.parent / 'secret.json').write_text('{}')
+        for capture_id in ('secret', '..%2Fsecret', '20260101T000000000000-ZZZZZZZZ'):
+            with self.subTest(capture_id):
+                self.assertEqual(self.jwt_get(self.admin, f'/api/profiles/{capture_id}/').status_code, 404)
+                self.assertIsNone(self.store.get(capture_id))
+
+    def test_store_size_must_be_positive(self):
+        for size in (0, -1):
+            with self.subTest(size), self.assertRaises(ImproperlyConfigured):
+                CaptureStore(self.store.directory, size)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.other_client = User.objects.create_user('other', password='x', role=User.Role.CLIENT)
+        for user in (cls.client_user, cls.other_client):
+            ClientProfile.objects.create(user=user, address='-', phone_number='-')
+        cls.origin = Destination.objects.create(
+            city='Alger "Centre", Bab Ezzouar', country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1,
+        )
+        cls.shipment = cls.make_rows(cls.client_user, 1)[0]
+        cls.make_rows(cls.other_client, 1)
+
+    @classmethod
+    def make_rows(cls, client, count):
+        """count shipments of client with two parcels each, invoiced and paid."""
+        invoice = Invoice.objects.create(client=client, due_date=datetime.date(2026, 12, 31))
+        shipments = Shipment.objects.bulk_create([
+            Shipment(
+                client=client, origin=cls.origin, destination=cls.origin, invoice=invoice,
+                total_cost=Decimal('15.30'),
+            )
+            for _ in range(count)
+        ])
+        # bulk_create skips the receivers keeping the invoice totals
+        totals.shipments_attached(invoice, [shipment.id for shipment in shipments])
+        Parcel.objects.bulk_create([
+            Parcel(
+                shipment=shipment, tracking_number=f'TRK-{shipment.id}-{k}',
+                weight_kg=Decimal('1.25'), height_cm=1, width_cm=1, length_cm=1,
+            )
+            for shipment in shipments for k in range(2)
+        ])
+        Payment.objects.create(invoice=invoice, amount=Decimal('10.50'), payment_method='CASH')
+        return shipments
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self.export('/api/shipments/export/?format=csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="shipments.csv"')
+        self.assertIn('"Alger ""Centre"", Bab Ezzouar"', body)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(list(rows[0])[:3], ['id', 'client', 'origin_city'])
+        row = next(row for row in rows if row['id'] == str(self.shipment.id))
+        self.assertEqual(row['origin_city'], 'Alger "Centre", Bab Ezzouar')
+        self.assertEqual((row['total_cost'], row['total_weight_kg'], row['parcel_count']), ('15.30', '2.50', '2'))
+        self.assertEqual(row['tracking_numbers'], f'TRK-{self.shipment.id}-0;TRK-{self.shipment.id}-1')
+        self.assertEqual(row['created_at'], self.shipment.created_at.isoformat())
+
+    def test_ndjson(self):
+        response, body = self.export('/api/invoices/export/?format=ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['client'], 'client')
+        self.assertEqual((rows[0]['montant_ht'], rows[0]['shipment_count']), ('15.30', 1))
+        self.assertEqual(rows[0]['issued_date'], Invoice.objects.get(pk=rows[0]['id']).issued_date.isoformat())
+
+    def test_clients_export_their_own(self):
+        self.client.force_authenticate(self.client_user)
+        for url, key in (('/api/shipments/export/', 'client'), ('/api/invoices/export/', 'client'),
+                         ('/api/payments/export/', 'client')):
+            with self.subTest(url):
+                _, body = self.export(url)
+                self.assertEqual({json.loads(line)[key] for line in body.splitlines()}, {'client'})
+
+    def test_query_count_is_flat(self):
+        urls = ('/api/shipments/export/', '/api/invoices/export/', '/api/payments/export/?format=csv')
+        counts = []
+        for added in (0, 20):
+            self.make_rows(self.client_user, added)
+            with CaptureQueriesContext(connection) as queries:
+                for url in urls:
+                    self.export(url)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
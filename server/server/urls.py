@@ -7,6 +7,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from .profiling import ProfileCaptureDetailView, ProfileCaptureListView
 
 
 
@@ -20,6 +21,8 @@ urlpatterns = [
     path('api/', include('finance.urls')),
     path('api/', include('support.urls')),
     path('api/', include('analytics.urls')),
+    path('api/profiles/', ProfileCaptureListView.as_view(), name='profile-list'),
+    path('api/profiles/<str:capture_id>/', ProfileCaptureDetailView.as_view(), name='profile-detail'),
 
     
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -0,0 +1,130 @@
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from logistics.models import Destination
+from logistics.rate_cards import rate_cards
+from users.models import User
+from .models import Shipment, Parcel
+from .pricing import shipment_cost
+from .signals import shipments_bulk_created
+from .serializers import (
+    BulkShipmentItemSerializer,
+    DEFAULT_DESTINATION_RATES,
+    generate_tracking_number,
+)
+
+# Upper bound for one bulk request, bigger imports must be split by the caller.
+BULK_MAX_ITEMS = 5000
+BATCH_SIZE = 500
+
+
+def _resolve_clients(client_ids):
+    clients = User.objects.filter(id__in=client_ids, role=User.Role.CLIENT)
+    return {client.id: client for client in clients}
+
+
+def _resolve_destinations(places):
+    # known places come from the rate-card cache, the missing ones are
+    # inserted together with the default rates
+    found = {}
+    missing = []
+    for city, country in places:
+        destination = rate_cards.get_by_place(city, country)
+        if destination is None:
+            missing.append(Destination(city=city, country=country, **DEFAULT_DESTINATION_RATES))
+        else:
+            found[(city, country)] = destination
+    if missing:
+        for destination in Destination.objects.bulk_create(missing, batch_size=BATCH_SIZE):
+            found[(destination.city, destination.country)] = destination
+        # bulk_create sends no post_save signal
+        rate_cards.invalidate_on_commit()
+    return found
+
+
+def bulk_create_shipments(items, user):
+    """
+    Validate and insert many shipments at once.
+
+    Returns (results, errors), both lists of dicts keyed by the position of
+    the item in the request. Invalid items are reported and skipped, the
+    valid ones are written in a single transaction.
+    """
+    errors = []
+    valid = []
+    # a single serializer instance is reused, building its fields is the
+    # expensive part of validation
+    validator = BulkShipmentItemSerializer()
+    for index, item in enumerate(items):
+        try:
+            data = validator.run_validation(item)
+        except ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+            continue
+        # clients can only import shipments for themselves
+        if user.role == User.Role.CLIENT:
+            if data.get('client_id', user.id) != user.id:
+                errors.append({'index': index, 'errors': {'client_id': ["You can only create shipments for yourself."]}})
+                continue
+            data['client_id'] = user.id
+        elif 'client_id' not in data:
+            errors.append({'index': index, 'errors': {'client_id': ["This field is required."]}})
+            continue
+        valid.append((index, data))
+
+    clients = _resolve_clients({data['client_id'] for _, data in valid})
+    accepted = []
+    for index, data in valid:
+        if data['client_id'] not in clients:
+            errors.append({'index': index, 'errors': {'client_id': [f"Invalid pk \"{data['client_id']}\" - object does not exist."]}})
+        else:
+            accepted.append((index, data))
+
+    if not accepted:
+        return [], sorted(errors, key=lambda e: e['index'])
+
+    with transaction.atomic():
+        places = set()
+        for _, data in accepted:
+            places.add((data['origin']['city'], data['origin']['country']))
+            places.add((data['destination']['city'], data['destination']['country']))
+        destinations = _resolve_destinations(places)
+
+        shipments = []
+        for _, data in accepted:
+            destination = destinations[(data['destination']['city'], data['destination']['country'])]
+            shipments.append(Shipment(
+                client=clients[data['client_id']],
+                origin=destinations[(data['origin']['city'], data['origin']['country'])],
+                destination=destination,
+                service_type=data['service_type'],
+                total_cost=shipment_cost(destination, data['parcels']),
+            ))
+        shipments = Shipment.objects.bulk_create(shipments, batch_size=BATCH_SIZE)
+
+        parcels = []
+        used_numbers = set()
+        for shipment, (_, data) in zip(shipments, accepted):
+            for parcel_data in data['parcels']:
+                tracking_number = generate_tracking_number()
+                while tracking_number in used_numbers:
+                    tracking_number = generate_tracking_number()
+                used_numbers.add(tracking_number)
+                parcels.append(Parcel(shipment=shipment, tracking_number=tracking_number, **parcel_data))
+        Parcel.objects.bulk_create(parcels, batch_size=BATCH_SIZE)
+        shipments_bulk_created.send(sender=Shipment, shipments=shipments)
+
+    tracking_by_shipment = {}
+    for parcel in parcels:
+        tracking_by_shipment.setdefault(parcel.shipment_id, []).append(parcel.tracking_number)
+
+    results = [
+        {
+            'index': index,
+            'id': shipment.id,
+            'total_cost': str(shipment.total_cost),
+            'tracking_numbers': tracking_by_shipment.get(shipment.id, []),
+        }
+        for shipment, (index, _) in zip(shipments, accepted)
+    ]
+    return results, sorted(errors, key=lambda e: e['index'])
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shipping.routing import optimize_planned_tours
+
+
+class Command(BaseCommand):
+    help = "Reorder the stops of every planned tour and refresh their mileage and ETA."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Solver processes (default: one per CPU).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = optimize_planned_tours(workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Optimized {count} tours in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0003_shipment_shipping_sh_created_934149_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='stop_sequence',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 13:27
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_delivered_at(apps, schema_editor):
+    # the last update is the best guess for shipments delivered before
+    Shipment = apps.get_model('shipping', 'Shipment')
+    Shipment.objects.filter(status='DELIVERED').update(delivered_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0004_shipment_stop_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_delivered_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 13:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_billingrun_invoice_billing_run'),
+        ('logistics', '0003_destination_latitude_destination_longitude'),
+        ('shipping', '0005_shipment_delivered_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('invoice__isnull', True), ('status', 'DELIVERED')), fields=['client', 'delivered_at'], name='shipment_uninvoiced_idx'),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User
 from logistics.models import Destination, Driver, Vehicle
-from django.db.models import Sum, F, ExpressionWrapper
+from .pricing import calculate_shipment_cost
 
 class Shipment(models.Model):
     class ServiceType(models.TextChoices): # 1
@@ -57,45 +58,38 @@ class Shipment(models.Model):
         decimal_places=2,
         default=0.00
     )
+    # position of the delivery in its tour, filled by the route optimizer
+    stop_sequence = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-
-    def calculate_cost(self):
-       
-        if not self.pk:
-            return 0.00
-
-        total_weight = self.parcels.aggregate(
-            total=Sum('weight_kg')
-        )['total'] or 0
-
-        total_volume = self.parcels.aggregate(
-            total=Sum(
-                ExpressionWrapper(
-                    F('length_cm') * F('width_cm') * F('height_cm') / 1000000.0,
-                    output_field=models.DecimalField()
-                )
-            )
-        )['total'] or 0
-
-        destination_rates = self.destination
-        cost = (
-            destination_rates.base_rate +
-            (total_weight * destination_rates.weight_rate_per_kg) +
-            (total_volume * destination_rates.volume_rate_per_m3)
-        )
-        return cost
+    # set when the status becomes DELIVERED, cleared if it changes back
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # backs the cursor pagination of the shipment list
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            # delivered shipments waiting for an invoice, read by the billing run
+            models.Index(
+                fields=['client', 'delivered_at'],
+                condition=models.Q(status='DELIVERED', invoice__isnull=True),
+                name='shipment_uninvoiced_idx',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
-        
-        # automatically calculate cost.
-        
+        delivered = self.status == self.ShipmentStatus.DELIVERED
+        if delivered != (self.delivered_at is not None):
+            self.delivered_at = timezone.now() if delivered else None
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'delivered_at'}
         super().save(*args, **kwargs)
 
-        new_cost = self.calculate_cost()
-        if self.total_cost != new_cost:
-            self.total_cost = new_cost
-            super().save(update_fields=['total_cost'])
+    def calculate_cost(self, parcels=None):
+        # pricing lives in shipping.pricing, callers refresh total_cost
+        # explicitly when parcels change instead of on every save
+        return calculate_shipment_cost(self, parcels)
 
     def __str__(self):
         return f"Shipment #{self.id} from {self.origin.city} to {self.destination.city}"
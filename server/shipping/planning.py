@@ -0,0 +1,207 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Sum, ExpressionWrapper
+from django.utils import timezone
+
+from logistics.models import Driver, Vehicle
+from .models import Shipment, Tour
+from .tracking import tracking_cache
+
+# Vehicles only record a weight capacity, the load volume is estimated from
+# the vehicle type.
+VOLUME_CAPACITY_M3 = {
+    Vehicle.VehicleType.TRUCK: 40.0,
+    Vehicle.VehicleType.VAN: 12.0,
+    Vehicle.VehicleType.CAR: 1.5,
+}
+# rough time spent per delivery stop, refined once a route is optimized
+MINUTES_PER_STOP = 15
+# a tour has to fit in one driver shift
+SHIFT_HOURS = 10
+MAX_STOPS_PER_TOUR = SHIFT_HOURS * 60 // MINUTES_PER_STOP
+UPDATE_BATCH_SIZE = 500
+
+
+class _Bin:
+    __slots__ = ('driver', 'vehicle', 'weight_left', 'volume_left', 'zones', 'shipment_ids', 'weight', 'volume')
+
+    def __init__(self, driver, vehicle):
+        self.driver = driver
+        self.vehicle = vehicle
+        self.weight_left = float(vehicle.capacity_kg)
+        self.volume_left = VOLUME_CAPACITY_M3.get(vehicle.vehicle_type, 0.0)
+        self.zones = set()
+        self.shipment_ids = []
+        self.weight = 0.0
+        self.volume = 0.0
+
+    def fits(self, weight, volume):
+        return (
+            weight <= self.weight_left
+            and volume <= self.volume_left
+            and len(self.shipment_ids) < MAX_STOPS_PER_TOUR
+        )
+
+    def add(self, shipment_id, weight, volume, zone):
+        self.shipment_ids.append(shipment_id)
+        self.weight_left -= weight
+        self.volume_left -= volume
+        self.weight += weight
+        self.volume += volume
+        self.zones.add(zone)
+
+
+def _pending_loads(day):
+    # weight and volume of every pending, unassigned shipment in one grouped
+    # query
+    end_of_day = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    rows = (
+        Shipment.objects
+        .filter(status=Shipment.ShipmentStatus.PENDING, tour__isnull=True, created_at__lt=end_of_day)
+        .annotate(
+            load_weight=Sum('parcels__weight_kg'),
+            load_cm3=Sum(ExpressionWrapper(
+                F('parcels__length_cm') * F('parcels__width_cm') * F('parcels__height_cm'),
+                output_field=IntegerField()
+            )),
+        )
+        .values_list('id', 'destination__geographic_zone', 'destination_id', 'load_weight', 'load_cm3')
+    )
+    return [
+        (shipment_id, zone or f'destination-{destination_id}', float(weight or 0), (cm3 or 0) / 1000000.0)
+        for shipment_id, zone, destination_id, weight, cm3 in rows
+    ]
+
+
+def _available_crews(day, lock=False):
+    # drivers and vehicles that are free and not already on a tour that day
+    busy = Tour.objects.filter(
+        departure_time__date=day,
+        status__in=[Tour.TourStatus.PLANNED, Tour.TourStatus.IN_PROGRESS],
+    )
+    drivers = (
+        Driver.objects.filter(is_available=True)
+        .exclude(id__in=busy.values('driver_id'))
+        .order_by('id')
+    )
+    vehicles = (
+        Vehicle.objects.filter(is_in_service=True)
+        .exclude(id__in=busy.values('vehicle_id'))
+        .order_by('-capacity_kg', 'id')
+    )
+    if lock:
+        # held until the tours are written, a concurrent plan skips the
+        # crews locked here instead of assigning them a second time
+        vehicles = list(vehicles.select_for_update(skip_locked=True))
+        drivers = drivers.select_for_update(skip_locked=True)[:len(vehicles)]
+    # the biggest vehicles get a driver first
+    return list(zip(drivers, vehicles))
+
+
+def _pack(loads, crews):
+    """
+    First-fit decreasing over weight. A shipment goes to the first tour with
+    room that already serves its zone, then to an empty tour, then to any
+    tour with room, so tours stay geographically grouped.
+    """
+    bins = [_Bin(driver, vehicle) for driver, vehicle in crews]
+    unassigned = []
+    for shipment_id, zone, weight, volume in sorted(loads, key=lambda load: (-load[2], -load[3])):
+        fitting = [b for b in bins if b.fits(weight, volume)]
+        target = (
+            next((b for b in fitting if zone in b.zones), None)
+            or next((b for b in fitting if not b.shipment_ids), None)
+            or (fitting[0] if fitting else None)
+        )
+        if target is None:
+            unassigned.append(shipment_id)
+        else:
+            target.add(shipment_id, weight, volume, zone)
+    return [b for b in bins if b.shipment_ids], unassigned
+
+
+def _keep_claimed(tours, bins, loads):
+    """
+    Shrink the tours to the shipments their update actually claimed, the
+    others went to a concurrent plan. Tours left empty are deleted.
+    """
+    claimed = {}
+    for tour_id, shipment_id in Shipment.objects.filter(tour__in=tours).values_list('tour_id', 'id'):
+        claimed.setdefault(tour_id, set()).add(shipment_id)
+    by_id = {load[0]: load for load in loads}
+    kept_tours, kept_bins, empty = [], [], []
+    for tour, b in zip(tours, bins):
+        shipment_ids = [pk for pk in b.shipment_ids if pk in claimed.get(tour.id, ())]
+        if not shipment_ids:
+            empty.append(tour.id)
+            continue
+        if len(shipment_ids) < len(b.shipment_ids):
+            shrunk = _Bin(b.driver, b.vehicle)
+            for pk in shipment_ids:
+                _, zone, weight, volume = by_id[pk]
+                shrunk.add(pk, weight, volume, zone)
+            b = shrunk
+            tour.estimated_completion_time = tour.departure_time + datetime.timedelta(
+                minutes=MINUTES_PER_STOP * len(shipment_ids)
+            )
+        kept_tours.append(tour)
+        kept_bins.append(b)
+    Tour.objects.filter(id__in=empty).delete()
+    Tour.objects.bulk_update(kept_tours, ['estimated_completion_time'])
+    return kept_tours, kept_bins
+
+
+def plan_tours(day, departure_time=datetime.time(8, 0), dry_run=False):
+    """
+    Pack the pending shipments of `day` into tours, one per available
+    driver/vehicle pair. Returns (tours, unassigned shipment ids); tours are
+    dicts describing each planned tour, with the created Tour id unless
+    dry_run is set. Crews and shipments a concurrent plan claimed first are
+    left out.
+    """
+    loads = _pending_loads(day)
+    departure = timezone.make_aware(datetime.datetime.combine(day, departure_time))
+    with transaction.atomic():
+        crews = _available_crews(day, lock=not dry_run)
+        bins, unassigned = _pack(loads, crews)
+        tours = [
+            Tour(
+                driver=b.driver,
+                vehicle=b.vehicle,
+                departure_time=departure,
+                estimated_completion_time=departure + datetime.timedelta(minutes=MINUTES_PER_STOP * len(b.shipment_ids)),
+            )
+            for b in bins
+        ]
+        if not dry_run and tours:
+            now = timezone.now()
+            tours = Tour.objects.bulk_create(tours)
+            claimed = 0
+            for tour, b in zip(tours, bins):
+                for start in range(0, len(b.shipment_ids), UPDATE_BATCH_SIZE):
+                    batch = b.shipment_ids[start:start + UPDATE_BATCH_SIZE]
+                    # tour__isnull guards against a concurrent assignment
+                    claimed += Shipment.objects.filter(id__in=batch, tour__isnull=True).update(tour=tour, updated_at=now)
+            if claimed < sum(len(b.shipment_ids) for b in bins):
+                tours, bins = _keep_claimed(tours, bins, loads)
+    if not dry_run:
+        for b in bins:
+            for shipment_id in b.shipment_ids:
+                tracking_cache.invalidate_shipment(shipment_id)
+
+    summary = [
+        {
+            'id': tour.id,
+            'driver_id': b.driver.id,
+            'vehicle_id': b.vehicle.id,
+            'departure_time': tour.departure_time,
+            'estimated_completion_time': tour.estimated_completion_time,
+            'shipment_ids': b.shipment_ids,
+            'weight_kg': round(b.weight, 2),
+            'volume_m3': round(b.volume, 3),
+            'weight_utilization': round(b.weight / b.vehicle.capacity_kg, 3) if b.vehicle.capacity_kg else None,
+        }
+        for tour, b in zip(tours, bins)
+    ]
+    return summary, unassigned
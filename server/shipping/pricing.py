@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.db.models import F, IntegerField, Sum, ExpressionWrapper
+
+from logistics.rate_cards import rate_cards
+
+# cost = base_rate + weight * weight_rate_per_kg + volume * volume_rate_per_m3
+# with the volume of a parcel being length * width * height in cm3 / 1 000 000.
+
+CENT = Decimal('0.01')
+CM3_PER_M3 = Decimal('1000000')
+ZERO = Decimal('0')
+
+
+def _value(parcel, name):
+    if isinstance(parcel, dict):
+        return parcel[name]
+    return getattr(parcel, name)
+
+
+def parcel_totals(parcels):
+    """Total weight (kg) and volume (m3) of parcels given as models or dicts."""
+    total_weight = ZERO
+    total_cm3 = 0
+    for parcel in parcels:
+        total_weight += Decimal(_value(parcel, 'weight_kg'))
+        total_cm3 += _value(parcel, 'length_cm') * _value(parcel, 'width_cm') * _value(parcel, 'height_cm')
+    return total_weight, Decimal(total_cm3) / CM3_PER_M3
+
+
+def price(rates, total_weight, total_volume):
+    # rates is anything exposing the three Destination rate attributes
+    cost = (
+        Decimal(rates.base_rate) +
+        (Decimal(total_weight) * Decimal(rates.weight_rate_per_kg)) +
+        (Decimal(total_volume) * Decimal(rates.volume_rate_per_m3))
+    )
+    return cost.quantize(CENT)
+
+
+def shipment_cost(destination, parcels):
+    return price(destination, *parcel_totals(parcels))
+
+
+def aggregate_parcel_totals(shipment):
+    # weight and volume in one query, the volume is summed in cm3 so the
+    # database only ever adds integers
+    totals = shipment.parcels.aggregate(
+        weight=Sum('weight_kg'),
+        cm3=Sum(ExpressionWrapper(
+            F('length_cm') * F('width_cm') * F('height_cm'),
+            output_field=IntegerField()
+        )),
+    )
+    return Decimal(totals['weight'] or 0), Decimal(totals['cm3'] or 0) / CM3_PER_M3
+
+
+def shipment_rates(shipment):
+    # rates come from the rate-card cache, the destination row is only read
+    # if it is missing there
+    return rate_cards.get(shipment.destination_id) or shipment.destination
+
+
+def calculate_shipment_cost(shipment, parcels=None):
+    """
+    Price a shipment. Uses the given parcels, then prefetched ones, and only
+    falls back to a single aggregate query when neither is available.
+    """
+    if parcels is None:
+        if not shipment.pk:
+            return ZERO.quantize(CENT)
+        prefetched = getattr(shipment, '_prefetched_objects_cache', {})
+        if 'parcels' in prefetched:
+            parcels = prefetched['parcels']
+    if parcels is None:
+        totals = aggregate_parcel_totals(shipment)
+    else:
+        totals = parcel_totals(parcels)
+    return price(shipment_rates(shipment), *totals)
+
+
+def refresh_shipment_cost(shipment, parcels=None):
+    """Recompute and store total_cost, writing only when it changed."""
+    cost = calculate_shipment_cost(shipment, parcels)
+    if shipment.total_cost != cost:
+        shipment.total_cost = cost
+        shipment.save(update_fields=['total_cost', 'updated_at'])
+    return cost
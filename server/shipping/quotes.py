@@ -0,0 +1,204 @@
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+
+from logistics.rate_cards import rate_cards
+from .serializers import DEFAULT_DESTINATION_RATES, MAX_DIMENSION_CM, MAX_PARCEL_CM3
+
+# Quotes price hypothetical shipments with the same formula as
+# shipping.pricing, but for thousands of them at once and without writing
+# anything. Everything is done on int64 arrays in units of 1e-8 so that the
+# result is exact and rounds to cents exactly like the Decimal engine:
+#   base_rate (cents)                       * 10^6
+#   weight (1/100 kg) * weight_rate (cents) * 10^4
+#   volume (cm3)      * volume_rate (cents) * 1
+# Parcels are bounded like ParcelSerializer bounds them, and when the
+# largest possible total of a request would still not fit in int64 (huge
+# rates or parcel counts) the same arithmetic runs on Python integers.
+
+QUOTE_MAX_ITEMS = 20000
+MAX_WEIGHT_CENTI_KG = 9999999  # Parcel.weight_kg is max_digits=7, decimal_places=2
+UNITS_PER_CENT = 10 ** 6
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def _cents(value):
+    return int(Decimal(value) * 100)
+
+
+def _parse_place(value):
+    if not isinstance(value, dict):
+        raise ValueError("Expected an object with 'city' and 'country'.")
+    city = str(value.get('city') or '').strip()
+    country = str(value.get('country') or '').strip()
+    if not city or not country:
+        raise ValueError("Both 'city' and 'country' are required.")
+    return city, country
+
+
+def _parse_weight(value):
+    try:
+        weight = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError("A valid number is required.")
+    if not weight.is_finite() or weight <= 0 or weight.as_tuple().exponent < -2:
+        raise ValueError("Ensure this is a positive number with at most 2 decimal places.")
+    centi_kg = int(weight * 100)
+    if centi_kg > MAX_WEIGHT_CENTI_KG:
+        raise ValueError("Ensure that there are no more than 7 digits in total.")
+    return centi_kg
+
+
+def _parse_dimension(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("A valid integer is required.")
+    try:
+        dimension = int(value)
+    except ValueError:
+        raise ValueError("A valid integer is required.")
+    if dimension <= 0:
+        raise ValueError("Ensure this value is greater than 0.")
+    if dimension > MAX_DIMENSION_CM:
+        raise ValueError(f"Ensure this value is less than or equal to {MAX_DIMENSION_CM}.")
+    return dimension
+
+
+def _parse_quote(item):
+    errors = {}
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ["Expected an object."]}
+    places = {}
+    for key in ('origin', 'destination'):
+        try:
+            places[key] = _parse_place(item.get(key))
+        except ValueError as exc:
+            errors[key] = [str(exc)]
+
+    parcels = item.get('parcels')
+    parsed_parcels = []
+    if not isinstance(parcels, list) or not parcels:
+        errors['parcels'] = ["A quote needs at least one parcel."]
+    else:
+        parcel_errors = []
+        for parcel in parcels:
+            parcel_error = {}
+            if not isinstance(parcel, dict):
+                parcel_errors.append({'non_field_errors': ["Expected an object."]})
+                continue
+            try:
+                weight = _parse_weight(parcel.get('weight_kg'))
+            except ValueError as exc:
+                parcel_error['weight_kg'] = [str(exc)]
+            cm3 = 1
+            for key in ('length_cm', 'width_cm', 'height_cm'):
+                try:
+                    cm3 *= _parse_dimension(parcel.get(key))
+                except ValueError as exc:
+                    parcel_error[key] = [str(exc)]
+            if not parcel_error and cm3 > MAX_PARCEL_CM3:
+                parcel_error['non_field_errors'] = [f"A parcel cannot exceed {MAX_PARCEL_CM3} cm3."]
+            parcel_errors.append(parcel_error)
+            if not parcel_error:
+                parsed_parcels.append((weight, cm3))
+        if any(parcel_errors):
+            errors['parcels'] = parcel_errors
+
+    if errors:
+        return None, errors
+    return (places['destination'], parsed_parcels), None
+
+
+def _rate_table(places):
+    """
+    Rates in cents for every (city, country), as three aligned arrays plus
+    the index of each place in them. Unknown places get the default rates
+    a real shipment would be created with.
+    """
+    defaults = [
+        DEFAULT_DESTINATION_RATES['base_rate'],
+        DEFAULT_DESTINATION_RATES['weight_rate_per_kg'],
+        DEFAULT_DESTINATION_RATES['volume_rate_per_m3'],
+    ]
+    index = {}
+    table = []
+    for place in places:
+        destination = rate_cards.get_by_place(*place)
+        if destination is None:
+            rates = defaults
+        else:
+            rates = [destination.base_rate, destination.weight_rate_per_kg, destination.volume_rate_per_m3]
+        index[place] = len(table)
+        table.append([_cents(rate) for rate in rates])
+    table = np.array(table, dtype=np.int64).reshape(-1, 3)
+    return index, table[:, 0], table[:, 1], table[:, 2]
+
+
+def _round_to_cents(units):
+    # round half to even, like Decimal.quantize with the default context
+    cents, remainder = units // UNITS_PER_CENT, units % UNITS_PER_CENT
+    half = UNITS_PER_CENT // 2
+    cents += (remainder > half) | ((remainder == half) & (cents % 2 == 1))
+    return cents
+
+
+def price_quotes(items):
+    """
+    Price a list of hypothetical shipments. Returns (results, errors) keyed
+    by the position of each item in the request, nothing is written.
+    """
+    errors = []
+    indexes = []
+    destinations = []
+    parcel_quote = []
+    parcel_weight = []
+    parcel_cm3 = []
+    for index, item in enumerate(items):
+        parsed, item_errors = _parse_quote(item)
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+            continue
+        destination, parcels = parsed
+        position = len(indexes)
+        indexes.append(index)
+        destinations.append(destination)
+        for weight, cm3 in parcels:
+            parcel_quote.append(position)
+            parcel_weight.append(weight)
+            parcel_cm3.append(cm3)
+
+    if not indexes:
+        return [], errors
+
+    place_index, base, weight_rate, volume_rate = _rate_table(set(destinations))
+    rate_row = np.fromiter((place_index[d] for d in destinations), dtype=np.int64, count=len(destinations))
+
+    # bound of any total: every parcel of the request on the dearest rates
+    bound = (
+        int(base.max()) * UNITS_PER_CENT +
+        sum(parcel_weight) * int(weight_rate.max()) * 10 ** 4 +
+        sum(parcel_cm3) * int(volume_rate.max())
+    )
+    dtype = np.int64 if bound <= INT64_MAX else object
+    if dtype is object:
+        base, weight_rate, volume_rate = base.astype(object), weight_rate.astype(object), volume_rate.astype(object)
+
+    parcel_quote = np.array(parcel_quote, dtype=np.int64)
+    # per-quote sums with an integer scatter-add, np.bincount would go
+    # through float64
+    total_weight = np.zeros(len(indexes), dtype=dtype)
+    np.add.at(total_weight, parcel_quote, np.array(parcel_weight, dtype=dtype))
+    total_cm3 = np.zeros(len(indexes), dtype=dtype)
+    np.add.at(total_cm3, parcel_quote, np.array(parcel_cm3, dtype=dtype))
+
+    units = (
+        base[rate_row] * UNITS_PER_CENT +
+        total_weight * weight_rate[rate_row] * 10 ** 4 +
+        total_cm3 * volume_rate[rate_row]
+    )
+    cents = _round_to_cents(units).tolist()
+
+    results = [
+        {'index': index, 'total_cost': f"{cost // 100}.{cost % 100:02d}"}
+        for index, cost in zip(indexes, cents)
+    ]
+    return results, errors
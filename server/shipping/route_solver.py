@@ -0,0 +1,57 @@
+import numpy as np
+
+# Pure NumPy stop ordering, kept free of Django imports so it can run in
+# worker processes started with the spawn method.
+
+
+def nearest_neighbour(dist):
+    """Greedy closed tour over the nodes of `dist`, starting at node 0."""
+    n = len(dist)
+    route = [0]
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[route[-1]])
+        nxt = int(np.argmin(row))
+        route.append(nxt)
+        visited[nxt] = True
+    return route
+
+
+def two_opt(route, dist, max_passes=50):
+    """
+    Improve a closed tour by reversing segments while that shortens it.
+    Node 0 stays first. For each i, the gains of every j are computed in one
+    vectorized step.
+    """
+    route = np.array(route + [route[0]], dtype=np.int64)
+    n = len(route)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 2):
+            a, b = route[i - 1], route[i]
+            c = route[i + 1:n - 1]
+            d = route[i + 2:n]
+            gain = dist[a, b] + dist[c, d] - dist[a, c] - dist[b, d]
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                j += i + 1
+                route[i:j + 1] = route[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return route[:-1].tolist()
+
+
+def route_length(route, dist):
+    closed = route + [route[0]]
+    return float(sum(dist[closed[k], closed[k + 1]] for k in range(len(route))))
+
+
+def solve_route(dist):
+    """Order of the nodes of `dist` (node 0 first) and the closed tour length."""
+    dist = np.asarray(dist, dtype=np.float64)
+    if len(dist) <= 1:
+        return list(range(len(dist))), 0.0
+    route = two_opt(nearest_neighbour(dist), dist)
+    return route, route_length(route, dist)
@@ -0,0 +1,124 @@
+import datetime
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from logistics.distances import distance_matrix
+from .models import Shipment, Tour
+from .planning import MINUTES_PER_STOP
+from .route_solver import solve_route
+
+# Straight-line distances understate what is driven on roads.
+ROAD_FACTOR = 1.25
+AVERAGE_SPEED_KMH = 50
+# below this many tours starting worker processes costs more than it saves
+PARALLEL_MIN_TOURS = 200
+
+
+class RoutePlan:
+    """Optimized stop order of one tour, before it is written back."""
+
+    def __init__(self, tour_id, shipments):
+        # shipments: list of (shipment id, origin id, destination id)
+        self.tour_id = tour_id
+        self.shipments = shipments
+        # the depot is where most of the tour's shipments leave from
+        self.depot = Counter(origin for _, origin, _ in shipments).most_common(1)[0][0]
+        self.stops = list(dict.fromkeys(destination for _, _, destination in shipments))
+
+        ids = [self.depot] + self.stops
+        dist = distance_matrix.submatrix(ids)
+        geocoded = ~np.isnan(np.diag(dist))
+        # stops without coordinates cannot be routed, they go last
+        self.nodes = [k for k in range(len(ids)) if geocoded[k]]
+        self.ids = ids
+        self.dist = dist[np.ix_(self.nodes, self.nodes)]
+        self.order = None
+        self.length_km = None
+
+    def apply(self, route, length_km):
+        visited = [self.ids[self.nodes[k]] for k in route]
+        if visited and visited[0] == self.depot:
+            visited = visited[1:]
+        routed = set(visited)
+        self.order = visited + [stop for stop in self.stops if stop not in routed]
+        # no mileage when fewer than two places are geocoded
+        self.length_km = length_km * ROAD_FACTOR if len(self.nodes) > 1 else None
+
+    def sequences(self):
+        position = {destination: index + 1 for index, destination in enumerate(self.order)}
+        return {shipment_id: position[destination] for shipment_id, _, destination in self.shipments}
+
+
+def _write(plans, tours):
+    by_id = {tour.id: tour for tour in tours}
+    shipments = []
+    for plan in plans:
+        tour = by_id[plan.tour_id]
+        if plan.length_km is None:
+            tour.mileage_km = None
+            driving = datetime.timedelta()
+        else:
+            tour.mileage_km = Decimal(plan.length_km).quantize(Decimal('0.01'))
+            driving = datetime.timedelta(hours=plan.length_km / AVERAGE_SPEED_KMH)
+        stops = datetime.timedelta(minutes=MINUTES_PER_STOP * len(plan.shipments))
+        tour.estimated_completion_time = tour.departure_time + driving + stops
+        for shipment_id, sequence in plan.sequences().items():
+            shipments.append(Shipment(id=shipment_id, stop_sequence=sequence))
+    with transaction.atomic():
+        Tour.objects.bulk_update(tours, ['mileage_km', 'estimated_completion_time'], batch_size=500)
+        Shipment.objects.bulk_update(shipments, ['stop_sequence'], batch_size=500)
+
+
+def _plans(tours):
+    rows = (
+        Shipment.objects
+        .filter(tour__in=tours)
+        .order_by('id')
+        .values_list('tour_id', 'id', 'origin_id', 'destination_id')
+    )
+    grouped = {}
+    for tour_id, shipment_id, origin_id, destination_id in rows:
+        grouped.setdefault(tour_id, []).append((shipment_id, origin_id, destination_id))
+    return [RoutePlan(tour_id, shipments) for tour_id, shipments in grouped.items()]
+
+
+def optimize_tour(tour):
+    """Order the stops of one tour and store sequence, mileage and ETA."""
+    plans = _plans([tour])
+    if not plans:
+        return None
+    plans[0].apply(*solve_route(plans[0].dist))
+    _write(plans, [tour])
+    return plans[0]
+
+
+def optimize_planned_tours(workers=None):
+    """
+    Reoptimize every PLANNED tour. Distances are read here, the solving is
+    spread over a process pool and results are written in bulk.
+    Returns the number of tours optimized.
+    """
+    tours = list(Tour.objects.filter(status=Tour.TourStatus.PLANNED))
+    plans = _plans(tours)
+    if not plans:
+        return 0
+    workers = workers or os.cpu_count() or 1
+    matrices = [plan.dist for plan in plans]
+    if workers == 1 or len(plans) < PARALLEL_MIN_TOURS:
+        results = map(solve_route, matrices)
+    else:
+        # spawn so workers never share the parent's database connection
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(solve_route, matrices, chunksize=max(1, len(matrices) // (workers * 4))))
+    for plan, (route, length_km) in zip(plans, results):
+        plan.apply(route, length_km)
+    planned_ids = {plan.tour_id for plan in plans}
+    _write(plans, [tour for tour in tours if tour.id in planned_ids])
+    return len(plans)
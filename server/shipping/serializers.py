@@ -1,9 +1,21 @@
 from rest_framework import serializers
 from logistics.models import Destination
+from logistics.rate_cards import rate_cards
 from .models import Shipment, Parcel, Tour
+from .pricing import shipment_cost
 from users.models import User
 from users.serializers import UserSerializer 
+from server.fieldsets import SparseFieldsetMixin
 from logistics.serializers import DriverSerializer, VehicleSerializer, DestinationSerializer
+from server.instrumentation import TimedDataMixin
+
+# PositiveIntegerField holds up to this on every backend (SQLite allows more)
+MAX_DIMENSION_CM = 2147483647
+# 10 000 m3, far above any vehicle; keeps the volume products of pricing and
+# quotes within 64-bit integers
+MAX_PARCEL_CM3 = 10 ** 10
+DIMENSIONS = ('length_cm', 'width_cm', 'height_cm')
+
 
 class ParcelSerializer(serializers.ModelSerializer):
    
@@ -12,10 +24,33 @@ class ParcelSerializer(serializers.ModelSerializer):
         
         fields = ['id', 'tracking_number', 'weight_kg', 'height_cm', 'width_cm', 'length_cm']
         read_only_fields = ['tracking_number']
+        extra_kwargs = {name: {'max_value': MAX_DIMENSION_CM} for name in DIMENSIONS}
+
+    def validate(self, attrs):
+        # partial updates keep the stored dimensions they do not send
+        cm3 = 1
+        for name in DIMENSIONS:
+            cm3 *= attrs.get(name, getattr(self.instance, name, None) or 1)
+        if cm3 > MAX_PARCEL_CM3:
+            raise serializers.ValidationError(f"A parcel cannot exceed {MAX_PARCEL_CM3} cm3.")
+        return attrs
 
+import datetime
 import uuid
 
-class ShipmentSerializer(serializers.ModelSerializer):
+# Rates applied when a shipment references a city we have not priced yet.
+DEFAULT_DESTINATION_RATES = {
+    'base_rate': 10.00,
+    'weight_rate_per_kg': 2.00,
+    'volume_rate_per_m3': 50.00
+}
+
+
+def generate_tracking_number():
+    return f"TRK-{uuid.uuid4().hex[:8].upper()}"
+
+
+class ShipmentSerializer(TimedDataMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     client = UserSerializer(read_only=True)
     # Use DictField for input to bypass DestinationSerializer's strict validation
     origin = serializers.DictField(write_only=True)
@@ -35,52 +70,87 @@ class ShipmentSerializer(serializers.ModelSerializer):
         model = Shipment
         fields = [
             'id', 'client', 'origin', 'destination', 'origin_detail', 'destination_detail', 'tour', 'status', 'total_cost',
-            'created_at', 'parcels', 'client_id', 'service_type'
+            'created_at', 'delivered_at', 'parcels', 'client_id', 'service_type', 'stop_sequence'
         ]
-        read_only_fields = ['tour', 'total_cost']
+        read_only_fields = ['tour', 'total_cost', 'stop_sequence', 'delivered_at']
+        # rendered as ids unless requested with ?expand=
+        expandable_fields = ['client', 'origin_detail', 'destination_detail', 'parcels']
+
+    def _resolve_destination(self, data):
+        # known places come from the rate-card cache, new ones are created
+        # with the default rates
+        destination = rate_cards.get_by_place(data['city'], data['country'])
+        if destination is None:
+            destination, _ = Destination.objects.get_or_create(
+                city=data['city'],
+                country=data['country'],
+                defaults=DEFAULT_DESTINATION_RATES
+            )
+        return destination
 
     def create(self, validated_data):
         parcels_data = validated_data.pop('parcels')
         origin_data = validated_data.pop('origin')
         destination_data = validated_data.pop('destination')
 
-        # Get or Create Origin with default rates if needed
-        origin, _ = Destination.objects.get_or_create(
-            city=origin_data['city'],
-            country=origin_data['country'],
-            defaults={
-                'base_rate': 10.00,
-                'weight_rate_per_kg': 2.00,
-                'volume_rate_per_m3': 50.00
-            }
-        )
-
-        # Get or Create Destination with default rates if needed
-        destination, _ = Destination.objects.get_or_create(
-            city=destination_data['city'],
-            country=destination_data['country'],
-            defaults={
-                'base_rate': 10.00,
-                'weight_rate_per_kg': 2.00,
-                'volume_rate_per_m3': 50.00
-            }
-        )
+        origin = self._resolve_destination(origin_data)
+        destination = self._resolve_destination(destination_data)
 
+        # priced from the submitted parcels so the row is written once
         shipment = Shipment.objects.create(
             origin=origin,
             destination=destination,
+            total_cost=shipment_cost(destination, parcels_data),
             **validated_data
         )
         
+        parcels = []
         for parcel_data in parcels_data:
             # Auto-generate tracking number if missing
             if 'tracking_number' not in parcel_data or not parcel_data['tracking_number']:
-                parcel_data['tracking_number'] = f"TRK-{uuid.uuid4().hex[:8].upper()}"
-            Parcel.objects.create(shipment=shipment, **parcel_data)
+                parcel_data['tracking_number'] = generate_tracking_number()
+            parcels.append(Parcel(shipment=shipment, **parcel_data))
+        Parcel.objects.bulk_create(parcels)
             
         return shipment
 
-class TourSerializer(serializers.ModelSerializer):
+class ShipmentListQuerySerializer(serializers.Serializer):
+    # ?client=<id>&status=DELIVERED&uninvoiced=true, each optional
+    client = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=Shipment.ShipmentStatus.choices, required=False)
+    uninvoiced = serializers.BooleanField(required=False, default=None, allow_null=True)
+
+
+class BulkShipmentItemSerializer(serializers.Serializer):
+    # One entry of a bulk import. Validation must not hit the database,
+    # clients and destinations are resolved for the whole batch at once.
+    origin = serializers.DictField()
+    destination = serializers.DictField()
+    parcels = ParcelSerializer(many=True)
+    client_id = serializers.IntegerField(required=False)
+    service_type = serializers.ChoiceField(
+        choices=Shipment.ServiceType.choices, default=Shipment.ServiceType.STANDARD
+    )
+
+    def _validate_place(self, value):
+        city = str(value.get('city') or '').strip()
+        country = str(value.get('country') or '').strip()
+        if not city or not country:
+            raise serializers.ValidationError("Both 'city' and 'country' are required.")
+        return {'city': city, 'country': country}
+
+    def validate_origin(self, value):
+        return self._validate_place(value)
+
+    def validate_destination(self, value):
+        return self._validate_place(value)
+
+    def validate_parcels(self, value):
+        if not value:
+            raise serializers.ValidationError("A shipment needs at least one parcel.")
+        return value
+
+class TourSerializer(TimedDataMixin, serializers.ModelSerializer):
    
     driver = DriverSerializer(read_only=True)
     vehicle = VehicleSerializer(read_only=True)
@@ -92,5 +162,12 @@ class TourSerializer(serializers.ModelSerializer):
         model = Tour
         fields = [
             'id', 'driver', 'vehicle', 'status', 'departure_time',
-            'estimated_completion_time', 'shipments'
+            'estimated_completion_time', 'mileage_km', 'shipments'
         ]
+        read_only_fields = ['mileage_km']
+
+
+class TourPlanSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    departure_time = serializers.TimeField(default=datetime.time(8, 0))
+    dry_run = serializers.BooleanField(default=False)
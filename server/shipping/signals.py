@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Parcel, Shipment
+from .tracking import tracking_cache
+
+# Sent after shipments are inserted with bulk_create, which sends no
+# post_save. Arguments: shipments (the created instances).
+shipments_bulk_created = Signal()
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_delete, sender=Shipment)
+def invalidate_shipment_tracking(sender, instance, **kwargs):
+    tracking_cache.invalidate_shipment(instance.pk)
+
+
+@receiver(post_save, sender=Parcel)
+@receiver(post_delete, sender=Parcel)
+def invalidate_parcel_tracking(sender, instance, **kwargs):
+    tracking_cache.invalidate_parcel(instance.tracking_number)
@@ -1,3 +1,667 @@
-from django.test import TestCase
+import datetime
+import io
+import tempfile
+import threading
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from finance.models import Invoice
+from logistics.distances import DistanceMatrix
+from logistics.models import Destination, Driver, Vehicle
+from logistics.rate_cards import rate_cards
+from server.pagination import DefaultCursorPagination
+from server.testing import max_queries
+from users.models import User
+
+from . import planning, pricing, route_solver, routing
+from .tracking import TrackingCache, tracking_cache
+from .models import Parcel, Shipment, Tour
+
+
+def parcel(**values):
+    return {'weight_kg': '2.50', 'length_cm': 30, 'width_cm': 20, 'height_cm': 10, **values}
+
+
+def shipment_item(**values):
+    return {
+        'origin': {'city': 'Alger', 'country': 'DZ'},
+        'destination': {'city': 'Oran', 'country': 'DZ'},
+        'parcels': [parcel()],
+        **values,
+    }
+
+
+class BulkShipmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.other_client = User.objects.create_user('other', password='x', role=User.Role.CLIENT)
+        Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', base_rate=10, weight_rate_per_kg=2, volume_rate_per_m3=50)
+            for city in ('Alger', 'Oran')
+        ])
+
+    def setUp(self):
+        rate_cards.invalidate()
+        self.client = APIClient()
+
+    def post(self, user, items):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/shipments/bulk/', {'shipments': items}, format='json')
+
+    def test_mixed_batch(self):
+        response = self.post(self.admin, [
+            shipment_item(client_id=self.client_user.id),
+            shipment_item(client_id=self.client_user.id, parcels=[]),
+            shipment_item(client_id=self.admin.id),
+            shipment_item(client_id=self.other_client.id, parcels=[parcel(), parcel(weight_kg='1.00')]),
+            shipment_item(),
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 3])
+        self.assertEqual(
+            {error['index']: list(error['errors']) for error in response.data['errors']},
+            {1: ['parcels'], 2: ['client_id'], 4: ['client_id']},
+        )
+        first = Shipment.objects.get(pk=response.data['results'][0]['id'])
+        # 10 + 2.5 kg * 2 + 0.006 m3 * 50
+        self.assertEqual(str(first.total_cost), '15.30')
+        self.assertEqual(response.data['results'][0]['total_cost'], '15.30')
+        self.assertEqual(Parcel.objects.filter(shipment__client=self.other_client).count(), 2)
+
+    def test_clients_create_for_themselves(self):
+        response = self.post(self.client_user, [
+            shipment_item(),
+            shipment_item(client_id=self.other_client.id),
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertIn('client_id', response.data['errors'][0]['errors'])
+        self.assertEqual(list(Shipment.objects.values_list('client', flat=True)), [self.client_user.id])
+
+    def test_all_invalid(self):
+        response = self.post(self.client_user, [shipment_item(parcels=[])])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Shipment.objects.exists())
+
+    def test_oversized_parcels_are_rejected(self):
+        response = self.post(self.client_user, [shipment_item(parcels=[parcel(length_cm=10 ** 6, width_cm=10 ** 6)])])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.data['errors'][0]['errors']['parcels'][0])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        for count in (1, 10, 100):
+            items = [
+                shipment_item(client_id=self.client_user.id, destination={'city': f'City {count}', 'country': 'DZ'})
+                for _ in range(count)
+            ]
+            with self.subTest(items=count), max_queries(13):
+                response = self.post(self.admin, items)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['created'], count)
+
+
+class ShipmentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.other_client = User.objects.create_user('other', password='x', role=User.Role.CLIENT)
+        oran = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=2, volume_rate_per_m3=50,
+        )
+        cls.invoice = Invoice.objects.create(client=cls.client_user, due_date=datetime.date(2026, 12, 31))
+        Shipment.objects.bulk_create([
+            Shipment(
+                client=cls.other_client if k % 3 == 0 else cls.client_user, origin=oran, destination=oran,
+                status=Shipment.ShipmentStatus.DELIVERED if k % 2 else Shipment.ShipmentStatus.PENDING,
+                invoice=cls.invoice if k == 1 else None,
+            )
+            for k in range(9)
+        ])
+        # ties on created_at are broken by id
+        Shipment.objects.update(created_at=datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def list_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_follow_created_at_then_id(self):
+        expected = list(Shipment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.list_ids('/api/shipments/?page_size=2'), expected)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(DefaultCursorPagination, 'page_size', 4), \
+                mock.patch.object(DefaultCursorPagination, 'max_page_size', 5):
+            self.assertEqual(len(self.client.get('/api/shipments/').data['results']), 4)
+            self.assertEqual(len(self.client.get('/api/shipments/?page_size=100').data['results']), 5)
+
+    def test_clients_list_their_own(self):
+        self.client.force_authenticate(self.client_user)
+        ids = self.list_ids('/api/shipments/?page_size=2')
+
+        self.assertEqual(sorted(ids), sorted(Shipment.objects.filter(client=self.client_user).values_list('id', flat=True)))
+        self.assertEqual(self.list_ids(f'/api/shipments/?client={self.other_client.id}'), [])
+
+    def test_server_timing(self):
+        response = self.client.get('/api/shipments/?expand=client')
+
+        metrics = dict(
+            (part.split(';')[0].strip(), float(part.split('dur=')[1].split(';')[0]))
+            for part in response['Server-Timing'].split(',')
+        )
+        self.assertEqual(list(metrics), ['db', 'serialize', 'render', 'total'])
+        self.assertGreater(metrics['serialize'], 0)
+        self.assertLessEqual(metrics['serialize'], metrics['total'])
+
+    def test_filters(self):
+        ids = self.list_ids(f'/api/shipments/?client={self.client_user.id}&status=DELIVERED&uninvoiced=true&page_size=2')
+
+        self.assertEqual(sorted(ids), sorted(Shipment.objects.filter(
+            client=self.client_user, status=Shipment.ShipmentStatus.DELIVERED, invoice__isnull=True,
+        ).values_list('id', flat=True)))
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.client.get('/api/shipments/?status=LOST').status_code, 400)
+
+
+def formula_cost(rates, parcels):
+    # the per-shipment formula pricing replaced, in exact Decimal arithmetic
+    # and rounded to the cent like the total_cost column
+    weight = sum((Decimal(p['weight_kg']) for p in parcels), Decimal('0'))
+    volume = sum((Decimal(p['length_cm'] * p['width_cm'] * p['height_cm']) / 1000000 for p in parcels), Decimal('0'))
+    cost = Decimal(rates['base_rate']) + weight * Decimal(rates['weight_rate_per_kg']) \
+        + volume * Decimal(rates['volume_rate_per_m3'])
+    return cost.quantize(pricing.CENT)
+
+
+class PricingTests(TestCase):
+    RATES = {'base_rate': '10.00', 'weight_rate_per_kg': '0.10', 'volume_rate_per_m3': '12.35'}
+    CASES = {
+        'one parcel': [parcel()],
+        'small parcel': [parcel(weight_kg='0.25', length_cm=1, width_cm=1, height_cm=1)],
+        'several parcels': [parcel(), parcel(weight_kg='0.35', length_cm=45, width_cm=33, height_cm=7), parcel()],
+        'zero weight': [parcel(weight_kg='0.00'), parcel(weight_kg='0', length_cm=120, width_cm=80, height_cm=60)],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.origin = Destination.objects.create(city='Alger', country='DZ', base_rate=1, weight_rate_per_kg=1, volume_rate_per_m3=1)
+        cls.destination = Destination.objects.create(city='Oran', country='DZ', **cls.RATES)
+
+    def setUp(self):
+        rate_cards.invalidate()
+
+    def test_matches_the_formula(self):
+        for name, parcels in self.CASES.items():
+            expected = formula_cost(self.RATES, parcels)
+            with self.subTest(name):
+                self.assertEqual(pricing.shipment_cost(self.destination, parcels), expected)
+                shipment = Shipment.objects.create(client=self.client_user, origin=self.origin, destination=self.destination)
+                Parcel.objects.bulk_create([
+                    Parcel(shipment=shipment, tracking_number=f'TRK-{shipment.id}-{k}', **values)
+                    for k, values in enumerate(parcels)
+                ])
+                # aggregate query, prefetched parcels and given parcels
+                self.assertEqual(pricing.calculate_shipment_cost(shipment), expected)
+                prefetched = Shipment.objects.prefetch_related('parcels').get(pk=shipment.pk)
+                self.assertEqual(pricing.calculate_shipment_cost(prefetched), expected)
+                self.assertEqual(pricing.calculate_shipment_cost(shipment, list(shipment.parcels.all())), expected)
+
+                pricing.refresh_shipment_cost(shipment)
+                shipment.refresh_from_db()
+                self.assertEqual(shipment.total_cost, expected)
+
+    def test_rounds_half_cents_to_even(self):
+        rates = SimpleNamespace(base_rate='10.00', weight_rate_per_kg='0.10', volume_rate_per_m3='0')
+        # 0.25 kg * 0.10 = 0.025 and 0.35 kg * 0.10 = 0.035
+        self.assertEqual(pricing.price(rates, Decimal('0.25'), 0), Decimal('10.02'))
+        self.assertEqual(pricing.price(rates, Decimal('0.35'), 0), Decimal('10.04'))
+
+
+class QuoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.destinations = Destination.objects.bulk_create([
+            Destination(city='Oran', country='DZ', base_rate='10.00', weight_rate_per_kg='0.10', volume_rate_per_m3='12.35'),
+            Destination(city='Sahara', country='DZ', base_rate='99999999.99', weight_rate_per_kg='99999999.99',
+                        volume_rate_per_m3='99999999.99'),
+        ])
+
+    def setUp(self):
+        rate_cards.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.client_user)
+
+    def quote(self, items):
+        return self.client.post('/api/quotes/', {'quotes': items}, format='json')
+
+    def test_matches_pricing(self):
+        oran = self.destinations[0]
+        cases = [
+            [parcel()],
+            [parcel(weight_kg='0.25', length_cm=1, width_cm=1, height_cm=1)],
+            [parcel(), parcel(weight_kg='0.35', length_cm=45, width_cm=33, height_cm=7), parcel()],
+            [parcel(weight_kg='99999.99', length_cm=2000, width_cm=2000, height_cm=2500)],
+        ]
+        response = self.quote([shipment_item(parcels=parcels) for parcels in cases])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['total_cost'] for result in response.data['results']],
+            [str(pricing.shipment_cost(oran, parcels)) for parcels in cases],
+        )
+
+    def test_unknown_destination_gets_the_default_rates(self):
+        response = self.quote([shipment_item(destination={'city': 'Nowhere', 'country': 'DZ'})])
+        # 10 + 2.5 kg * 2 + 0.006 m3 * 50
+        self.assertEqual(response.data['results'][0]['total_cost'], '15.30')
+
+    def test_totals_beyond_64_bits_stay_exact(self):
+        parcels = [parcel(weight_kg='99999.99', length_cm=2000, width_cm=2000, height_cm=2500)] * 3
+        response = self.quote([shipment_item(destination={'city': 'Sahara', 'country': 'DZ'}, parcels=parcels)])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['results'][0]['total_cost'], str(pricing.shipment_cost(self.destinations[1], parcels))
+        )
+
+    def test_oversized_parcels_are_rejected(self):
+        response = self.quote([
+            shipment_item(parcels=[parcel(length_cm=2 * 10 ** 9, width_cm=2 * 10 ** 9, height_cm=2 * 10 ** 9)]),
+            shipment_item(parcels=[parcel(length_cm=200000, width_cm=200000, height_cm=200000)]),
+            shipment_item(parcels=[parcel(length_cm=3 * 10 ** 9)]),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2])
+        self.assertIn('non_field_errors', response.data['errors'][1]['errors']['parcels'][0])
+        self.assertIn('length_cm', response.data['errors'][2]['errors']['parcels'][0])
+
+    def test_mixed_batch(self):
+        response = self.quote([shipment_item(), shipment_item(parcels=[])])
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['count'], response.data['errors'][0]['index']), (1, 1))
+
+
+class TrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        origin, destination = Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', base_rate=10, weight_rate_per_kg=2, volume_rate_per_m3=50)
+            for city in ('Alger', 'Oran')
+        ])
+        cls.shipment = Shipment.objects.create(client=client_user, origin=origin, destination=destination)
+        Parcel.objects.create(
+            shipment=cls.shipment, tracking_number='TRK-1', weight_kg=1, length_cm=1, width_cm=1, height_cm=1,
+        )
+
+    def setUp(self):
+        tracking_cache.clear()
+        self.client = APIClient()
+
+    def test_lookups_are_cached_until_the_shipment_changes(self):
+        with max_queries(1):
+            self.assertEqual(self.client.get('/api/track/TRK-1/').data['status'], 'PENDING')
+        with max_queries(0):
+            self.assertEqual(self.client.get('/api/track/TRK-1/').data['status'], 'PENDING')
+
+        self.shipment.status = Shipment.ShipmentStatus.IN_TRANSIT
+        self.shipment.save()
+        self.assertEqual(self.client.get('/api/track/TRK-1/').data['status'], 'IN_TRANSIT')
+        self.assertEqual(self.client.get('/api/track/TRK-404/').status_code, 404)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = TrackingCache(maxsize=2, ttl=60)
+        cache.set('A', 1, 'a')
+        cache.set('B', 2, 'b')
+        cache.get('A')
+        cache.set('C', 2, 'c')
+
+        self.assertEqual((cache.get('A'), cache.get('B'), cache.get('C')), ('a', None, 'c'))
+        cache.invalidate_shipment(2)
+        self.assertEqual((cache.get('A'), cache.get('C')), ('a', None))
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_entries_expire(self):
+        cache = TrackingCache(maxsize=2, ttl=-1)
+        cache.set('A', 1, 'a')
+        self.assertIsNone(cache.get('A'))
+
+
+class TourPlanningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.origin, cls.east, cls.west = Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', geographic_zone=zone, base_rate=1, weight_rate_per_kg=1,
+                        volume_rate_per_m3=1)
+            for city, zone in (('Alger', 'center'), ('Constantine', 'east'), ('Oran', 'west'))
+        ])
+        for k, capacity in enumerate((1000, 500)):
+            user = User.objects.create_user(f'driver{k}', password='x', role=User.Role.DRIVER)
+            Driver.objects.create(user=user, license_number=f'L{k}')
+            Vehicle.objects.create(
+                registration_number=f'V{k}', vehicle_type=Vehicle.VehicleType.TRUCK, capacity_kg=capacity,
+                fuel_consumption=10,
+            )
+
+    def make_shipments(self, destination, weights):
+        shipments = Shipment.objects.bulk_create([
+            Shipment(client=self.client_user, origin=self.origin, destination=destination) for _ in weights
+        ])
+        Parcel.objects.bulk_create([
+            Parcel(shipment=shipment, tracking_number=f'TRK-{shipment.id}', weight_kg=weight,
+                   length_cm=10, width_cm=10, height_cm=10)
+            for shipment, weight in zip(shipments, weights)
+        ])
+        return [shipment.id for shipment in shipments]
+
+    def plan(self, **kwargs):
+        return planning.plan_tours(datetime.date.today() + datetime.timedelta(days=1), **kwargs)
+
+    def test_tours_follow_zones_and_capacity(self):
+        east = self.make_shipments(self.east, [300, 300])
+        west = self.make_shipments(self.west, [200, 200])
+        too_heavy = self.make_shipments(self.west, [2000])
+
+        tours, unassigned = self.plan()
+
+        self.assertEqual(unassigned, too_heavy)
+        self.assertEqual(sorted(sorted(tour['shipment_ids']) for tour in tours), [east, west])
+        self.assertEqual(sorted(tour['weight_kg'] for tour in tours), [400, 600])
+        for tour in tours:
+            self.assertEqual(
+                set(Shipment.objects.filter(tour=tour['id']).values_list('id', flat=True)), set(tour['shipment_ids'])
+            )
+
+    def test_dry_run_writes_nothing(self):
+        self.make_shipments(self.east, [10])
+        tours, _ = self.plan(dry_run=True)
+        self.assertEqual((len(tours), tours[0]['id']), (1, None))
+        self.assertFalse(Tour.objects.exists())
+
+    def test_shipments_claimed_meanwhile_are_left_out(self):
+        east = self.make_shipments(self.east, [300, 300])
+        west = self.make_shipments(self.west, [200])
+        other = Tour.objects.create(
+            driver=Driver.objects.first(), vehicle=Vehicle.objects.first(),
+            departure_time=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+            estimated_completion_time=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        crews = planning._available_crews
+
+        def claim_then_crews(day, **kwargs):
+            # a concurrent plan takes a shipment after the loads were read
+            Shipment.objects.filter(id__in=[east[0], *west]).update(tour=other)
+            return crews(day, **kwargs)
+
+        with mock.patch.object(planning, '_available_crews', claim_then_crews):
+            tours, unassigned = self.plan()
+
+        self.assertEqual(unassigned, [])
+        self.assertEqual([tour['shipment_ids'] for tour in tours], [[east[1]]])
+        self.assertEqual(tours[0]['weight_kg'], 300)
+        self.assertEqual(Tour.objects.exclude(pk=other.pk).count(), 1)
+
+    def test_crews_are_locked_while_planning(self):
+        self.make_shipments(self.east, [10])
+        locking = mock.patch.object(
+            QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update
+        )
+
+        with locking as select_for_update:
+            self.plan(dry_run=True)
+        select_for_update.assert_not_called()
+
+        with locking as select_for_update:
+            tours, _ = self.plan()
+        self.assertEqual(
+            {(call.args[0].model, call.kwargs['skip_locked']) for call in select_for_update.call_args_list},
+            {(Driver, True), (Vehicle, True)},
+        )
+        self.assertEqual(len(tours), 1)
+
+    def test_crews_on_a_tour_that_day_are_not_reused(self):
+        self.make_shipments(self.east, [300])
+        first, _ = self.plan()
+        self.make_shipments(self.west, [200])
+
+        second, _ = self.plan()
+
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(second[0]['driver_id'], first[0]['driver_id'])
+        self.assertNotEqual(second[0]['vehicle_id'], first[0]['vehicle_id'])
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentTourPlanningTests(TransactionTestCase):
+    def test_locked_crews_are_skipped(self):
+        client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        place = Destination.objects.create(city='Alger', country='DZ', base_rate=1, weight_rate_per_kg=1,
+                                           volume_rate_per_m3=1)
+        for k in range(2):
+            user = User.objects.create_user(f'driver{k}', password='x', role=User.Role.DRIVER)
+            Driver.objects.create(user=user, license_number=f'L{k}')
+            Vehicle.objects.create(registration_number=f'V{k}', vehicle_type=Vehicle.VehicleType.TRUCK,
+                                   capacity_kg=1000 - k, fuel_consumption=10)
+        shipment = Shipment.objects.create(client=client_user, origin=place, destination=place)
+        Parcel.objects.create(shipment=shipment, tracking_number='TRK-1', weight_kg=10, length_cm=10, width_cm=10,
+                              height_cm=10)
+        locked, release = threading.Event(), threading.Event()
+
+        def concurrent_plan():
+            # holds the first crew the way a plan in progress does
+            try:
+                with transaction.atomic():
+                    Driver.objects.select_for_update().get(license_number='L0')
+                    Vehicle.objects.select_for_update().get(registration_number='V0')
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=concurrent_plan)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        locked.wait(10)
+
+        tours, _ = planning.plan_tours(datetime.date.today())
+
+        self.assertEqual(
+            [(tour['driver_id'], tour['vehicle_id']) for tour in tours],
+            [(Driver.objects.get(license_number='L1').id, Vehicle.objects.get(registration_number='V1').id)],
+        )
+
+
+class TourOptimizeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = User.objects.create_user('agent', password='x', role=User.Role.AGENT)
+        cls.driver_user = User.objects.create_user('driver', password='x', role=User.Role.DRIVER)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.driver = Driver.objects.create(user=cls.driver_user, license_number='L0')
+        cls.vehicle = Vehicle.objects.create(
+            registration_number='V0', vehicle_type=Vehicle.VehicleType.VAN, capacity_kg=1000, fuel_consumption=10,
+        )
+        # the depot and three stops on a line due east of it, plus places without coordinates
+        cls.depot, cls.near, cls.middle, cls.far = Destination.objects.bulk_create([
+            Destination(city=f'P{k}', country='DZ', latitude=0, longitude=k, base_rate=1, weight_rate_per_kg=1,
+                        volume_rate_per_m3=1)
+            for k in range(4)
+        ])
+        cls.unknown, cls.lost = Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', base_rate=1, weight_rate_per_kg=1, volume_rate_per_m3=1)
+            for city in ('Nowhere', 'Elsewhere')
+        ])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        matrix = DistanceMatrix(Path(directory.name) / 'distance_matrix.npy')
+        matrix.rebuild()
+        patcher = mock.patch.object(routing, 'distance_matrix', matrix)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def make_tour(self, destinations, origin=None, status=Tour.TourStatus.PLANNED):
+        departure = timezone.now()
+        tour = Tour.objects.create(
+            driver=self.driver, vehicle=self.vehicle, status=status, departure_time=departure,
+            estimated_completion_time=departure,
+        )
+        Shipment.objects.bulk_create([
+            Shipment(client=self.client_user, origin=origin or self.depot, destination=destination, tour=tour)
+            for destination in destinations
+        ])
+        return tour
+
+    def sequences(self, tour):
+        return {
+            destination: sequence
+            for destination, sequence in tour.shipments.values_list('destination_id', 'stop_sequence')
+        }
+
+    def test_stops_are_ordered_along_the_route(self):
+        tour = self.make_tour([self.far, self.near, self.unknown, self.middle])
+
+        response = self.client.post(f'/api/tours/{tour.id}/optimize/')
+
+        self.assertEqual(response.status_code, 200)
+        line = [self.near.id, self.middle.id, self.far.id]
+        # a closed tour can run either way, the stop without coordinates comes last
+        self.assertIn(response.data['stops'][:3], (line, line[::-1]))
+        self.assertEqual(response.data['stops'][3], self.unknown.id)
+        sequences = self.sequences(tour)
+        self.assertEqual({sequences[stop] for stop in line}, {1, 2, 3})
+        self.assertEqual(sequences[self.middle.id], 2)
+        self.assertEqual(sequences[self.unknown.id], 4)
+        tour.refresh_from_db()
+        # out and back along the line, 3 degrees of longitude at the equator each way
+        self.assertAlmostEqual(float(tour.mileage_km), 6 * 111.195 * routing.ROAD_FACTOR, delta=1)
+        self.assertGreater(tour.estimated_completion_time, tour.departure_time)
+
+    def test_tour_without_coordinates(self):
+        tour = self.make_tour([self.unknown, self.lost], origin=self.unknown)
+
+        response = self.client.post(f'/api/tours/{tour.id}/optimize/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stops'], [self.unknown.id, self.lost.id])
+        self.assertIsNone(response.data['mileage_km'])
+        tour.refresh_from_db()
+        self.assertIsNone(tour.mileage_km)
+        self.assertEqual(
+            tour.estimated_completion_time - tour.departure_time,
+            datetime.timedelta(minutes=2 * planning.MINUTES_PER_STOP),
+        )
+        self.assertEqual(self.sequences(tour), {self.unknown.id: 1, self.lost.id: 2})
+
+    def test_permissions(self):
+        tour = self.make_tour([self.near])
+        for user in (self.client_user, self.driver_user):
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.post(f'/api/tours/{tour.id}/optimize/').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(f'/api/tours/{tour.id}/optimize/').status_code, 401)
+        self.assertIsNone(Shipment.objects.get(tour=tour).stop_sequence)
+
+    def test_only_planned_tours_with_shipments(self):
+        started = self.make_tour([self.near], status=Tour.TourStatus.IN_PROGRESS)
+        empty = self.make_tour([])
+
+        self.assertEqual(self.client.post(f'/api/tours/{started.id}/optimize/').status_code, 400)
+        self.assertEqual(self.client.post(f'/api/tours/{empty.id}/optimize/').status_code, 400)
+
+    def test_depot_is_the_most_common_origin(self):
+        plan = routing.RoutePlan(1, [
+            (1, self.near.id, self.far.id), (2, self.middle.id, self.far.id), (3, self.middle.id, self.near.id),
+        ])
+
+        self.assertEqual(plan.depot, self.middle.id)
+        self.assertEqual(plan.stops, [self.far.id, self.near.id])
+        self.assertEqual(plan.ids, [self.middle.id, self.far.id, self.near.id])
+
+    def optimize_routes(self, **options):
+        planned = [self.make_tour([self.far, self.near, self.middle]) for _ in range(3)]
+        started = self.make_tour([self.far, self.near], status=Tour.TourStatus.IN_PROGRESS)
+        out = io.StringIO()
+
+        call_command('optimize_routes', stdout=out, **options)
+
+        self.assertIn("Optimized 3 tours", out.getvalue())
+        for tour in planned:
+            self.assertEqual(self.sequences(tour)[self.middle.id], 2)
+        self.assertEqual(set(self.sequences(started).values()), {None})
+
+    def test_command(self):
+        with mock.patch.object(routing, 'ProcessPoolExecutor') as pool:
+            self.optimize_routes(workers=1)
+        pool.assert_not_called()
+
+    def test_command_with_a_process_pool(self):
+        with mock.patch.object(routing, 'PARALLEL_MIN_TOURS', 0):
+            self.optimize_routes(workers=2)
+
+
+class RouteSolverTests(SimpleTestCase):
+    def circle(self, order):
+        # points on a unit circle, visited in `order`, the shortest closed
+        # tour goes round it
+        angles = np.array(order) * 2 * np.pi / len(order)
+        points = np.column_stack([np.cos(angles), np.sin(angles)])
+        return np.linalg.norm(points[:, None] - points[None, :], axis=2)
+
+    def test_finds_the_perimeter(self):
+        dist = self.circle([0, 5, 2, 7, 4, 1, 6, 3])
+        route, length = route_solver.solve_route(dist)
+
+        self.assertEqual(route[0], 0)
+        self.assertEqual(sorted(route), list(range(8)))
+        perimeter = 8 * dist[0, 5]
+        self.assertAlmostEqual(length, perimeter)
+
+    def test_two_opt_removes_a_crossing(self):
+        # a square visited along its diagonals
+        dist = self.circle([0, 1, 2, 3])
+        crossed = [0, 2, 1, 3]
+        improved = route_solver.two_opt(crossed, dist)
+
+        self.assertEqual(improved[0], 0)
+        self.assertLess(route_solver.route_length(improved, dist), route_solver.route_length(crossed, dist))
+
+    def test_small_inputs(self):
+        self.assertEqual(route_solver.solve_route(np.zeros((0, 0))), ([], 0.0))
+        self.assertEqual(route_solver.solve_route(np.zeros((1, 1))), ([0], 0.0))
+        self.assertEqual(route_solver.solve_route(np.array([[0, 3], [3, 0]])), ([0, 1], 6.0))
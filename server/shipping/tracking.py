@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Parcel
+
+# Public parcel tracking is read far more often than shipments change, so
+# every worker keeps the payloads it built in a bounded LRU cache.
+# Entries are dropped as soon as their shipment or parcel is saved in this
+# process (see shipping.signals). Other workers only notice after the TTL
+# expires, which bounds how stale a status can be.
+
+
+class TrackingCache:
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # shipment id -> tracking numbers currently cached for it
+        self._by_shipment = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tracking_number):
+        with self._lock:
+            entry = self._entries.get(tracking_number)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(tracking_number)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, tracking_number, shipment_id, payload):
+        with self._lock:
+            self._entries[tracking_number] = (time.monotonic() + self.ttl, shipment_id, payload)
+            self._entries.move_to_end(tracking_number)
+            self._by_shipment.setdefault(shipment_id, set()).add(tracking_number)
+            while len(self._entries) > self.maxsize:
+                evicted, (_, evicted_shipment, _) = self._entries.popitem(last=False)
+                self._forget(evicted_shipment, evicted)
+
+    def _forget(self, shipment_id, tracking_number):
+        numbers = self._by_shipment.get(shipment_id)
+        if numbers is not None:
+            numbers.discard(tracking_number)
+            if not numbers:
+                del self._by_shipment[shipment_id]
+
+    def invalidate_parcel(self, tracking_number):
+        with self._lock:
+            entry = self._entries.pop(tracking_number, None)
+            if entry is not None:
+                self._forget(entry[1], tracking_number)
+
+    def invalidate_shipment(self, shipment_id):
+        with self._lock:
+            for tracking_number in self._by_shipment.pop(shipment_id, ()):
+                self._entries.pop(tracking_number, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_shipment.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+tracking_cache = TrackingCache(
+    maxsize=getattr(settings, 'TRACKING_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TRACKING_CACHE_TTL', 60),
+)
+
+
+def _build_payload(parcel):
+    shipment = parcel.shipment
+    return {
+        'tracking_number': parcel.tracking_number,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'service_type': shipment.service_type,
+        'origin_city': shipment.origin.city,
+        'destination_city': shipment.destination.city,
+        'weight_kg': str(parcel.weight_kg),
+        'last_update': shipment.updated_at.isoformat(),
+    }
+
+
+def track_parcel(tracking_number):
+    """Tracking payload of a parcel, or None when the number is unknown."""
+    payload = tracking_cache.get(tracking_number)
+    if payload is not None:
+        return payload
+    try:
+        parcel = (
+            Parcel.objects
+            .select_related('shipment__origin', 'shipment__destination')
+            .only(
+                'tracking_number', 'weight_kg',
+                'shipment__status', 'shipment__service_type', 'shipment__updated_at',
+                'shipment__origin__city', 'shipment__destination__city',
+            )
+            .get(tracking_number=tracking_number)
+        )
+    except Parcel.DoesNotExist:
+        return None
+    payload = _build_payload(parcel)
+    tracking_cache.set(tracking_number, parcel.shipment_id, payload)
+    return payload
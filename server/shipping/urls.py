@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ShipmentViewSet, TourViewSet, ParcelViewSet
+from .views import ShipmentViewSet, TourViewSet, ParcelViewSet, QuoteView, TrackingView
 
 
 router = DefaultRouter()
@@ -9,6 +9,8 @@ router.register(r'tours', TourViewSet, basename='tour')
 router.register(r'parcels', ParcelViewSet, basename='parcel')
 
 urlpatterns = [
+    path('quotes/', QuoteView.as_view(), name='quotes'),
+    path('track/<str:tracking_number>/', TrackingView.as_view(), name='track'),
     path('', include(router.urls)),
 ]
 
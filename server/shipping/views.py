@@ -1,10 +1,24 @@
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from users.models import User
 from .models import Shipment, Tour, Parcel
-from .serializers import ShipmentSerializer, TourSerializer, ParcelSerializer
-from rest_framework.exceptions import PermissionDenied
+from .serializers import (
+    ShipmentListQuerySerializer, ShipmentSerializer, TourSerializer, ParcelSerializer, TourPlanSerializer,
+)
+from .planning import plan_tours
+from .routing import optimize_tour
+from .pricing import refresh_shipment_cost
+from .bulk import bulk_create_shipments, BULK_MAX_ITEMS
+from .quotes import price_quotes, QUOTE_MAX_ITEMS
+from .tracking import track_parcel
+from rest_framework.views import APIView
+from server.exports import ExportMixin
+from server.prefetch import AutoPrefetchMixin
+from operator import attrgetter
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from users.permissions import IsOwnerOrAdmin
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.permissions import BasePermission
 
 
@@ -12,10 +26,30 @@ class IsAdminOrAgent(BasePermission):
     def has_permission(self, request, view):
         return bool(request.user and request.user.is_authenticated and request.user.role in [User.Role.ADMIN, User.Role.AGENT])
 
-class ShipmentViewSet(viewsets.ModelViewSet):
+class ShipmentViewSet(AutoPrefetchMixin, ExportMixin, viewsets.ModelViewSet):
    
     
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
+    cursor_ordering = ('-created_at', '-id')
+
+    export_filename = 'shipments'
+    export_columns = [
+        ('id', attrgetter('id')),
+        ('client', attrgetter('client.username')),
+        ('origin_city', attrgetter('origin.city')),
+        ('origin_country', attrgetter('origin.country')),
+        ('destination_city', attrgetter('destination.city')),
+        ('destination_country', attrgetter('destination.country')),
+        ('service_type', attrgetter('service_type')),
+        ('status', attrgetter('status')),
+        ('total_cost', attrgetter('total_cost')),
+        ('tour_id', attrgetter('tour_id')),
+        ('invoice_id', attrgetter('invoice_id')),
+        ('created_at', attrgetter('created_at')),
+        ('parcel_count', lambda s: len(s.parcels.all())),
+        ('total_weight_kg', lambda s: sum(p.weight_kg for p in s.parcels.all())),
+        ('tracking_numbers', lambda s: ';'.join(p.tracking_number for p in s.parcels.all())),
+    ]
     
     def get_permissions(self):
         # Allow drivers to view (GET) and update status (PATCH) of shipments
@@ -27,15 +61,60 @@ class ShipmentViewSet(viewsets.ModelViewSet):
        
         user = self.request.user
         if user.role in [User.Role.ADMIN, User.Role.AGENT]:
-            return Shipment.objects.select_related('client', 'origin', 'destination').prefetch_related('parcels').all()
+            queryset = Shipment.objects.all()
         elif user.role == User.Role.CLIENT:
-            return Shipment.objects.filter(client=user).select_related('origin', 'destination').prefetch_related('parcels')
+            queryset = Shipment.objects.filter(client=user)
         elif user.role == User.Role.DRIVER:
             # Drivers can view all shipments to report incidents
-            return Shipment.objects.select_related('client', 'origin', 'destination').prefetch_related('parcels').all()
-        return Shipment.objects.none() # Block access for others
+            queryset = Shipment.objects.all()
+        else:
+            return Shipment.objects.none() # Block access for others
+        if self.action == 'list':
+            queryset = self.filter_list(queryset)
+        # joins and prefetches are planned from the serializer
+        return queryset
     serializer_class = ShipmentSerializer
 
+    def filter_list(self, queryset):
+        # filtered in the database, a page of the list holds only matching rows
+        params = ShipmentListQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        if 'client' in params:
+            queryset = queryset.filter(client_id=params['client'])
+        if 'status' in params:
+            queryset = queryset.filter(status=params['status'])
+        if params.get('uninvoiced') is not None:
+            queryset = queryset.filter(invoice__isnull=params['uninvoiced'])
+        return queryset
+
+    def get_export_queryset(self):
+        # parcels are prefetched once per iterator chunk
+        return super().get_export_queryset().select_related('client', 'origin', 'destination').prefetch_related('parcels')
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # accepts either a plain list or {"shipments": [...]}
+        items = request.data.get('shipments') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'shipments': ["Expected a non-empty list of shipments."]})
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValidationError({'shipments': [f"At most {BULK_MAX_ITEMS} shipments per request."]})
+
+        results, errors = bulk_create_shipments(items, request.user)
+        if not results:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'created': len(results),
+            'failed': len(errors),
+            'results': results,
+            'errors': errors,
+        }, status=response_status)
+
     def perform_update(self, serializer):
         #  prevent editing if in a tour
         shipment = self.get_object()
@@ -56,8 +135,95 @@ class TourViewSet(viewsets.ModelViewSet):
    
     permission_classes = [IsAdminOrAgent]
 
+    @action(detail=False, methods=['post'])
+    def plan(self, request):
+        # packs the day's pending shipments into tours for the free crews
+        serializer = TourPlanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tours, unassigned = plan_tours(
+            serializer.validated_data['date'],
+            departure_time=serializer.validated_data['departure_time'],
+            dry_run=serializer.validated_data['dry_run'],
+        )
+        return Response({
+            'planned_tours': len(tours),
+            'planned_shipments': sum(len(tour['shipment_ids']) for tour in tours),
+            'tours': tours,
+            'unassigned': unassigned,
+        }, status=status.HTTP_200_OK if serializer.validated_data['dry_run'] else status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def optimize(self, request, pk=None):
+        # orders the stops of a planned tour and fills mileage and ETA
+        tour = self.get_object()
+        if tour.status != Tour.TourStatus.PLANNED:
+            raise ValidationError({'status': ["Only planned tours can be reoptimized."]})
+        plan = optimize_tour(tour)
+        if plan is None:
+            raise ValidationError({'shipments': ["This tour has no shipments."]})
+        return Response({
+            'tour': tour.id,
+            'mileage_km': tour.mileage_km,
+            'estimated_completion_time': tour.estimated_completion_time,
+            'stops': plan.order,
+            'stop_sequence': plan.sequences(),
+        })
+
 class ParcelViewSet(viewsets.ModelViewSet):
    
     queryset = Parcel.objects.all()
     serializer_class = ParcelSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
+
+    # parcels drive the shipment price, keep total_cost in step with them
+    def perform_create(self, serializer):
+        parcel = serializer.save()
+        refresh_shipment_cost(parcel.shipment)
+
+    def perform_update(self, serializer):
+        parcel = serializer.save()
+        refresh_shipment_cost(parcel.shipment)
+
+    def perform_destroy(self, instance):
+        shipment = instance.shipment
+        super().perform_destroy(instance)
+        refresh_shipment_cost(shipment)
+
+
+class QuoteView(APIView):
+    # prices hypothetical shipments, nothing is written to the database
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        items = request.data.get('quotes') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'quotes': ["Expected a non-empty list of quotes."]})
+        if len(items) > QUOTE_MAX_ITEMS:
+            raise ValidationError({'quotes': [f"At most {QUOTE_MAX_ITEMS} quotes per request."]})
+
+        results, errors = price_quotes(items)
+        if not results:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({
+            'count': len(results),
+            'results': results,
+            'errors': errors,
+        }, status=response_status)
+
+
+class TrackingView(APIView):
+    # public lookup by tracking number, served from the tracking LRU cache
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, tracking_number, format=None):
+        payload = track_parcel(tracking_number)
+        if payload is None:
+            raise NotFound("Unknown tracking number.")
+        return Response(payload)
@@ -50,5 +50,9 @@ class Claim(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # backs the cursor pagination of the claim list
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
     def __str__(self):
         return f"Claim #{self.id} from {self.client.username}"
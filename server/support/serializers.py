@@ -4,8 +4,10 @@ from users.models import User
 from .models import Incident, Claim
 from users.serializers import UserSerializer
 from shipping.serializers import ShipmentSerializer 
+from server.fieldsets import SparseFieldsetMixin
+from server.instrumentation import TimedDataMixin
 
-class IncidentSerializer(serializers.ModelSerializer):
+class IncidentSerializer(TimedDataMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     
     
     shipment = ShipmentSerializer(read_only=True)
@@ -29,8 +31,9 @@ class IncidentSerializer(serializers.ModelSerializer):
             'shipment_id', 'reported_by_id'
         ]
         read_only_fields = ['date_occurred', 'reported_by']
+        expandable_fields = ['shipment', 'reported_by']
 
-class ClaimSerializer(serializers.ModelSerializer):
+class ClaimSerializer(TimedDataMixin, SparseFieldsetMixin, serializers.ModelSerializer):
    
     client = UserSerializer(read_only=True)
     incident = IncidentSerializer(read_only=True, required=False)
@@ -46,3 +49,4 @@ class ClaimSerializer(serializers.ModelSerializer):
             'id', 'client', 'incident', 'reason', 'description', 'status', 
             'created_at', 'incident_id'
         ]
+        expandable_fields = ['client', 'incident']
@@ -1,3 +1,142 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from logistics.models import Destination
+from server.prefetch import plan_related
+from server.testing import QueryBudgetMixin
+from shipping.models import Parcel, Shipment
+from users.models import User
+
+from .models import Claim, Incident
+from .serializers import ClaimSerializer
+
+
+class ClaimQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        cls.origin, cls.destination = Destination.objects.bulk_create([
+            Destination(city=city, country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1)
+            for city in ('Alger', 'Oran')
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_claims(self, count):
+        shipments = Shipment.objects.bulk_create([
+            Shipment(client=self.client_user, origin=self.origin, destination=self.destination, total_cost=Decimal('10.00'))
+            for _ in range(count)
+        ])
+        Parcel.objects.bulk_create([
+            Parcel(shipment=shipment, tracking_number=f'TRK-{shipment.id}', weight_kg=1, height_cm=1, width_cm=1, length_cm=1)
+            for shipment in shipments
+        ])
+        incidents = Incident.objects.bulk_create([
+            Incident(
+                shipment=shipment, reported_by=self.admin, incident_type=Incident.IncidentType.OTHER,
+                description='-', date_occurred=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc),
+            )
+            for shipment in shipments
+        ])
+        Claim.objects.bulk_create([
+            Claim(client=self.client_user, incident=incident, reason='-', description='-')
+            for incident in incidents
+        ])
+
+    def test_list(self):
+        self.assertQueryBudget('/api/claims/', 1, self.make_claims)
+
+    def test_list_expanded(self):
+        self.assertQueryBudget('/api/claims/?expand=client,incident.shipment.parcels', 2, self.make_claims)
+
+
+class ClaimFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.Role.ADMIN)
+        cls.client_user = User.objects.create_user('client', password='x', role=User.Role.CLIENT)
+        destination = Destination.objects.create(
+            city='Oran', country='DZ', base_rate=10, weight_rate_per_kg=1, volume_rate_per_m3=1,
+        )
+        cls.shipment = Shipment.objects.create(
+            client=cls.client_user, origin=destination, destination=destination, total_cost=Decimal('10.00'),
+        )
+        cls.parcel = Parcel.objects.create(
+            shipment=cls.shipment, tracking_number='TRK-1', weight_kg=1, height_cm=1, width_cm=1, length_cm=1,
+        )
+        cls.incident = Incident.objects.create(
+            shipment=cls.shipment, reported_by=cls.admin, incident_type=Incident.IncidentType.OTHER,
+            description='-', date_occurred=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        cls.claim = Claim.objects.create(client=cls.client_user, incident=cls.incident, reason='-', description='-')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, query=''):
+        response = self.client.get(f'/api/claims/{self.claim.id}/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_relations_collapse_to_ids(self):
+        data = self.get()
+
+        self.assertEqual((data['client'], data['incident']), (self.client_user.id, self.incident.id))
+        self.assertEqual(
+            set(data), {'id', 'client', 'incident', 'reason', 'description', 'status', 'created_at'},
+        )
+
+    def test_fields(self):
+        self.assertEqual(self.get('?fields=id,status'), {'id': self.claim.id, 'status': self.claim.status})
+
+    def test_nested_expand(self):
+        data = self.get('?expand=incident.shipment.parcels')
+
+        self.assertEqual(data['client'], self.client_user.id)
+        shipment = data['incident']['shipment']
+        self.assertEqual(shipment['id'], self.shipment.id)
+        # expanded one level at a time, the incident's reporter stays an id
+        self.assertEqual(data['incident']['reported_by'], self.admin.id)
+        self.assertEqual(shipment['client'], self.client_user.id)
+        self.assertEqual([parcel['tracking_number'] for parcel in shipment['parcels']], ['TRK-1'])
+
+    def test_nested_fields_expand_their_relation(self):
+        data = self.get('?fields=id,client.username,incident.status')
+
+        self.assertEqual(data, {
+            'id': self.claim.id,
+            'client': {'username': 'client'},
+            'incident': {'status': self.incident.status},
+        })
+
+    def test_unknown_names_are_ignored(self):
+        self.assertEqual(self.get('?fields=id,nope'), {'id': self.claim.id})
+        self.assertEqual(self.get('?expand=nope,incident.nope')['incident']['shipment'], self.shipment.id)
+
+
+class ClaimPrefetchPlanTests(SimpleTestCase):
+    def plan(self, fields=None, expand=None):
+        return plan_related(ClaimSerializer(fields=fields, expand=expand), Claim)
+
+    def test_collapsed_relations_read_the_foreign_keys(self):
+        self.assertEqual(self.plan(), ([], []))
+
+    def test_nested_expand(self):
+        self.assertEqual(
+            self.plan(expand='client,incident.shipment.parcels'),
+            (['client', 'incident__shipment'], ['incident__shipment__parcels']),
+        )
+
+    def test_nested_fields(self):
+        self.assertEqual(self.plan(fields='id,incident.status'), (['incident'], []))
+
+    def test_unknown_names(self):
+        self.assertEqual(self.plan(fields='id,nope', expand='nope'), ([], []))
+        self.assertEqual(self.plan(expand='incident.nope'), (['incident'], []))
@@ -3,6 +3,7 @@ from users.models import User
 from .models import Incident, Claim
 from .serializers import IncidentSerializer, ClaimSerializer
 from users.permissions import IsOwnerOrAdmin
+from server.prefetch import AutoPrefetchMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import BasePermission
 
@@ -11,7 +12,7 @@ class IsAdminOrAgent(BasePermission):
     def has_permission(self, request, view):
         return bool(request.user and request.user.is_authenticated and request.user.role in [User.Role.ADMIN, User.Role.AGENT])
 
-class IncidentViewSet(viewsets.ModelViewSet):
+class IncidentViewSet(AutoPrefetchMixin, viewsets.ModelViewSet):
     queryset = Incident.objects.select_related('shipment', 'reported_by').all()
     serializer_class = IncidentSerializer
     permission_classes = [IsAuthenticated]
@@ -19,32 +20,37 @@ class IncidentViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role in [User.Role.ADMIN, User.Role.AGENT]:
-            return Incident.objects.select_related('shipment', 'reported_by').all()
+            queryset = Incident.objects.all()
         elif user.role == User.Role.CLIENT:
             # Clients can only see incidents related to their shipments
-            return Incident.objects.filter(shipment__client=user).select_related('shipment', 'reported_by')
+            queryset = Incident.objects.filter(shipment__client=user)
         elif user.role == User.Role.DRIVER:
              # Drivers see incidents they reported ?? or all? Let's say reported by them
-             return Incident.objects.filter(reported_by=user).select_related('shipment', 'reported_by')
-        return Incident.objects.none()
+             queryset = Incident.objects.filter(reported_by=user)
+        else:
+            return Incident.objects.none()
+        return queryset
 
     def perform_create(self, serializer):
         from django.utils import timezone
         serializer.save(reported_by=self.request.user, date_occurred=timezone.now())
 
-class ClaimViewSet(viewsets.ModelViewSet):
+class ClaimViewSet(AutoPrefetchMixin, viewsets.ModelViewSet):
     
     serializer_class = ClaimSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin] # The owner is the claim.client
+    cursor_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
        
         user = self.request.user
         if user.role in [User.Role.ADMIN, User.Role.AGENT]:
-            return Claim.objects.all()
+            queryset = Claim.objects.all()
         elif user.role == User.Role.CLIENT:
-            return Claim.objects.filter(client=user)
-        return Claim.objects.none()
+            queryset = Claim.objects.filter(client=user)
+        else:
+            return Claim.objects.none()
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(client=self.request.user)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from server.fieldsets import SparseFieldsetMixin
 from .models import User, ClientProfile
+from server.instrumentation import TimedDataMixin
 
 class ClientProfileSerializer(serializers.ModelSerializer):
     
@@ -7,8 +9,10 @@ class ClientProfileSerializer(serializers.ModelSerializer):
         model = ClientProfile
         # fields to include in the api for clientprofile 
         fields = ['company_name', 'address', 'phone_number', 'balance']
+        # moved by the finance ledger only
+        read_only_fields = ['balance']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedDataMixin, SparseFieldsetMixin, serializers.ModelSerializer):
    
     # required=False means it's not needed for other roles only for clients
     client_profile = ClientProfileSerializer(required=False)
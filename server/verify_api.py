@@ -34,7 +34,7 @@ def test_api():
     # 3. Test Shipments
     resp = requests.get(f"{BASE_URL}/shipments/", headers=headers)
     if resp.status_code == 200:
-        print(f"[PASS] Shipments List (Count: {len(resp.json())})")
+        print(f"[PASS] Shipments List (Page size: {len(resp.json()['results'])})")
     else:
         print(f"[FAIL] Shipments List: {resp.text}")
 
@@ -42,7 +42,7 @@ def test_api():
     resp = requests.get(f"{BASE_URL}/payments/", headers=headers)
     if resp.status_code == 200:
         # Check if new fields exist in first item if any
-        data = resp.json()
+        data = resp.json()['results']
         if data:
             if 'invoice_id' in data[0] and 'client_username' in data[0]:
                 print("[PASS] Payments List Structure Verified")
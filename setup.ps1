@@ -20,6 +20,7 @@ djangorestframework `
 djangorestframework-simplejwt `
 django-cors-headers `
 drf-spectacular `
+numpy `
 Pillow
 
 Write-Host "Running migrations..."
@@ -18,6 +18,7 @@ djangorestframework \
 djangorestframework-simplejwt \
 django-cors-headers \
 drf-spectacular \
+numpy \
 Pillow
 
 echo "Running migrations..."